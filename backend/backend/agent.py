@@ -0,0 +1,338 @@
+# Phase III — Gemini todo agent: model and tool declarations built once per process
+# [From]: Hackathon Phase III — MCP tools, stateless chat
+
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator
+
+from fastapi import HTTPException
+
+from backend import agent_tools
+
+GEMINI_MODEL = os.environ.get("GEMINI_MODEL", "gemini-1.5-flash")
+MAX_TOOL_ROUNDS = 8  # Model turns per message before the loop gives up on tool calls
+AGENT_TOOL_WORKERS = int(os.environ.get("AGENT_TOOL_WORKERS", "8"))  # Tool calls running at once, all chats
+
+SYSTEM_INSTRUCTION = "You are a helpful todo assistant. Use tools to manage tasks. Confirm actions nicely."
+
+# The user a turn runs for. Tools read it here, so their declarations (and the model
+# holding them) are shared by every request instead of rebuilt around a closure.
+current_user_id: ContextVar[str] = ContextVar("current_user_id")
+
+
+def _user_id() -> str:
+    try:
+        return current_user_id.get()
+    except LookupError:
+        raise RuntimeError("Agent tool called outside a user turn")
+
+
+@contextmanager
+def as_user(user_id: str):
+    token = current_user_id.set(user_id)
+    try:
+        yield
+    finally:
+        current_user_id.reset(token)
+
+
+def add_task_tool(
+    title: str,
+    description: str = "",
+    priority: str = "medium",
+    tags: str | None = None,
+    due_date: str | None = None,
+    recurring_rule: str | None = None
+):
+    """Create a new task.
+    priority: 'low', 'medium', 'high'.
+    tags: comma-separated.
+    due_date: ISO 8601 string.
+    recurring_rule: 'daily', 'weekly', 'monthly', 'yearly', or an RRULE such as
+    'FREQ=WEEKLY;INTERVAL=2;BYDAY=MO,TH' or 'FREQ=MONTHLY;BYMONTHDAY=-1' (last day).
+    """
+    return agent_tools.add_task(
+        _user_id(),
+        title,
+        description,
+        priority=priority,
+        tags=tags,
+        due_date=due_date,
+        recurring_rule=recurring_rule
+    )
+
+
+def list_tasks_tool(
+    status: str = "all",
+    priority: str | None = None,
+    tag: str | None = None,
+    search: str | None = None,
+    tag_mode: str = "any",
+):
+    """List tasks with filtering.
+    status: 'all' | 'pending' | 'completed'.
+    tag: one tag or comma-separated tags; tag_mode: 'any' | 'all'.
+    """
+    return agent_tools.list_tasks(
+        _user_id(),
+        status=status,
+        priority=priority,
+        tag=tag,
+        search=search,
+        tag_mode=tag_mode,
+    )
+
+
+def search_tasks_tool(query: str):
+    """Semantic search for tasks. Use this for vague queries like 'What do I need to do?' or 'Any chores?'.
+    Returns tasks relevant to the query based on meaning.
+    """
+    return agent_tools.search_tasks(_user_id(), query)
+
+
+def complete_task_tool(task_id: int):
+    """Mark a task complete (toggle)."""
+    return agent_tools.complete_task(_user_id(), task_id)
+
+
+def delete_task_tool(task_id: int):
+    """Delete a task by id."""
+    return agent_tools.delete_task(_user_id(), task_id)
+
+
+def update_task_tool(
+    task_id: int,
+    title: str | None = None,
+    description: str | None = None,
+    priority: str | None = None,
+    tags: str | None = None,
+    due_date: str | None = None,
+    recurring_rule: str | None = None
+):
+    """Update task details. recurring_rule: as for add_task_tool; '' stops recurring."""
+    return agent_tools.update_task(
+        _user_id(),
+        task_id,
+        title=title,
+        description=description,
+        priority=priority,
+        tags=tags,
+        due_date=due_date,
+        recurring_rule=recurring_rule
+    )
+
+
+def bulk_add_tasks_tool(
+    titles: list[str],
+    priority: str = "medium",
+    tags: str | None = None,
+    due_date: str | None = None,
+):
+    """Create several tasks in one call (e.g. a shopping list). Shared priority/tags/due_date."""
+    return agent_tools.bulk_add_tasks(_user_id(), titles, priority=priority, tags=tags, due_date=due_date)
+
+
+def bulk_complete_tasks_tool(
+    task_ids: list[int] | None = None,
+    tag: str | None = None,
+    search: str | None = None,
+):
+    """Mark many pending tasks complete in one call: by ids, by tag, or by search text.
+    Use for requests like 'mark all my shopping tasks done'.
+    """
+    return agent_tools.bulk_complete_tasks(_user_id(), task_ids=task_ids, tag=tag, search=search)
+
+
+def bulk_update_tasks_tool(
+    task_ids: list[int],
+    priority: str | None = None,
+    tags: str | None = None,
+    due_date: str | None = None,
+):
+    """Set priority, tags and/or due_date on many tasks in one call."""
+    return agent_tools.bulk_update_tasks(_user_id(), task_ids, priority=priority, tags=tags, due_date=due_date)
+
+
+def bulk_delete_tasks_tool(
+    task_ids: list[int] | None = None,
+    tag: str | None = None,
+    status: str | None = None,
+):
+    """Delete many tasks in one call: by ids, by tag, or status 'completed' | 'pending'.
+    Confirm with the user before deleting by tag or status.
+    """
+    return agent_tools.bulk_delete_tasks(_user_id(), task_ids=task_ids, tag=tag, status=status)
+
+
+TOOLS = [
+    add_task_tool,
+    list_tasks_tool,
+    search_tasks_tool,
+    complete_task_tool,
+    delete_task_tool,
+    update_task_tool,
+    bulk_add_tasks_tool,
+    bulk_complete_tasks_tool,
+    bulk_update_tasks_tool,
+    bulk_delete_tasks_tool,
+]
+TOOLS_BY_NAME = {fn.__name__: fn for fn in TOOLS}
+READ_TOOLS = {"list_tasks_tool", "search_tasks_tool"}
+
+# Tools are blocking DB calls; a bounded pool keeps a burst of tool calls from
+# exhausting the connection pool
+_tool_pool = ThreadPoolExecutor(max_workers=AGENT_TOOL_WORKERS, thread_name_prefix="agent-tool")
+
+_model = None
+_model_lock = threading.Lock()
+
+
+def get_model():
+    """The configured GenerativeModel; tool schemas are derived from signatures on first use only."""
+    global _model
+    if _model is not None:
+        return _model
+    with _model_lock:
+        if _model is None:
+            import google.generativeai as genai
+
+            api_key = os.environ.get("GEMINI_API_KEY")
+            if not api_key:
+                raise HTTPException(status_code=503, detail="GEMINI_API_KEY not set")
+            genai.configure(api_key=api_key)
+            _model = genai.GenerativeModel(
+                model_name=GEMINI_MODEL,
+                tools=TOOLS,
+                system_instruction=SYSTEM_INSTRUCTION,
+            )
+    return _model
+
+
+def start_chat(messages: list[dict]):
+    """Gemini chat session over all but the last message (the one about to be sent)."""
+    # OpenAI-style [{"role", "content"}] -> Gemini [{"role": "user" | "model", "parts"}]
+    history = [
+        {"role": "user" if m.get("role") == "user" else "model", "parts": [m.get("content", "") or ""]}
+        for m in messages[:-1]
+    ]
+    return get_model().start_chat(history=history, enable_automatic_function_calling=False)
+
+
+def _plain(value):
+    """Proto map/list values from function-call args -> plain Python (whole floats -> int)."""
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if hasattr(value, "items"):
+        return {k: _plain(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)) or type(value).__name__ == "RepeatedComposite":
+        return [_plain(v) for v in value]
+    return value
+
+
+def _call_as(user_id: str, tool, arguments: dict):
+    with as_user(user_id):
+        return tool(**arguments)
+
+
+def _footprint(name: str, arguments: dict) -> tuple[bool, set | None]:
+    """-> (writes?, task ids it can touch; None = any of the user's tasks)."""
+    if name in READ_TOOLS:
+        return False, None
+    if "task_id" in arguments:
+        return True, {arguments["task_id"]}
+    if name in ("add_task_tool", "bulk_add_tasks_tool"):
+        return True, set()  # Only tasks it creates
+    if arguments.get("task_ids") and not any(arguments.get(k) for k in ("tag", "search", "status")):
+        return True, set(arguments["task_ids"])
+    return True, None
+
+
+def _must_wait(earlier: tuple[bool, set | None], later: tuple[bool, set | None]) -> bool:
+    earlier_writes, earlier_ids = earlier
+    later_writes, later_ids = later
+    if not earlier_writes:
+        return later_writes and later_ids is None  # A filter-based bulk write after a read
+    if not later_writes:
+        return True  # Reads see the writes asked for before them
+    return earlier_ids is None or later_ids is None or bool(earlier_ids & later_ids)
+
+
+async def _run_tool(user_id: str, name: str, arguments: dict, after: list[asyncio.Task]):
+    if after:
+        await asyncio.wait(after)
+    tool = TOOLS_BY_NAME.get(name)
+    if tool is None:
+        return {"error": f"Unknown tool {name}"}
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_tool_pool, _call_as, user_id, tool, arguments)
+    except Exception as e:
+        return {"error": str(e)}
+
+
+def dispatch_tool_calls(user_id: str, calls: list[tuple[str, dict]]) -> list[asyncio.Task]:
+    """Start one model turn's function calls on the tool pool. -> a task per call, in call order.
+
+    Independent calls run concurrently (each tool is its own short transaction), so a
+    multi-action turn takes about as long as its slowest call. A call still waits for
+    earlier ones it could observe or race: writes to the same task, any write before a
+    list/search, and everything before a bulk write selected by tag/search/status.
+    """
+    footprints = [_footprint(name, arguments) for name, arguments in calls]
+    tasks: list[asyncio.Task] = []
+    for i, (name, arguments) in enumerate(calls):
+        after = [tasks[j] for j in range(i) if _must_wait(footprints[j], footprints[i])]
+        tasks.append(asyncio.ensure_future(_run_tool(user_id, name, arguments, after)))
+    return tasks
+
+
+async def stream_agent(user_id: str, messages: list[dict]) -> AsyncIterator[dict]:
+    """Run the agent turn as a stream of events: {"type": "token" | "tool_call" | "tool_result", ...}.
+
+    The tool loop is driven here rather than by the SDK's automatic function calling
+    (which runs calls one by one and cannot stream): stream a model turn, dispatch the
+    function calls it made, send the results back in call order, repeat.
+    """
+    from google.generativeai import protos
+
+    chat = start_chat(messages)
+    content = messages[-1].get("content", "")
+    for _ in range(MAX_TOOL_ROUNDS):
+        response = await chat.send_message_async(content, stream=True)
+        calls = []
+        async for chunk in response:
+            for part in chunk.parts:
+                if fn := part.function_call:
+                    calls.append((fn.name, _plain(fn.args)))
+                    yield {"type": "tool_call", "name": fn.name, "arguments": calls[-1][1]}
+                elif part.text:
+                    yield {"type": "token", "text": part.text}
+        if not calls:
+            return
+        tasks = dispatch_tool_calls(user_id, calls)
+        parts = []
+        try:
+            for (name, _), task in zip(calls, tasks):
+                result = await task
+                yield {"type": "tool_result", "name": name, "result": result}
+                parts.append(protos.Part(function_response=protos.FunctionResponse(name=name, response={"result": result})))
+        finally:
+            for task in tasks:
+                task.cancel()  # Stream abandoned midway; no-op for finished tasks
+        content = parts
+    yield {"type": "token", "text": "Sorry, that needed too many steps. Please try a simpler request."}
+
+
+async def run_agent(user_id: str, messages: list[dict]) -> tuple[str, list[dict]]:
+    """One whole turn (the same tool loop as stream_agent). -> (reply text, tool calls made)."""
+    text_parts: list[str] = []
+    tool_calls_list: list[dict] = []
+    async for item in stream_agent(user_id, messages):
+        if item["type"] == "token":
+            text_parts.append(item["text"])
+        elif item["type"] == "tool_call":
+            tool_calls_list.append({"name": item["name"], "arguments": item["arguments"]})
+    return "".join(text_parts), tool_calls_list
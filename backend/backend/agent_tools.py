@@ -1,16 +1,18 @@
 # Phase III — Task tools for AI agent (MCP-compatible signatures)
 # [From]: Hackathon Phase III MCP Tools spec — add_task, list_tasks, complete_task, delete_task, update_task
 
-from datetime import datetime, timedelta
+from datetime import datetime
 
-import json
-from sqlmodel import Session, select, col
+from sqlmodel import Session, col, select
 
-from dapr.clients import DaprClient
-
-from backend.database import engine
+from backend.database import session_scope
+from backend.events import record_task_event
+from backend.lexical import search_filter
 from backend.models import Task
-from backend.rag import search_tasks_semantic
+from backend.rag import invalidate_task_embedding, search_tasks_semantic
+from backend.recurrence import next_task, normalize_rule, parse_due_date
+from backend.tags import parse_tags, set_task_tags, tag_filter
+from backend.task_batch import MAX_BATCH_OPERATIONS, BatchOperation, apply_task_batch
 
 def search_tasks(user_id: str, query: str) -> list[dict]:
     """Semantic search wrapper."""
@@ -34,9 +36,9 @@ def add_task(
         priority: 'low', 'medium', 'high'.
         tags: Comma-separated strings.
         due_date: ISO datetime string.
-        recurring_rule: 'daily', 'weekly', 'monthly'.
+        recurring_rule: 'daily', 'weekly', 'monthly', 'yearly' or an RRULE like 'FREQ=WEEKLY;BYDAY=MO,TH'.
     """
-    with Session(engine) as session:
+    with session_scope() as session:
         title = (title or "").strip()
         description = (description or "").strip()
         if len(title) < 1 or len(title) > 200:
@@ -51,10 +53,15 @@ def add_task(
         dt_due = None
         if due_date:
             try:
-                dt_due = datetime.fromisoformat(due_date.replace("Z", "+00:00"))
+                dt_due = parse_due_date(due_date)
             except ValueError:
                 return {"error": "Invalid due_date format. Use ISO 8601."}
 
+        try:
+            recurring_rule = normalize_rule(recurring_rule)
+        except ValueError as e:
+            return {"error": str(e)}
+
         task = Task(
             user_id=user_id,
             title=title,
@@ -65,20 +72,11 @@ def add_task(
             recurring_rule=recurring_rule,
         )
         session.add(task)
+        session.flush()  # Assign task.id for tag rows
+        set_task_tags(session, task.id, user_id, task.tags)
+        # Phase V: task-events outbox row, same transaction
+        record_task_event(session, "created", task)
         session.commit()
-        session.refresh(task)
-
-        # Phase V: Publish Event
-        try:
-            with DaprClient() as d:
-                d.publish_event(
-                    pubsub_name="kafka-pubsub",
-                    topic_name="task-events",
-                    data=json.dumps({"event": "created", "task_id": task.id, "title": task.title}),
-                    data_content_type="application/json",
-                )
-        except Exception as e:
-            print(f"Warning: Failed to publish event from agent: {e}")
 
         return {
             "task_id": task.id,
@@ -94,10 +92,15 @@ def list_tasks(
     status: str = "all",
     priority: str | None = None,
     tag: str | None = None,
-    search: str | None = None
+    search: str | None = None,
+    tag_mode: str = "any",
 ) -> list[dict]:
-    """Retrieve tasks with optional filtering."""
-    with Session(engine) as session:
+    """Retrieve tasks with optional filtering.
+    Args:
+        tag: One tag or comma-separated tags.
+        tag_mode: 'any' (default) or 'all' of the given tags.
+    """
+    with session_scope() as session:
         query = select(Task).where(Task.user_id == user_id)
         
         if status == "pending":
@@ -108,15 +111,14 @@ def list_tasks(
         if priority:
             query = query.where(Task.priority == priority)
             
-        if tag:
-            # Simple string containment for tags stored as "a,b,c"
-            query = query.where(col(Task.tags).contains(tag))
+        tags = parse_tags(tag)
+        if tags:
+            # Index lookup on task_tags (user_id, tag)
+            query = query.where(tag_filter(user_id, tags, "all" if tag_mode == "all" else "any"))
             
         if search:
-            # Case-insensitive search
-            query = query.where(
-                col(Task.title).contains(search) | col(Task.description).contains(search)
-            )
+            # Token/prefix lookup in the user's inverted index
+            query = query.where(search_filter(session, user_id, search))
 
         query = query.order_by(Task.id)
         tasks = session.exec(query).all()
@@ -139,7 +141,7 @@ def list_tasks(
 
 def complete_task(user_id: str, task_id: int) -> dict:
     """Mark a task as complete. Handles recurring tasks."""
-    with Session(engine) as session:
+    with session_scope() as session:
         task = session.get(Task, task_id)
         if not task or task.user_id != user_id:
             return {"error": "Task not found"}
@@ -151,53 +153,19 @@ def complete_task(user_id: str, task_id: int) -> dict:
         task.completed = True
         task.updated_at = datetime.utcnow()
         session.add(task)
+        # Phase V: task-events outbox row, same transaction
+        record_task_event(session, "completed", task)
         
         next_task_info = None
-        
-        # Handle Recurring Logic
-        if task.recurring_rule and task.due_date:
-            next_due = None
-            if task.recurring_rule == "daily":
-                next_due = task.due_date + timedelta(days=1)
-            elif task.recurring_rule == "weekly":
-                next_due = task.due_date + timedelta(weeks=1)
-            elif task.recurring_rule == "monthly":
-                next_due = task.due_date + timedelta(days=30) # Approx
-            
-            if next_due:
-                new_task = Task(
-                    user_id=user_id,
-                    title=task.title,
-                    description=task.description,
-                    priority=task.priority,
-                    tags=task.tags,
-                    recurring_rule=task.recurring_rule,
-                    due_date=next_due,
-                    completed=False
-                )
-                session.add(new_task)
-                session.commit() # Commit to get ID
-                next_task_info = {"next_task_id": new_task.id, "next_due_date": next_due.isoformat()}
-            else:
-                session.commit()
-        else:
-            session.commit()
-            
-        session.refresh(task)
-        
-        # Phase V: Publish Event
-        if task.completed:
-            try:
-                with DaprClient() as d:
-                    d.publish_event(
-                        pubsub_name="kafka-pubsub",
-                        topic_name="task-events",
-                        data=json.dumps({"event": "completed", "task_id": task.id, "title": task.title}),
-                        data_content_type="application/json",
-                    )
-            except Exception as e:
-                print(f"Warning: Failed to publish event from agent: {e}")
-        
+        new_task = next_task(task)
+        if new_task is not None:
+            session.add(new_task)
+            session.flush()  # Assign ID for tag rows
+            set_task_tags(session, new_task.id, user_id, new_task.tags)
+            record_task_event(session, "created", new_task)
+            next_task_info = {"next_task_id": new_task.id, "next_due_date": new_task.due_date.isoformat()}
+        session.commit()
+
         result = {
             "task_id": task.id,
             "status": "completed",
@@ -210,11 +178,14 @@ def complete_task(user_id: str, task_id: int) -> dict:
 
 def delete_task(user_id: str, task_id: int) -> dict:
     """Remove a task from the list."""
-    with Session(engine) as session:
+    with session_scope() as session:
         task = session.get(Task, task_id)
         if not task or task.user_id != user_id:
             return {"error": "Task not found"}
         title = task.title
+        invalidate_task_embedding(session, task.id)
+        set_task_tags(session, task.id, user_id, None)
+        record_task_event(session, "deleted", task)
         session.delete(task)
         session.commit()
         return {"task_id": task_id, "status": "deleted", "title": title}
@@ -231,7 +202,7 @@ def update_task(
     recurring_rule: str | None = None
 ) -> dict:
     """Modify task details."""
-    with Session(engine) as session:
+    with session_scope() as session:
         task = session.get(Task, task_id)
         if not task or task.user_id != user_id:
             return {"error": "Task not found"}
@@ -253,21 +224,27 @@ def update_task(
                 
         if tags is not None:
             task.tags = tags
+            set_task_tags(session, task.id, user_id, task.tags)
             
         if due_date is not None:
             try:
-                task.due_date = datetime.fromisoformat(due_date.replace("Z", "+00:00"))
+                task.due_date = parse_due_date(due_date)
             except ValueError:
                 return {"error": "Invalid due_date format"}
+            task.recurrence_start = None  # New due date starts a new series
                 
         if recurring_rule is not None:
-            if recurring_rule in ["daily", "weekly", "monthly", ""]:
-                task.recurring_rule = recurring_rule if recurring_rule else None
+            try:
+                task.recurring_rule = normalize_rule(recurring_rule)
+            except ValueError as e:
+                return {"error": str(e)}
+            task.recurrence_start = None
 
         task.updated_at = datetime.utcnow()
         session.add(task)
+        invalidate_task_embedding(session, task.id)
+        record_task_event(session, "updated", task)
         session.commit()
-        session.refresh(task)
         return {
             "task_id": task.id,
             "status": "updated",
@@ -275,3 +252,122 @@ def update_task(
             "priority": task.priority,
             "due_date": task.due_date.isoformat() if task.due_date else None,
         }
+
+
+# Bulk tools: one transaction and one publish round however many tasks match
+
+def _matching_task_ids(
+    session: Session,
+    user_id: str,
+    task_ids: list[int] | None = None,
+    tag: str | None = None,
+    search: str | None = None,
+    status: str | None = None,
+) -> list[int]:
+    """Ids of matching tasks, at most MAX_BATCH_OPERATIONS + 1 (one more means truncated)."""
+    query = select(Task.id).where(Task.user_id == user_id)
+    if task_ids:
+        query = query.where(col(Task.id).in_(task_ids))
+    if status == "pending":
+        query = query.where(Task.completed == False)
+    elif status == "completed":
+        query = query.where(Task.completed == True)
+    tags = parse_tags(tag)
+    if tags:
+        query = query.where(tag_filter(user_id, tags, "any"))
+    if search:
+        query = query.where(search_filter(session, user_id, search))
+    return list(session.exec(query.order_by(Task.id).limit(MAX_BATCH_OPERATIONS + 1)).all())
+
+
+def _run_batch(
+    session: Session, user_id: str, operations: list[BatchOperation], status: str, truncated: bool = False
+) -> dict:
+    results = apply_task_batch(session, user_id, operations)
+    session.commit()
+    done = [r for r in results if r["status"] == status]
+    summary = {
+        "status": status,
+        "count": len(done),
+        "tasks": [{"task_id": r.get("task_id"), "title": r.get("title")} for r in done[:50]],
+    }
+    errors = [{"index": r["index"], "error": r["error"]} for r in results if r["status"] == "error"]
+    if errors:
+        summary["errors"] = errors[:50]
+    if truncated:
+        summary["truncated"] = f"Only the first {MAX_BATCH_OPERATIONS} matching tasks were changed; call again for the rest"
+    return summary
+
+
+def bulk_add_tasks(
+    user_id: str,
+    titles: list[str],
+    priority: str = "medium",
+    tags: str | None = None,
+    due_date: str | None = None,
+) -> dict:
+    """Create several tasks at once, sharing priority, tags and due date."""
+    if not titles:
+        return {"error": "No titles given"}
+    if len(titles) > MAX_BATCH_OPERATIONS:
+        return {"error": f"At most {MAX_BATCH_OPERATIONS} tasks per call"}
+    operations = [
+        BatchOperation(op="create", title=title, priority=priority, tags=tags, due_date=due_date)
+        for title in titles
+    ]
+    with session_scope() as session:
+        return _run_batch(session, user_id, operations, "created")
+
+
+def bulk_complete_tasks(
+    user_id: str,
+    task_ids: list[int] | None = None,
+    tag: str | None = None,
+    search: str | None = None,
+) -> dict:
+    """Mark every pending task matching the ids / tag / search complete. Handles recurring tasks."""
+    if not (task_ids or tag or search):
+        return {"error": "Give task_ids, tag or search"}
+    with session_scope() as session:
+        ids = _matching_task_ids(session, user_id, task_ids, tag, search, status="pending")
+        if not ids:
+            return {"status": "completed", "count": 0, "tasks": []}
+        operations = [BatchOperation(op="complete", task_id=tid) for tid in ids[:MAX_BATCH_OPERATIONS]]
+        return _run_batch(session, user_id, operations, "completed", truncated=len(ids) > MAX_BATCH_OPERATIONS)
+
+
+def bulk_update_tasks(
+    user_id: str,
+    task_ids: list[int],
+    priority: str | None = None,
+    tags: str | None = None,
+    due_date: str | None = None,
+) -> dict:
+    """Set priority, tags and/or due date on several tasks."""
+    if not task_ids:
+        return {"error": "No task_ids given"}
+    if len(task_ids) > MAX_BATCH_OPERATIONS:
+        return {"error": f"At most {MAX_BATCH_OPERATIONS} tasks per call"}
+    operations = [
+        BatchOperation(op="update", task_id=tid, priority=priority, tags=tags, due_date=due_date)
+        for tid in task_ids
+    ]
+    with session_scope() as session:
+        return _run_batch(session, user_id, operations, "updated")
+
+
+def bulk_delete_tasks(
+    user_id: str,
+    task_ids: list[int] | None = None,
+    tag: str | None = None,
+    status: str | None = None,
+) -> dict:
+    """Delete every task matching the ids / tag / status ('pending' | 'completed')."""
+    if not (task_ids or tag or status in ("pending", "completed")):
+        return {"error": "Give task_ids, tag or status"}
+    with session_scope() as session:
+        ids = _matching_task_ids(session, user_id, task_ids, tag, status=status)
+        if not ids:
+            return {"status": "deleted", "count": 0, "tasks": []}
+        operations = [BatchOperation(op="delete", task_id=tid) for tid in ids[:MAX_BATCH_OPERATIONS]]
+        return _run_batch(session, user_id, operations, "deleted", truncated=len(ids) > MAX_BATCH_OPERATIONS)
@@ -0,0 +1,317 @@
+# RAG — approximate nearest-neighbour (IVF) index for large per-user task sets
+# [From]: specs/features/rag-chatbot.md (Vector Store)
+
+import hashlib
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+import numpy as np
+
+from backend.similarity import TaskVectorMatrix, normalize_rows
+
+RAG_INDEX = os.environ.get("RAG_INDEX", "exact").lower()  # exact | ivf
+ANN_MIN_TASKS = int(os.environ.get("ANN_MIN_TASKS", "20000"))  # Below this the exact scan is faster
+ANN_NPROBE = int(os.environ.get("ANN_NPROBE", "8"))
+ANN_INDEX_DIR = os.environ.get("ANN_INDEX_DIR", "ann_index")
+ANN_CACHE_USERS = int(os.environ.get("ANN_CACHE_USERS", "32"))
+ANN_RECALL_SAMPLE = float(os.environ.get("ANN_RECALL_SAMPLE", "0"))  # Fraction of searches also run exactly
+ANN_SAVE_INTERVAL = float(os.environ.get("ANN_SAVE_INTERVAL", "60"))  # Seconds between incremental saves
+
+
+class IVFIndex:
+    """Inverted-file index: spherical k-means centroids, one inverted list per centroid.
+
+    A query scores the `nprobe` closest centroids' lists exactly. Adds and removals only
+    touch the affected lists; the centroids are retrained once the index has grown well
+    past the size it was trained on (`needs_retrain`). `model` names the embedding model
+    the vectors came from and `stamp` the task stamp they were last reconciled at; both
+    are saved with the index.
+    """
+
+    def __init__(self, centroids: np.ndarray, model: str = ""):
+        self.centroids = normalize_rows(centroids)
+        self.dim = self.centroids.shape[1]
+        nlist = len(self.centroids)
+        self.list_ids = [np.zeros(0, dtype=np.int64) for _ in range(nlist)]
+        self.list_vectors = [np.zeros((0, self.dim), dtype=np.float32) for _ in range(nlist)]
+        self.hashes: dict[int, str] = {}    # task_id -> content hash of the indexed vector
+        self.assignment: dict[int, int] = {}  # task_id -> list number
+        self.trained_size = 0
+        self.model = model
+        self.stamp: tuple | None = None  # (task count, max task id, max updated_at)
+
+    def __len__(self) -> int:
+        return len(self.assignment)
+
+    @classmethod
+    def train(
+        cls,
+        task_ids: list[int],
+        vectors: np.ndarray,
+        hashes: list[str],
+        nlist: int | None = None,
+        iterations: int = 10,
+        seed: int = 0,
+        model: str = "",
+    ) -> "IVFIndex":
+        matrix = normalize_rows(vectors)
+        n = len(matrix)
+        nlist = nlist or max(1, int(np.sqrt(n)))
+        rng = np.random.default_rng(seed)
+        sample = matrix[rng.choice(n, size=min(n, 64 * nlist), replace=False)]
+        centroids = sample[rng.choice(len(sample), size=min(nlist, len(sample)), replace=False)].copy()
+        for _ in range(iterations):
+            nearest = _nearest(sample, centroids)
+            for c in range(len(centroids)):
+                members = sample[nearest == c]
+                if len(members):
+                    centroids[c] = members.sum(axis=0)
+                else:  # Re-seed empty clusters
+                    centroids[c] = sample[rng.integers(len(sample))]
+            centroids = normalize_rows(centroids)
+        index = cls(centroids, model)
+        index.add(task_ids, matrix, hashes)
+        index.trained_size = n
+        return index
+
+    def needs_retrain(self) -> bool:
+        return len(self) > 4 * max(self.trained_size, 1)
+
+    def add(self, task_ids: list[int], vectors: np.ndarray, hashes: list[str]) -> None:
+        if not len(task_ids):
+            return
+        self.remove([tid for tid in task_ids if tid in self.assignment])
+        matrix = normalize_rows(vectors)
+        ids = np.asarray(task_ids, dtype=np.int64)
+        nearest = _nearest(matrix, self.centroids)
+        for c in np.unique(nearest):
+            mask = nearest == c
+            self.list_ids[c] = np.concatenate([self.list_ids[c], ids[mask]])
+            self.list_vectors[c] = np.concatenate([self.list_vectors[c], matrix[mask]])
+        for tid, c, h in zip(task_ids, nearest.tolist(), hashes):
+            self.assignment[tid] = c
+            self.hashes[tid] = h
+
+    def remove(self, task_ids: list[int]) -> None:
+        by_list: dict[int, list[int]] = {}
+        for tid in task_ids:
+            c = self.assignment.pop(tid, None)
+            self.hashes.pop(tid, None)
+            if c is not None:
+                by_list.setdefault(c, []).append(tid)
+        for c, tids in by_list.items():
+            keep = ~np.isin(self.list_ids[c], tids)
+            self.list_ids[c] = self.list_ids[c][keep]
+            self.list_vectors[c] = self.list_vectors[c][keep]
+
+    def top_k(self, query: list[float] | np.ndarray, k: int, nprobe: int = ANN_NPROBE) -> list[tuple[int, float]]:
+        q = np.asarray(query, dtype=np.float32)
+        q_norm = float(np.linalg.norm(q))
+        if q_norm == 0 or k <= 0 or not len(self):
+            return []
+        q = q / q_norm
+        nprobe = min(nprobe, len(self.centroids))
+        probe = np.argpartition(self.centroids @ q, len(self.centroids) - nprobe)[-nprobe:]
+        ids = [self.list_ids[c] for c in probe if len(self.list_ids[c])]
+        if not ids:
+            return []
+        scores = np.concatenate([self.list_vectors[c] @ q for c in probe if len(self.list_ids[c])])
+        ids = np.concatenate(ids)
+        n = len(scores)
+        top = np.argpartition(scores, n - k)[n - k:] if k < n else np.arange(n)
+        top = top[np.argsort(scores[top])[::-1]]
+        return list(zip(ids[top].tolist(), scores[top].tolist()))
+
+    def save(self, path: str) -> None:
+        """Atomic write (temp file + rename) so a crash never leaves a torn index."""
+        sizes = np.asarray([len(ids) for ids in self.list_ids], dtype=np.int64)
+        ids = np.concatenate(self.list_ids) if len(self) else np.zeros(0, dtype=np.int64)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(
+            tmp,
+            centroids=self.centroids,
+            sizes=sizes,
+            ids=ids,
+            vectors=np.concatenate(self.list_vectors) if len(self) else np.zeros((0, self.dim), dtype=np.float32),
+            hashes=np.asarray([self.hashes[tid] for tid in ids.tolist()], dtype="U64"),
+            trained_size=np.asarray(self.trained_size),
+            model=np.asarray(self.model),
+            stamp=np.asarray(_stamp_fields(self.stamp)),
+        )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "IVFIndex":
+        with np.load(path) as data:
+            # Files written before `model` was saved load as model "" and get retrained
+            index = cls(data["centroids"], str(data["model"]) if "model" in data else "")
+            offsets = np.concatenate([[0], np.cumsum(data["sizes"])])
+            ids, vectors, hashes = data["ids"], data["vectors"], data["hashes"].tolist()
+            index.trained_size = int(data["trained_size"])
+            if "stamp" in data:
+                index.stamp = _parse_stamp(data["stamp"].tolist())
+        for c in range(len(index.centroids)):
+            start, end = offsets[c], offsets[c + 1]
+            index.list_ids[c] = ids[start:end].copy()
+            index.list_vectors[c] = vectors[start:end].copy()
+            for tid, h in zip(index.list_ids[c].tolist(), hashes[start:end]):
+                index.assignment[tid] = c
+                index.hashes[tid] = h
+        return index
+
+
+def _stamp_fields(stamp: tuple | None) -> list[str]:
+    if stamp is None:
+        return []
+    count, max_id, max_updated = stamp
+    return [str(count), "" if max_id is None else str(max_id), max_updated.isoformat() if max_updated else ""]
+
+
+def _parse_stamp(fields: list[str]) -> tuple | None:
+    if not fields:
+        return None
+    count, max_id, max_updated = fields
+    return (
+        int(count),
+        int(max_id) if max_id else None,
+        datetime.fromisoformat(max_updated) if max_updated else None,
+    )
+
+
+def _nearest(matrix: np.ndarray, centroids: np.ndarray, chunk: int = 8192) -> np.ndarray:
+    """Index of the most similar centroid for each row (chunked to bound memory)."""
+    out = np.empty(len(matrix), dtype=np.int64)
+    for start in range(0, len(matrix), chunk):
+        out[start:start + chunk] = np.argmax(matrix[start:start + chunk] @ centroids.T, axis=1)
+    return out
+
+
+def measure_recall(
+    index: IVFIndex,
+    exact: TaskVectorMatrix,
+    queries: list[list[float]] | np.ndarray,
+    k: int = 10,
+    nprobe: int = ANN_NPROBE,
+) -> dict:
+    """Recall@k of the IVF index against the exact scan, plus mean latency of each."""
+    hits = 0
+    total = 0
+    ann_time = exact_time = 0.0
+    for query in queries:
+        start = time.perf_counter()
+        approx = {tid for tid, _ in index.top_k(query, k, nprobe)}
+        ann_time += time.perf_counter() - start
+        start = time.perf_counter()
+        truth = {tid for tid, _ in exact.top_k(query, k)}
+        exact_time += time.perf_counter() - start
+        hits += len(approx & truth)
+        total += len(truth)
+    n = max(len(queries), 1)
+    return {
+        "recall": hits / total if total else 1.0,
+        "ann_ms": ann_time / n * 1e3,
+        "exact_ms": exact_time / n * 1e3,
+        "nprobe": nprobe,
+        "k": k,
+    }
+
+
+class IndexStore:
+    """Per-user IVF indexes: bounded in-memory LRU backed by .npz files in ANN_INDEX_DIR.
+
+    A freshly trained index is written immediately; incremental changes are written at
+    most every ANN_SAVE_INTERVAL seconds (and by `flush`). A file that lags the DB is
+    harmless: callers reconcile the loaded index from its saved stamp onwards.
+    """
+
+    def __init__(self, directory: str = ANN_INDEX_DIR, max_users: int = ANN_CACHE_USERS):
+        self.directory = directory
+        self.max_users = max_users
+        self._indexes: OrderedDict[str, IVFIndex] = OrderedDict()
+        self._lock = threading.Lock()
+        self._user_locks: dict[str, threading.Lock] = {}
+        self._saved_at: dict[str, float] = {}
+        self._dirty: set[str] = set()
+        # Online recall sampling (ANN_RECALL_SAMPLE)
+        self.recall_samples = 0
+        self.recall_sum = 0.0
+
+    def path(self, user_id: str) -> str:
+        name = hashlib.sha256(user_id.encode("utf-8")).hexdigest()[:32]
+        return os.path.join(self.directory, f"{name}.npz")
+
+    def user_lock(self, user_id: str) -> threading.Lock:
+        with self._lock:
+            return self._user_locks.setdefault(user_id, threading.Lock())
+
+    def get(self, user_id: str) -> IVFIndex | None:
+        with self._lock:
+            index = self._indexes.get(user_id)
+            if index is not None:
+                self._indexes.move_to_end(user_id)
+                return index
+        path = self.path(user_id)
+        if not os.path.exists(path):
+            return None
+        try:
+            index = IVFIndex.load(path)
+        except Exception as e:
+            print(f"Warning: Discarding unreadable ANN index {path}: {e}")
+            return None
+        self._remember(user_id, index)
+        return index
+
+    def put(self, user_id: str, index: IVFIndex, force: bool = False) -> None:
+        self._remember(user_id, index)
+        now = time.monotonic()
+        if force or now - self._saved_at.get(user_id, 0.0) >= ANN_SAVE_INTERVAL:
+            index.save(self.path(user_id))
+            self._saved_at[user_id] = now
+            self._dirty.discard(user_id)
+        else:
+            self._dirty.add(user_id)
+
+    def flush(self) -> None:
+        """Write every index with unsaved incremental changes (e.g. on shutdown)."""
+        for user_id in list(self._dirty):
+            with self._lock:
+                index = self._indexes.get(user_id)
+            if index is not None:
+                with self.user_lock(user_id):
+                    self.put(user_id, index, force=True)
+            self._dirty.discard(user_id)
+
+    def _remember(self, user_id: str, index: IVFIndex) -> None:
+        with self._lock:
+            self._indexes[user_id] = index
+            self._indexes.move_to_end(user_id)
+            while len(self._indexes) > self.max_users:
+                evicted, evicted_index = self._indexes.popitem(last=False)
+                if evicted in self._dirty:
+                    evicted_index.save(self.path(evicted))
+                    self._dirty.discard(evicted)
+
+    def maybe_sample_recall(self, index: IVFIndex, exact_factory, query, k: int) -> None:
+        """With probability ANN_RECALL_SAMPLE, compare this search with the exact scan."""
+        if ANN_RECALL_SAMPLE <= 0 or random.random() >= ANN_RECALL_SAMPLE:
+            return
+        result = measure_recall(index, exact_factory(), [query], k=k)
+        with self._lock:
+            self.recall_samples += 1
+            self.recall_sum += result["recall"]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "indexes_in_memory": len(self._indexes),
+                "recall_samples": self.recall_samples,
+                "mean_recall": self.recall_sum / self.recall_samples if self.recall_samples else None,
+            }
+
+
+index_store = IndexStore()
@@ -1,7 +1,12 @@
-# Phase II — JWT verification (Better Auth shared secret)
+# Phase II — JWT verification (Better Auth shared secret, or asymmetric keys from a JWKS)
 # [From]: Hackathon spec — BETTER_AUTH_SECRET, Authorization: Bearer <token>
 
+import json
 import os
+import threading
+import time
+import urllib.request
+from collections import OrderedDict
 from typing import Annotated
 
 import jwt
@@ -9,37 +14,135 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 
 BETTER_AUTH_SECRET = os.environ.get("BETTER_AUTH_SECRET", "change-me-in-production")
+AUTH_JWKS_URL = os.environ.get("AUTH_JWKS_URL", "")  # e.g. https://<frontend>/api/auth/jwks; empty = HS256 only
+AUTH_JWKS_REFRESH = float(os.environ.get("AUTH_JWKS_REFRESH", "300"))     # Seconds between keyset refreshes
+AUTH_TOKEN_CACHE_SIZE = int(os.environ.get("AUTH_TOKEN_CACHE_SIZE", "4096"))
+AUTH_TOKEN_CACHE_TTL = float(os.environ.get("AUTH_TOKEN_CACHE_TTL", "300"))  # Never past the token's exp
+ASYMMETRIC_ALGORITHMS = ["RS256", "ES256", "EdDSA"]
 HTTPBearerScheme = HTTPBearer(auto_error=False)
 
 
-def get_current_user_id(
+class JWKSCache:
+    """Keys by kid from a JWKS endpoint, refreshed by a background thread.
+
+    Verification only reads the in-memory keyset, so it never waits on the network. An
+    unknown kid (keys rotated since the last fetch) wakes the refresher early; that
+    token is rejected until the new keyset has landed.
+    """
+
+    def __init__(self, url: str, refresh_interval: float = AUTH_JWKS_REFRESH, timeout: float = 5.0):
+        self.url = url
+        self.refresh_interval = refresh_interval
+        self.timeout = timeout
+        self._keys: dict[str, jwt.PyJWK] = {}
+        self._thread: threading.Thread | None = None
+        self._stopping = threading.Event()
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+
+    def refresh(self) -> None:
+        with urllib.request.urlopen(self.url, timeout=self.timeout) as response:
+            keyset = jwt.PyJWKSet.from_dict(json.load(response))
+        self._keys = {key.key_id: key for key in keyset.keys if key.key_id}  # Swapped whole
+
+    def get(self, kid: str | None) -> jwt.PyJWK | None:
+        key = self._keys.get(kid) if kid else None
+        if key is None:
+            self._wake.set()
+        return key
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="jwks-refresh", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stopping.set()
+        self._wake.set()
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Warning: JWKS refresh from {self.url} failed: {e}")
+            self._wake.wait(self.refresh_interval)
+            self._wake.clear()
+            self._stopping.wait(1.0)  # At most one fetch a second, however many unknown kids arrive
+
+
+jwks_cache = JWKSCache(AUTH_JWKS_URL) if AUTH_JWKS_URL else None
+
+
+class TokenCache:
+    """Bounded LRU of verified token -> (user_id, expires at), expiring with the token's exp.
+
+    Used only from the event loop, so no lock.
+    """
+
+    def __init__(self, max_size: int = AUTH_TOKEN_CACHE_SIZE, ttl: float = AUTH_TOKEN_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[str, float]] = OrderedDict()
+
+    def get(self, token: str) -> str | None:
+        entry = self._entries.get(token)
+        if entry is None:
+            return None
+        if time.time() >= entry[1]:
+            del self._entries[token]
+            return None
+        self._entries.move_to_end(token)
+        return entry[0]
+
+    def put(self, token: str, user_id: str, exp: float | None) -> None:
+        expires_at = time.time() + self.ttl
+        if exp is not None:
+            expires_at = min(expires_at, float(exp))
+        self._entries[token] = (user_id, expires_at)
+        self._entries.move_to_end(token)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+
+token_cache = TokenCache()
+
+
+def _unauthorized(detail: str) -> HTTPException:
+    return HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=detail)
+
+
+def verify_token(token: str) -> tuple[str, float | None]:
+    """Full verification. -> (user id, exp). Raises jwt.InvalidTokenError or 401."""
+    header = jwt.get_unverified_header(token)
+    if header.get("alg") in ASYMMETRIC_ALGORITHMS and jwks_cache is not None:
+        key = jwks_cache.get(header.get("kid"))
+        if key is None:
+            raise jwt.InvalidTokenError("Unknown signing key")
+        payload = jwt.decode(token, key, algorithms=ASYMMETRIC_ALGORITHMS)
+    else:
+        payload = jwt.decode(token, BETTER_AUTH_SECRET, algorithms=["HS256"])
+    user_id = payload.get("userId") or payload.get("sub")
+    if not user_id:
+        raise _unauthorized("Token missing user identifier")
+    return str(user_id), payload.get("exp")
+
+
+async def get_current_user_id(
     credentials: Annotated[HTTPAuthorizationCredentials | None, Depends(HTTPBearerScheme)],
 ) -> str:
     if not credentials:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Missing or invalid authorization header",
-        )
+        raise _unauthorized("Missing or invalid authorization header")
+    token = credentials.credentials
+    user_id = token_cache.get(token)
+    if user_id is not None:
+        return user_id
     try:
-        # Debug: print token prefix
-        # print(f"DEBUG: Token prefix: {credentials.credentials[:10]}...", flush=True)
-        payload = jwt.decode(
-            credentials.credentials,
-            BETTER_AUTH_SECRET,
-            algorithms=["HS256"],
-        )
-        user_id = payload.get("userId") or payload.get("sub")
-        if not user_id:
-            print(f"DEBUG: Token missing userId/sub. Payload keys: {list(payload.keys())}", flush=True)
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Token missing user identifier",
-            )
-        return str(user_id)
-    except jwt.InvalidTokenError as e:
-        print(f"DEBUG: InvalidTokenError: {e}", flush=True)
-        print(f"DEBUG: Secret used: {BETTER_AUTH_SECRET[:5]}...", flush=True)
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid or expired token",
-        )
+        user_id, exp = verify_token(token)
+    except jwt.InvalidTokenError:
+        raise _unauthorized("Invalid or expired token")
+    token_cache.put(token, user_id, exp)
+    return user_id
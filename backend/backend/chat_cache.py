@@ -0,0 +1,161 @@
+# Phase III — hot conversation cache: recent history tails kept between chat turns
+# [From]: specs/features/chatbot.md (Conversation Logic), specs/deployment/phase5-cloud.md (Dapr state)
+
+import json
+import os
+from collections import OrderedDict
+
+CHAT_CACHE_SIZE = int(os.environ.get("CHAT_CACHE_SIZE", "1024"))  # Conversations per process
+CHAT_CACHE_STORE = os.environ.get("CHAT_CACHE_STORE", "")         # Dapr state store shared by workers; empty = local only
+CHAT_CACHE_TTL = int(os.environ.get("CHAT_CACHE_TTL", "3600"))    # Seconds an entry lives in the shared store
+
+
+class CachedConversation:
+    """What a chat turn needs from the DB: owner, summary and the unsummarized tail.
+
+    `version` mirrors conversations.version, which every write bumps; an entry is only
+    advanced when the write it records is the next version, otherwise it is dropped.
+    """
+
+    def __init__(
+        self,
+        conversation_id: int,
+        user_id: str,
+        version: int = 0,
+        summary: str | None = None,
+        summary_through: int = 0,
+        rows: list[tuple[int, str, str]] | None = None,
+    ):
+        self.conversation_id = conversation_id
+        self.user_id = user_id
+        self.version = version
+        self.summary = summary
+        self.summary_through = summary_through
+        self.rows = rows or []  # (message id, role, content), oldest first
+
+    def to_json(self) -> str:
+        return json.dumps([
+            self.conversation_id, self.user_id, self.version, self.summary, self.summary_through, self.rows,
+        ])
+
+    @classmethod
+    def from_json(cls, raw: str | bytes) -> "CachedConversation":
+        conversation_id, user_id, version, summary, summary_through, rows = json.loads(raw)
+        return cls(conversation_id, user_id, version, summary, summary_through, [tuple(r) for r in rows])
+
+
+class DaprStateStore:
+    """Shared tier over a Dapr state store (async client, opened on first use)."""
+
+    def __init__(self, store_name: str, ttl: int = CHAT_CACHE_TTL):
+        self.store_name = store_name
+        self.ttl = ttl
+        self._client = None
+
+    def _get_client(self):
+        if self._client is None:
+            from dapr.aio.clients import DaprClient
+
+            self._client = DaprClient()
+        return self._client
+
+    async def get(self, conversation_id: int) -> CachedConversation | None:
+        response = await self._get_client().get_state(self.store_name, f"conversation-{conversation_id}")
+        return CachedConversation.from_json(response.data) if response.data else None
+
+    async def save(self, entry: CachedConversation) -> None:
+        await self._get_client().save_state(
+            self.store_name,
+            f"conversation-{entry.conversation_id}",
+            entry.to_json(),
+            state_metadata={"ttlInSeconds": str(self.ttl)},
+        )
+
+    async def delete(self, conversation_id: int) -> None:
+        await self._get_client().delete_state(self.store_name, f"conversation-{conversation_id}")
+
+
+class ConversationCache:
+    """In-process LRU of CachedConversation by id, optionally backed by a shared store.
+
+    Callers pass the conversation's current version (a primary-key read of
+    conversations.version) and only a copy stamped with exactly that version is served,
+    so turns saved by another worker are never left out. The shared store lets one
+    worker reuse the tail another one cached. Store errors are logged and treated as
+    misses.
+    """
+
+    def __init__(self, max_entries: int = CHAT_CACHE_SIZE, store=None, max_rows: int = 100):
+        self.max_entries = max_entries
+        self.store = store
+        self.max_rows = max_rows
+        self._entries: OrderedDict[int, CachedConversation] = OrderedDict()
+        self._counts = {"hits": 0, "misses": 0, "stale": 0, "invalidations": 0, "store_errors": 0}
+
+    def _put_local(self, entry: CachedConversation) -> None:
+        entry.rows = entry.rows[-self.max_rows:]
+        self._entries[entry.conversation_id] = entry
+        self._entries.move_to_end(entry.conversation_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def _store_call(self, method: str, arg):
+        try:
+            return await getattr(self.store, method)(arg)
+        except Exception as e:
+            self._counts["store_errors"] += 1
+            print(f"Warning: Conversation cache store {method} failed: {e}")
+            return None
+
+    async def get(self, conversation_id: int, version: int) -> CachedConversation | None:
+        """The cached copy at `version` (conversations.version now), else None."""
+        entry = self._entries.get(conversation_id)
+        if (entry is None or entry.version != version) and self.store is not None:
+            entry = await self._store_call("get", conversation_id) or entry
+        if entry is None or entry.version != version:
+            self._counts["stale" if entry is not None else "misses"] += 1
+            return None
+        self._counts["hits"] += 1
+        self._put_local(entry)
+        return entry
+
+    async def put(self, entry: CachedConversation) -> None:
+        self._put_local(entry)
+        if self.store is not None:
+            await self._store_call("save", entry)
+
+    async def invalidate(self, conversation_id: int) -> None:
+        self._counts["invalidations"] += 1
+        self._entries.pop(conversation_id, None)
+        if self.store is not None:
+            await self._store_call("delete", conversation_id)
+
+    async def record_turn(self, conversation_id: int, version: int, rows: list[tuple[int, str, str]]) -> None:
+        """Messages committed as `version`: append them, or drop a copy that missed a write."""
+        entry = self._entries.get(conversation_id)
+        if entry is None or entry.version != version - 1:
+            await self.invalidate(conversation_id)  # Shared copy too: it may be the stale one
+            return
+        entry.rows.extend(rows)
+        entry.version = version
+        await self.put(entry)
+
+    async def record_summary(self, conversation_id: int, version: int, summary: str, summary_through: int) -> None:
+        entry = self._entries.get(conversation_id)
+        if entry is None or entry.version != version - 1:
+            await self.invalidate(conversation_id)  # Shared copy too: it may be the stale one
+            return
+        entry.summary = summary
+        entry.summary_through = summary_through
+        entry.rows = [row for row in entry.rows if row[0] > summary_through]
+        entry.version = version
+        await self.put(entry)
+
+    def stats(self) -> dict:
+        lookups = self._counts["hits"] + self._counts["misses"]
+        return {
+            **self._counts,
+            "entries": len(self._entries),
+            "hit_rate": self._counts["hits"] / lookups if lookups else 0.0,
+            "shared_store": getattr(self.store, "store_name", None),
+        }
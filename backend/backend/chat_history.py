@@ -0,0 +1,206 @@
+# Phase III — bounded chat history: token-budgeted tail + persisted rolling summary
+# [From]: specs/features/chatbot.md (Conversation Logic)
+
+import math
+import os
+import threading
+from datetime import datetime
+
+from sqlalchemy import insert, update
+from sqlmodel import col, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from backend.chat_cache import CHAT_CACHE_SIZE, CHAT_CACHE_STORE, CachedConversation, ConversationCache, DaprStateStore
+from backend.database import async_engine
+from backend.models import Conversation, Message
+
+HISTORY_TOKENS = int(os.environ.get("CHAT_HISTORY_TOKENS", "4000"))            # Prompt budget for verbatim turns
+HISTORY_MAX_MESSAGES = int(os.environ.get("CHAT_HISTORY_MAX_MESSAGES", "100"))  # Rows fetched per turn
+SUMMARY_BATCH = int(os.environ.get("CHAT_SUMMARY_BATCH", "20"))    # Fold once this many turns fell out of the window
+SUMMARY_MAX_CHARS = int(os.environ.get("CHAT_SUMMARY_MAX_CHARS", "4000"))
+SUMMARY_FOLD_LIMIT = 200  # Messages folded per pass; a long backlog catches up over several turns
+
+conversation_cache = ConversationCache(
+    CHAT_CACHE_SIZE,
+    store=DaprStateStore(CHAT_CACHE_STORE) if CHAT_CACHE_STORE else None,
+    max_rows=HISTORY_MAX_MESSAGES,
+)
+
+SUMMARY_PROMPT = (
+    "Update the running summary of a conversation between a user and their todo assistant. "
+    "Keep facts the assistant may need later: tasks mentioned (ids, titles), decisions, preferences. "
+    "Reply with the summary only, at most {words} words.\n\n"
+    "Current summary:\n{summary}\n\nNew turns:\n{turns}"
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about 4 characters a token) plus per-message overhead."""
+    return math.ceil(len(text or "") / 4) + 4
+
+
+async def load_conversation(session: AsyncSession, user_id: str, conversation_id: int) -> CachedConversation | None:
+    """The conversation's owner, summary and history tail; None if missing or not the user's.
+
+    The row is always read (primary key), and the cached tail is used only when it is
+    stamped with the row's current version, so turns saved by another worker are never
+    missed. On a miss: at most HISTORY_MAX_MESSAGES of the newest unsummarized messages
+    (descending on the (conversation_id, id) index).
+    """
+    conv = await session.get(Conversation, conversation_id)
+    if conv is None or conv.user_id != user_id:
+        return None
+    entry = await conversation_cache.get(conversation_id, conv.version)
+    if entry is None:
+        rows = (await session.exec(
+            select(Message.id, Message.role, Message.content)
+            .where(Message.conversation_id == conversation_id, col(Message.id) > conv.summary_through)
+            .order_by(col(Message.id).desc())
+            .limit(HISTORY_MAX_MESSAGES)
+        )).all()
+        entry = CachedConversation(
+            conv.id, conv.user_id, conv.version, conv.summary, conv.summary_through,
+            [tuple(row) for row in reversed(rows)],
+        )
+        await conversation_cache.put(entry)
+    return entry
+
+
+async def create_conversation(session: AsyncSession, user_id: str) -> CachedConversation:
+    conv = Conversation(user_id=user_id)
+    session.add(conv)
+    await session.commit()
+    entry = CachedConversation(conv.id, user_id)
+    await conversation_cache.put(entry)
+    return entry
+
+
+def build_window(entry: CachedConversation, new_message: str) -> tuple[list[dict], int | None]:
+    """-> (messages to send, ending with `new_message`; id to fold the summary up to, or None).
+
+    Keeps the newest cached turns that fit HISTORY_TOKENS. The summary, when there is
+    one, goes first as a user/model exchange so turns still alternate. Once
+    SUMMARY_BATCH or more turns have dropped out of the window, the second value asks
+    the caller to fold them into the summary.
+    """
+    rows = entry.rows
+    budget = HISTORY_TOKENS - estimate_tokens(new_message)
+    if entry.summary:
+        budget -= estimate_tokens(entry.summary)
+    start = len(rows)
+    while start > 0:
+        budget -= estimate_tokens(rows[start - 1][2])
+        if budget < 0:
+            break
+        start -= 1
+    while start < len(rows) and rows[start][1] != "user":
+        start += 1  # Start on a user turn
+    window = rows[start:]
+
+    messages = []
+    if entry.summary:
+        messages.append({"role": "user", "content": "Summarize our conversation so far."})
+        messages.append({"role": "assistant", "content": entry.summary})
+    messages.extend({"role": role, "content": content} for _, role, content in window)
+    messages.append({"role": "user", "content": new_message})
+
+    fold_before = None
+    if start and (start >= SUMMARY_BATCH or len(rows) >= HISTORY_MAX_MESSAGES):
+        fold_before = window[0][0] if window else rows[-1][0] + 1
+    return messages, fold_before
+
+
+async def save_turn(session: AsyncSession, user_id: str, conversation_id: int, user_content: str, reply: str) -> None:
+    """Both messages (one multi-row INSERT) and the version bump in one transaction; the cache follows."""
+    now = datetime.utcnow()
+    turn = [("user", user_content), ("assistant", reply)]
+    ids = sorted((await session.exec(
+        insert(Message)
+        .values([
+            {"user_id": user_id, "conversation_id": conversation_id, "role": role, "content": content, "created_at": now}
+            for role, content in turn
+        ])
+        .returning(Message.id)
+    )).scalars())  # Ascending ids follow insertion order
+    version = (await session.exec(
+        update(Conversation)
+        .where(Conversation.id == conversation_id)
+        .values(version=Conversation.version + 1, updated_at=now)
+        .returning(Conversation.version)
+    )).scalar_one()
+    await session.commit()
+    await conversation_cache.record_turn(
+        conversation_id, version, [(message_id, role, content) for message_id, (role, content) in zip(ids, turn)]
+    )
+
+
+def _extractive_summary(summary: str | None, turns: list[tuple[str, str]]) -> str:
+    """No-model fallback: the newest turns, clipped, appended to the old summary."""
+    lines = [summary] if summary else []
+    lines += [f"{role}: {' '.join(content.split())[:200]}" for role, content in turns]
+    text = "\n".join(lines)
+    return text[-SUMMARY_MAX_CHARS:]
+
+
+_summary_model = None
+_summary_lock = threading.Lock()
+
+
+async def summarize(summary: str | None, turns: list[tuple[str, str]]) -> str:
+    """New rolling summary covering `summary` plus `turns` ([(role, content)])."""
+    global _summary_model
+    if not os.environ.get("GEMINI_API_KEY"):
+        return _extractive_summary(summary, turns)
+    try:
+        with _summary_lock:
+            if _summary_model is None:
+                import google.generativeai as genai
+
+                from backend.agent import GEMINI_MODEL
+
+                genai.configure(api_key=os.environ.get("GEMINI_API_KEY"))
+                _summary_model = genai.GenerativeModel(model_name=GEMINI_MODEL)
+        prompt = SUMMARY_PROMPT.format(
+            words=SUMMARY_MAX_CHARS // 8,
+            summary=summary or "(none)",
+            turns="\n".join(f"{role}: {content}" for role, content in turns),
+        )
+        response = await _summary_model.generate_content_async(prompt)
+        return response.text.strip()[:SUMMARY_MAX_CHARS]
+    except Exception as e:
+        print(f"Warning: Conversation summary failed, keeping an extractive one: {e}")
+        return _extractive_summary(summary, turns)
+
+
+async def fold_summary(conversation_id: int, fold_before: int) -> None:
+    """Fold unsummarized messages older than `fold_before` into the conversation summary.
+
+    Runs after the reply is out (own session). The write only lands if no concurrent
+    fold moved summary_through meanwhile.
+    """
+    async with AsyncSession(async_engine) as session:
+        conv = await session.get(Conversation, conversation_id)
+        if conv is None or conv.summary_through >= fold_before - 1:
+            return
+        rows = (await session.exec(
+            select(Message.id, Message.role, Message.content)
+            .where(
+                Message.conversation_id == conversation_id,
+                col(Message.id) > conv.summary_through,
+                col(Message.id) < fold_before,
+            )
+            .order_by(Message.id)
+            .limit(SUMMARY_FOLD_LIMIT)
+        )).all()
+        if not rows:
+            return
+        new_summary = await summarize(conv.summary, [(row.role, row.content) for row in rows])
+        version = (await session.exec(
+            update(Conversation)
+            .where(Conversation.id == conversation_id, Conversation.summary_through == conv.summary_through)
+            .values(summary=new_summary, summary_through=rows[-1].id, version=Conversation.version + 1)
+            .returning(Conversation.version)
+        )).scalar_one_or_none()
+        await session.commit()
+    if version is not None:
+        await conversation_cache.record_summary(conversation_id, version, new_summary, rows[-1].id)
@@ -2,13 +2,167 @@
 # [From]: specs (Phase II API, database)
 
 import os
+import threading
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import event, inspect, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool
 from sqlmodel import Session, create_engine, SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 DATABASE_URL = os.environ.get(
     "DATABASE_URL",
     "sqlite:///todo.db",
 )
-engine = create_engine(DATABASE_URL, echo=os.environ.get("SQL_ECHO", "").lower() == "1")
+SQL_ECHO = os.environ.get("SQL_ECHO", "").lower() == "1"
+
+# Connection pool (per engine, per process). "null" opens a connection per checkout:
+# for serverless or when an external pooler sits in front. "pgbouncer" is "null" plus
+# no server-side prepared statements (PgBouncer / Neon pooler in transaction mode).
+DB_POOL_MODE = os.environ.get("DB_POOL_MODE", "queue").lower()  # queue | null | pgbouncer
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "30"))  # Seconds to wait for a free connection
+DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", "1800"))  # Seconds; below the server/pooler idle timeout
+DB_POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING", "1") == "1"  # Test connections on checkout (stale after idle)
+
+
+class PoolMetrics:
+    """Checkout, wait, timeout and connect counters for one engine's pool."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.connects = 0
+        self.invalidations = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def record_wait(self, seconds: float) -> None:
+        with self._lock:
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+
+    def incr(self, name: str) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def snapshot(self, pool) -> dict:
+        with self._lock:
+            stats = {
+                "mode": DB_POOL_MODE,
+                "checkouts": self.checkouts,
+                "connects": self.connects,
+                "invalidations": self.invalidations,
+                "timeouts": self.timeouts,
+                "wait_ms_mean": self.wait_total / self.checkouts * 1e3 if self.checkouts else 0.0,
+                "wait_ms_max": self.wait_max * 1e3,
+            }
+        if isinstance(pool, QueuePool):
+            stats.update(size=pool.size(), checked_out=pool.checkedout(), overflow=pool.overflow())
+        return stats
+
+
+def _instrumented(pool_class, metrics: PoolMetrics):
+    """`pool_class` that times every wait for a connection and counts timeouts."""
+
+    class InstrumentedPool(pool_class):
+        def _do_get(self):
+            start = time.perf_counter()
+            try:
+                return super()._do_get()
+            except PoolTimeoutError:
+                metrics.incr("timeouts")
+                raise
+            finally:
+                metrics.record_wait(time.perf_counter() - start)
+
+    InstrumentedPool.__name__ = f"Instrumented{pool_class.__name__}"
+    return InstrumentedPool
+
+
+def _pool_kwargs(url: str, metrics: PoolMetrics, is_async: bool) -> dict:
+    if make_url(url).database in (None, "", ":memory:"):
+        return {}  # In-memory SQLite: one connection, default pool
+    if DB_POOL_MODE in ("null", "pgbouncer"):
+        return {"poolclass": NullPool, "pool_pre_ping": DB_POOL_PRE_PING}
+    if DB_POOL_MODE != "queue":
+        raise ValueError(f"Unknown DB_POOL_MODE: {DB_POOL_MODE!r} (expected queue, null or pgbouncer)")
+    return {
+        "poolclass": _instrumented(AsyncAdaptedQueuePool if is_async else QueuePool, metrics),
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+
+def _watch_pool(sync_engine, metrics: PoolMetrics) -> None:
+    event.listen(sync_engine, "checkout", lambda *args: metrics.incr("checkouts"))
+    event.listen(sync_engine, "connect", lambda *args: metrics.incr("connects"))
+    event.listen(sync_engine, "invalidate", lambda *args: metrics.incr("invalidations"))
+
+
+def async_url(url: str) -> tuple[str, dict]:
+    """Sync DATABASE_URL -> (async driver URL, connect_args): asyncpg for Postgres, aiosqlite for SQLite.
+
+    asyncpg takes no libpq query options, so Neon's `sslmode` moves to connect_args
+    and `channel_binding` is dropped. In pgbouncer mode asyncpg's statement caches are
+    disabled (prepared statements do not survive transaction pooling).
+    """
+    parsed = make_url(url)
+    connect_args = {}
+    if parsed.get_backend_name() in ("postgresql", "postgres"):
+        query = dict(parsed.query)
+        sslmode = query.pop("sslmode", None)
+        query.pop("channel_binding", None)
+        if sslmode:
+            connect_args["ssl"] = sslmode
+        if DB_POOL_MODE == "pgbouncer":
+            connect_args["statement_cache_size"] = 0
+            query["prepared_statement_cache_size"] = "0"
+        parsed = parsed.set(drivername="postgresql+asyncpg", query=query)
+    elif parsed.get_backend_name() == "sqlite":
+        parsed = parsed.set(drivername="sqlite+aiosqlite")
+    return parsed.render_as_string(hide_password=False), connect_args
+
+
+pool_metrics = PoolMetrics()
+engine = create_engine(DATABASE_URL, echo=SQL_ECHO, **_pool_kwargs(DATABASE_URL, pool_metrics, is_async=False))
+_watch_pool(engine, pool_metrics)
+
+ASYNC_DATABASE_URL, _async_connect_args = async_url(DATABASE_URL)
+async_pool_metrics = PoolMetrics()
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    echo=SQL_ECHO,
+    connect_args=_async_connect_args,
+    **_pool_kwargs(ASYNC_DATABASE_URL, async_pool_metrics, is_async=True),
+)
+_watch_pool(async_engine.sync_engine, async_pool_metrics)
+
+
+def pool_stats() -> dict:
+    return {
+        "sync": pool_metrics.snapshot(engine.pool),
+        "async": async_pool_metrics.snapshot(async_engine.sync_engine.pool),
+    }
+
+
+_UPSERT = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+def upsert(session: Session, model, values: dict, key: str, update: dict):
+    """INSERT ... ON CONFLICT (key) DO UPDATE SET `update` for the session's dialect."""
+    insert = _UPSERT[session.get_bind().dialect.name]
+    return insert(model).values(**values).on_conflict_do_update(index_elements=[key], set_=update)
 
 
 def get_session():
@@ -16,6 +170,59 @@ def get_session():
         yield session
 
 
+async def get_async_session():
+    """Request-scoped AsyncSession; sync helpers run on it through `session.run_sync`."""
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        yield session
+
+
+@contextmanager
+def session_scope():
+    """Short-lived session for tool calls and workers: rolled back on error, and objects
+    stay readable after commit (no refresh round-trip)."""
+    with Session(engine, expire_on_commit=False) as session:
+        try:
+            yield session
+        except Exception:
+            session.rollback()
+            raise
+
+
 def init_db():
-    from backend.models import Conversation, Message, Task  # noqa: F401 — register tables
+    from backend.models import Conversation, Message, OutboxEvent, Task, TaskEmbedding, TaskOccurrence, TaskTag, TaskTombstone, UserSyncState  # noqa: F401 — register tables
+    from backend.tags import backfill_task_tags
     SQLModel.metadata.create_all(engine)
+    add_missing_columns()
+    create_missing_indexes()
+    with Session(engine) as session:
+        backfill_task_tags(session)
+
+
+def add_missing_columns():
+    """create_all never alters existing tables; ADD COLUMN any new model columns.
+
+    New columns must be nullable or carry a server_default.
+    """
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    for table in SQLModel.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        present = {c["name"] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in present:
+                continue
+            ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(engine.dialect)}"
+            if column.server_default is not None:
+                ddl += f" DEFAULT {column.server_default.arg}"
+            if not column.nullable:
+                ddl += " NOT NULL"
+            with engine.begin() as conn:
+                conn.execute(text(ddl))
+
+
+def create_missing_indexes():
+    """create_all skips tables that already exist, indexes included; add any new ones."""
+    for table in SQLModel.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
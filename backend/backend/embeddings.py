@@ -0,0 +1,174 @@
+# RAG — embedding providers (Gemini, local hashed n-grams) and batched, concurrent calls
+# [From]: specs/features/rag-chatbot.md (Embeddings)
+
+import os
+import random
+import re
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Protocol
+
+import numpy as np
+from google.api_core import exceptions as google_exceptions
+
+EMBEDDING_PROVIDER = os.environ.get("EMBEDDING_PROVIDER", "auto").lower()  # auto | gemini | local
+LOCAL_EMBEDDING_DIM = int(os.environ.get("LOCAL_EMBEDDING_DIM", "512"))
+
+EMBED_BATCH_SIZE = int(os.environ.get("EMBED_BATCH_SIZE", "100"))
+EMBED_CONCURRENCY = int(os.environ.get("EMBED_CONCURRENCY", "4"))
+EMBED_MAX_RETRIES = int(os.environ.get("EMBED_MAX_RETRIES", "5"))
+EMBED_BACKOFF_BASE = float(os.environ.get("EMBED_BACKOFF_BASE", "0.5"))  # seconds
+EMBED_BACKOFF_MAX = float(os.environ.get("EMBED_BACKOFF_MAX", "20"))
+
+
+class EmbeddingProvider(Protocol):
+    """Anything that embeds a list of texts in one call, up to `max_batch_size` texts.
+
+    `model_id` is stored next to each vector; vectors from different ids are never compared.
+    """
+
+    model_id: str
+    max_batch_size: int
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]: ...
+
+
+class GeminiEmbeddingProvider:
+    """Gemini `embed_content` with a list payload (one batchEmbedContents request)."""
+
+    max_batch_size = 100  # API limit per batchEmbedContents request
+
+    def __init__(self, model: str = "models/text-embedding-004", task_type: str = "retrieval_document"):
+        import google.generativeai as genai
+
+        # Ensure GEMINI_API_KEY is set in environment
+        if os.environ.get("GEMINI_API_KEY"):
+            genai.configure(api_key=os.environ.get("GEMINI_API_KEY"))
+        self.model = model
+        self.model_id = model
+        self.task_type = task_type
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        import google.generativeai as genai
+
+        result = genai.embed_content(model=self.model, content=list(texts), task_type=self.task_type)
+        return result["embedding"]
+
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+class HashingEmbeddingProvider:
+    """CPU-only embeddings: signed feature hashing of words and character trigrams.
+
+    No network, no model files, microseconds per text. Character trigrams (with word
+    boundary markers) give partial credit for shared stems ("clean" / "cleaning"); there
+    is no notion of synonyms, so quality is below a learned model.
+    """
+
+    max_batch_size = 10_000  # Local: one "batch" per call, no pool needed
+
+    def __init__(self, dim: int = LOCAL_EMBEDDING_DIM):
+        self.dim = dim
+        self.model_id = f"local-hash-{dim}"
+
+    def _features(self, text: str) -> List[str]:
+        features = []
+        for word in _TOKEN_RE.findall(text.lower()):
+            features.append(word)
+            marked = f"<{word}>"
+            features.extend(marked[i:i + 3] for i in range(len(marked) - 2))
+        return features
+
+    def embed_one(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature in self._features(text):
+            h = zlib.crc32(feature.encode("utf-8"))
+            vector[h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        # Sublinear term frequency, then unit length
+        vector = np.sign(vector) * np.log1p(np.abs(vector))
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        return [self.embed_one(text).tolist() for text in texts]
+
+
+def get_embedding_provider(name: str = EMBEDDING_PROVIDER) -> EmbeddingProvider:
+    """Provider selected by EMBEDDING_PROVIDER; "auto" uses Gemini only when GEMINI_API_KEY is set."""
+    if name == "auto":
+        name = "gemini" if os.environ.get("GEMINI_API_KEY") else "local"
+    if name == "gemini":
+        return GeminiEmbeddingProvider()
+    if name == "local":
+        return HashingEmbeddingProvider()
+    raise ValueError(f"Unknown EMBEDDING_PROVIDER: {name!r} (expected auto, gemini or local)")
+
+
+def is_rate_limit_error(exc: Exception) -> bool:
+    """True for provider throttling (HTTP 429 / RESOURCE_EXHAUSTED)."""
+    if isinstance(exc, (google_exceptions.TooManyRequests, google_exceptions.ResourceExhausted)):
+        return True
+    return getattr(exc, "code", None) == 429 or getattr(exc, "status_code", None) == 429
+
+
+class BatchEmbedder:
+    """Packs texts into provider-sized batches and embeds up to `concurrency` batches at once.
+
+    Output order always matches input order. Rate-limited batches are retried with
+    exponential backoff and full jitter; any other error propagates to the caller.
+    The worker pool is shared, so the concurrency bound holds across requests.
+    """
+
+    def __init__(
+        self,
+        provider: EmbeddingProvider,
+        batch_size: int = EMBED_BATCH_SIZE,
+        concurrency: int = EMBED_CONCURRENCY,
+        max_retries: int = EMBED_MAX_RETRIES,
+        backoff_base: float = EMBED_BACKOFF_BASE,
+        backoff_max: float = EMBED_BACKOFF_MAX,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.provider = provider
+        self.batch_size = max(1, min(batch_size, provider.max_batch_size))
+        self.concurrency = max(1, concurrency)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._sleep = sleep
+        self._pool: ThreadPoolExecutor | None = None
+        self._pool_lock = threading.Lock()
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        if len(batches) == 1:
+            return self._embed_with_retry(batches[0])
+        results = list(self._executor().map(self._embed_with_retry, batches))
+        return [vector for batch in results for vector in batch]
+
+    def _executor(self) -> ThreadPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="embed")
+            return self._pool
+
+    def _embed_with_retry(self, batch: List[str]) -> List[List[float]]:
+        attempt = 0
+        while True:
+            try:
+                vectors = self.provider.embed_batch(batch)
+            except Exception as e:
+                if not is_rate_limit_error(e) or attempt >= self.max_retries:
+                    raise
+                delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+                self._sleep(random.uniform(0, delay))
+                attempt += 1
+                continue
+            if len(vectors) != len(batch):
+                raise ValueError(f"Embedding provider returned {len(vectors)} vectors for {len(batch)} texts")
+            return vectors
@@ -0,0 +1,235 @@
+# Phase V — task-events publishing (Dapr pub/sub) through a transactional outbox
+# [From]: specs/deployment/phase5-cloud.md — kafka-pubsub / task-events
+
+import json
+import os
+import random
+import threading
+import time
+from datetime import datetime
+from typing import Callable
+
+from dapr.clients import DaprClient
+from sqlalchemy import delete, event as sa_event, func, insert
+from sqlalchemy.orm import Session as OrmSession
+from sqlmodel import Session, col, select
+
+from backend.database import engine
+from backend.models import OutboxEvent
+from backend.sync import note_task_changes
+
+PUBSUB_NAME = "kafka-pubsub"
+TOPIC_NAME = "task-events"
+
+OUTBOX_RELAY = os.environ.get("OUTBOX_RELAY", "1") == "1"  # Run the relay in this process
+OUTBOX_BATCH_SIZE = int(os.environ.get("OUTBOX_BATCH_SIZE", "100"))
+OUTBOX_POLL_INTERVAL = float(os.environ.get("OUTBOX_POLL_INTERVAL", "1.0"))  # Idle poll; commits wake it early
+OUTBOX_BACKOFF_MAX = float(os.environ.get("OUTBOX_BACKOFF_MAX", "30"))
+
+
+def task_event(event: str, task) -> dict:
+    return {
+        "event": event,
+        "task_id": task.id,
+        "user_id": task.user_id,
+        "seq": task.event_seq,
+        "title": task.title,
+    }
+
+
+_commit_listeners: list[Callable[[list[dict]], None]] = []
+
+
+def add_commit_listener(listener: Callable[[list[dict]], None]) -> None:
+    """Call `listener(events)` after each commit that recorded task events."""
+    _commit_listeners.append(listener)
+
+
+def record_task_events(session: Session, changes: list[tuple[str, object]]) -> list[dict]:
+    """The one place task mutations emit events: bumps each task's seq and adds outbox rows
+    (and, at commit, the user's change version; see sync.py).
+
+    `changes` is [(event, task)]. Call before commit (after a flush for new tasks, which
+    need an id). The relay publishes the rows once the transaction commits, and never
+    if it rolls back. A "created" event is always seq 1, so a task built with
+    event_seq=1 needs no extra UPDATE.
+    """
+    messages = []
+    for event, task in changes:
+        task.event_seq = 1 if event == "created" else (task.event_seq or 0) + 1
+        messages.append(task_event(event, task))
+    if not messages:
+        return messages
+    note_task_changes(session, changes)  # Change version and tombstones, stamped at commit
+    session.exec(insert(OutboxEvent), params=[
+        {
+            "task_id": m["task_id"],
+            "user_id": m["user_id"],
+            "seq": m["seq"],
+            "event": m["event"],
+            "payload": json.dumps(m),
+            "created_at": datetime.utcnow(),
+        }
+        for m in messages
+    ])
+    session.info.setdefault("task_events", []).extend(messages)
+    return messages
+
+
+def record_task_event(session: Session, event: str, task) -> dict:
+    return record_task_events(session, [(event, task)])[0]
+
+
+@sa_event.listens_for(OrmSession, "after_commit")
+def _after_commit(session) -> None:
+    events = session.info.pop("task_events", None)
+    if not events:
+        return
+    for listener in _commit_listeners:
+        try:
+            listener(events)
+        except Exception as e:
+            print(f"Warning: Task event listener failed: {e}")
+
+
+@sa_event.listens_for(OrmSession, "after_rollback")
+def _after_rollback(session) -> None:
+    session.info.pop("task_events", None)
+
+
+def send_events(client, payloads: list[str]) -> None:
+    """Publish JSON payloads on an open DaprClient; bulk publish when the SDK has it. Raises on failure."""
+    bulk = getattr(client, "publish_events", None)
+    if bulk is not None and len(payloads) > 1:
+        response = bulk(
+            pubsub_name=PUBSUB_NAME,
+            topic_name=TOPIC_NAME,
+            data=payloads,
+            data_content_type="application/json",
+        )
+        failed = getattr(response, "failed_entries", None)
+        if failed:
+            raise RuntimeError(f"{len(failed)} of {len(payloads)} events rejected by bulk publish")
+        return
+    for payload in payloads:
+        client.publish_event(
+            pubsub_name=PUBSUB_NAME,
+            topic_name=TOPIC_NAME,
+            data=payload,
+            data_content_type="application/json",
+        )
+
+
+class OutboxRelay:
+    """Drains event_outbox to pub/sub in id order, `batch_size` rows per round.
+
+    Rows are deleted only after the broker accepted them, so delivery is at-least-once:
+    a crash between publish and delete re-sends that batch, and consumers dedupe on
+    (task_id, seq). A failed batch is retried (with backoff, reconnecting) before any
+    later row is sent, which keeps each task's events in seq order. Run one relay per
+    database (OUTBOX_RELAY=0 on the other replicas).
+    """
+
+    def __init__(
+        self,
+        bind=engine,
+        client_factory=DaprClient,
+        batch_size: int = OUTBOX_BATCH_SIZE,
+        poll_interval: float = OUTBOX_POLL_INTERVAL,
+        backoff_max: float = OUTBOX_BACKOFF_MAX,
+    ):
+        self.bind = bind
+        self.client_factory = client_factory
+        self.batch_size = max(1, batch_size)
+        self.poll_interval = poll_interval
+        self.backoff_max = backoff_max
+        self._client = None
+        self._thread: threading.Thread | None = None
+        self._stopping = threading.Event()
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._counts = {"relayed": 0, "batches": 0, "failures": 0}
+
+    def _count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self._counts[name] += n
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="outbox-relay", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        self._stopping.set()
+        self._wake.set()
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        self._thread = None
+
+    def notify(self, events: list[dict] | None = None) -> None:
+        """Wake the relay (commit listener): new rows are waiting."""
+        self._wake.set()
+
+    def relay_once(self) -> int:
+        """Publish and delete the oldest batch. -> rows relayed. Raises if publishing fails."""
+        with Session(self.bind) as session:
+            rows = session.exec(
+                select(OutboxEvent.id, OutboxEvent.payload).order_by(OutboxEvent.id).limit(self.batch_size)
+            ).all()
+            if not rows:
+                return 0
+            if self._client is None:
+                self._client = self.client_factory()
+            send_events(self._client, [payload for _, payload in rows])
+            session.exec(delete(OutboxEvent).where(col(OutboxEvent.id).in_([row_id for row_id, _ in rows])))
+            session.commit()
+        self._count("relayed", len(rows))
+        self._count("batches")
+        return len(rows)
+
+    def _run(self) -> None:
+        attempt = 0
+        while not self._stopping.is_set():
+            try:
+                relayed = self.relay_once()
+                attempt = 0
+            except Exception as e:
+                self._count("failures")
+                self._close_client()
+                delay = random.uniform(0, min(self.backoff_max, 0.5 * 2 ** attempt))
+                if attempt == 0:
+                    print(f"Warning: Outbox relay failed, retrying: {e}")
+                attempt += 1
+                self._stopping.wait(delay)
+                continue
+            if relayed < self.batch_size:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+        self._close_client()
+
+    def _close_client(self) -> None:
+        client, self._client = self._client, None
+        if client is not None:
+            try:
+                client.close()
+            except Exception:
+                pass
+
+    def stats(self) -> dict:
+        with Session(self.bind) as session:
+            backlog, oldest = session.exec(select(func.count(OutboxEvent.id), func.min(OutboxEvent.created_at))).one()
+        with self._lock:
+            return {
+                **self._counts,
+                "backlog": backlog,
+                "oldest_age_seconds": (datetime.utcnow() - oldest).total_seconds() if oldest else 0.0,
+                "running": self._thread is not None and self._thread.is_alive(),
+            }
+
+
+outbox_relay = OutboxRelay()
+add_commit_listener(outbox_relay.notify)
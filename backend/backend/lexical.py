@@ -0,0 +1,208 @@
+# Search — per-user inverted index (BM25) over task title, description and tags
+# [From]: specs/features/rag-chatbot.md (Keyword Search + Semantic Search)
+
+import bisect
+import math
+import os
+import re
+import threading
+from collections import Counter, OrderedDict
+from datetime import datetime
+
+from sqlalchemy import bindparam, func, or_
+from sqlmodel import Session, col, select
+
+from backend.models import Task
+
+LEXICAL_CACHE_USERS = int(os.environ.get("LEXICAL_CACHE_USERS", "256"))
+TITLE_WEIGHT = 2  # Title terms count twice
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text: str | None) -> list[str]:
+    return _TOKEN_RE.findall(text.lower()) if text else []
+
+
+def document_tokens(title: str, description: str | None, tags: str | None) -> list[str]:
+    return tokenize(title) * TITLE_WEIGHT + tokenize(description) + tokenize(tags)
+
+
+class InvertedIndex:
+    """Postings (term -> {task_id: tf}) with BM25 scoring and prefix matching.
+
+    Supports incremental add/replace/remove, so keeping it in sync with the DB only
+    touches changed tasks.
+    """
+
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(self):
+        self.postings: dict[str, dict[int, int]] = {}
+        self.vocabulary: list[str] = []  # Sorted, for prefix lookups
+        self.doc_terms: dict[int, Counter] = {}
+        self.doc_length: dict[int, int] = {}
+        self.total_length = 0
+
+    def __len__(self) -> int:
+        return len(self.doc_length)
+
+    def add(self, task_id: int, tokens: list[str]) -> None:
+        if task_id in self.doc_length:
+            self.remove(task_id)
+        terms = Counter(tokens)
+        self.doc_terms[task_id] = terms
+        self.doc_length[task_id] = len(tokens)
+        self.total_length += len(tokens)
+        for term, tf in terms.items():
+            docs = self.postings.get(term)
+            if docs is None:
+                docs = self.postings[term] = {}
+                bisect.insort(self.vocabulary, term)
+            docs[task_id] = tf
+
+    def remove(self, task_id: int) -> None:
+        terms = self.doc_terms.pop(task_id, None)
+        if terms is None:
+            return
+        self.total_length -= self.doc_length.pop(task_id)
+        for term in terms:
+            docs = self.postings[term]
+            docs.pop(task_id, None)
+            if not docs:
+                del self.postings[term]
+                self.vocabulary.pop(bisect.bisect_left(self.vocabulary, term))
+
+    def knows_all(self, tokens: list[str]) -> bool:
+        """True when every token is an exact indexed term (a keyword query)."""
+        return bool(tokens) and all(t in self.postings for t in tokens)
+
+    def expand_prefix(self, prefix: str, max_terms: int = 256) -> list[str]:
+        start = bisect.bisect_left(self.vocabulary, prefix)
+        terms = []
+        for term in self.vocabulary[start:start + max_terms]:
+            if not term.startswith(prefix):
+                break
+            terms.append(term)
+        return terms
+
+    def match(self, query: str) -> set[int]:
+        """Tasks containing every query token, each token matched as a term prefix."""
+        result: set[int] | None = None
+        for token in tokenize(query):
+            docs: set[int] = set()
+            for term in self.expand_prefix(token):
+                docs.update(self.postings[term])
+            result = docs if result is None else result & docs
+            if not result:
+                return set()
+        return result or set()
+
+    def bm25(self, tokens: list[str], limit: int) -> list[tuple[int, float]]:
+        """Top `limit` (task_id, score) for a bag of query tokens."""
+        n = len(self.doc_length)
+        if not n or not tokens:
+            return []
+        avg_length = self.total_length / n or 1.0
+        scores: dict[int, float] = {}
+        for term in set(tokens):
+            docs = self.postings.get(term)
+            if not docs:
+                continue
+            idf = math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+            for task_id, tf in docs.items():
+                norm = self.k1 * (1 - self.b + self.b * self.doc_length[task_id] / avg_length)
+                scores[task_id] = scores.get(task_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        return sorted(scores.items(), key=lambda x: x[1], reverse=True)[:limit]
+
+
+def task_stamp(session: Session, user_id: str) -> tuple:
+    """(count, max id, max updated_at) of the user's tasks: changes when any task is added, edited or deleted."""
+    return tuple(session.exec(
+        select(func.count(Task.id), func.max(Task.id), func.max(Task.updated_at)).where(Task.user_id == user_id)
+    ).one())
+
+
+def changed_since(stamp: tuple):
+    """WHERE clause for tasks created or updated after `stamp` was taken (boundary rows included)."""
+    _, last_max_id, last_updated = stamp
+    return or_(col(Task.updated_at) >= (last_updated or datetime.min), col(Task.id) > (last_max_id or 0))
+
+
+class _Entry:
+    def __init__(self):
+        self.index = InvertedIndex()
+        self.stamp: tuple | None = None  # (count, max id, max updated_at) when last synced
+        self.lock = threading.Lock()
+
+
+class LexicalIndexStore:
+    """Bounded LRU of per-user inverted indexes, synced lazily against the tasks table.
+
+    Each lookup reads one aggregate row (count, max id, max updated_at) for the user.
+    When it differs from the last sync, only tasks created or updated since then are
+    re-read, and the full id list only when the count shows rows were deleted.
+    """
+
+    def __init__(self, max_users: int = LEXICAL_CACHE_USERS):
+        self.max_users = max_users
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _entry(self, user_id: str) -> _Entry:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                entry = self._entries[user_id] = _Entry()
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+            return entry
+
+    def get(self, session: Session, user_id: str) -> InvertedIndex:
+        stamp = task_stamp(session, user_id)
+        entry = self._entry(user_id)
+        with entry.lock:
+            if entry.stamp != stamp:
+                self._sync(session, user_id, entry, stamp)
+            return entry.index
+
+    def _sync(self, session: Session, user_id: str, entry: _Entry, stamp: tuple) -> None:
+        fields = select(Task.id, Task.title, Task.description, Task.tags).where(Task.user_id == user_id)
+        if entry.stamp is None:
+            changed = session.exec(fields).all()
+        else:
+            changed = session.exec(fields.where(changed_since(entry.stamp))).all()
+        index = entry.index
+        for task_id, title, description, tags in changed:
+            index.add(task_id, document_tokens(title, description, tags))
+        if len(index) != stamp[0]:
+            live = set(session.exec(select(Task.id).where(Task.user_id == user_id)).all())
+            for task_id in [tid for tid in index.doc_length if tid not in live]:
+                index.remove(task_id)
+        entry.stamp = stamp
+
+
+lexical_store = LexicalIndexStore()
+
+
+def search_filter(session: Session, user_id: str, query: str, max_ids: int = 5000):
+    """WHERE clause for `?search=` (within the user's tasks): every query word must
+    prefix a word of the title, description or tags, whatever the number of matches.
+
+    A query with no words (only punctuation) keeps the plain substring match on title
+    and description. Large matches are sent as the smaller of the matching and the
+    non-matching ids; past `max_ids` either way, as an inlined IN list (no bound
+    parameter limit).
+    """
+    if not tokenize(query):
+        return col(Task.title).contains(query) | col(Task.description).contains(query)
+    index = lexical_store.get(session, user_id)
+    ids = index.match(query)
+    if len(ids) <= max_ids:
+        return col(Task.id).in_(sorted(ids))
+    others = index.doc_length.keys() - ids
+    if len(others) <= max_ids:
+        return col(Task.id).not_in(sorted(others))
+    return col(Task.id).in_(bindparam("search_ids", sorted(ids), expanding=True, literal_execute=True))
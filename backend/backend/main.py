@@ -1,20 +1,45 @@
 # Phase II — FastAPI app entry
 # [From]: specs Phase II API
 
+import hmac
+import json
+import os
 from contextlib import asynccontextmanager
+from typing import Annotated
 
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI, Header, HTTPException, Request, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 
-from backend.database import init_db
+from backend.ann import index_store
+from backend.auth import jwks_cache
+from backend.chat_history import conversation_cache
+from backend.database import init_db, pool_stats
+from backend.events import OUTBOX_RELAY, outbox_relay
+from backend.push import PUSH_SOURCE, check_dapr_token, task_event_stream, task_hub
+from backend.rate_limit import rate_limit, stats as rate_limit_stats
+from backend.recurrence import occurrence_builder
+from backend.response_cache import response_cache
 from backend.routes.chat import router as chat_router
-from backend.routes.tasks import router as tasks_router
+from backend.routes.tasks import require_user_match, router as tasks_router
+
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")  # Bearer token for GET /metrics; empty = route disabled
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     init_db()
+    if OUTBOX_RELAY:
+        outbox_relay.start()
+    if jwks_cache is not None:
+        jwks_cache.start()
+    occurrence_builder.start()
     yield
+    if jwks_cache is not None:
+        jwks_cache.stop()
+    occurrence_builder.stop()
+    outbox_relay.stop()
+    index_store.flush()
 
 
 app = FastAPI(
@@ -36,6 +61,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "X-Task-Version"],
 )
 app.include_router(tasks_router)
 app.include_router(chat_router)
@@ -44,3 +70,59 @@ app.include_router(chat_router)
 @app.get("/health")
 def health():
     return {"status": "ok"}
+
+
+@app.get("/api/{user_id}/tasks/events", dependencies=[Depends(rate_limit("tasks_read"))])
+async def task_events(user_id: Annotated[str, Depends(require_user_match)]):
+    """Server-Sent Events: the user's task changes as they commit, from chat or any other client."""
+    task_hub.check(user_id)
+    return StreamingResponse(
+        task_event_stream(user_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/dapr/task-events")
+async def dapr_task_events(request: Request, dapr_api_token: Annotated[str | None, Header()] = None):
+    """task-events subscription (CloudEvents); feeds the push hub when PUSH_SOURCE=dapr.
+
+    Only the sidecar may publish: events must carry its dapr-api-token (401 otherwise).
+    """
+    if PUSH_SOURCE != "dapr":
+        return {"status": "SUCCESS"}
+    check_dapr_token(dapr_api_token)
+    try:
+        data = (await request.json()).get("data")
+        if isinstance(data, str):
+            data = json.loads(data)
+        if not data.get("user_id"):
+            raise ValueError("missing user_id")
+    except (ValueError, AttributeError) as e:
+        print(f"Warning: Dropping malformed task event: {e}")
+        return {"status": "DROP"}
+    task_hub.publish([data])
+    return {"status": "SUCCESS"}
+
+
+@app.get("/metrics")
+def metrics(authorization: Annotated[str | None, Header()] = None):
+    """In-process counters: DB pools, task-events outbox relay, ANN index, conversation and response caches, rate limits, push, occurrence builds.
+
+    Operators only: 404 unless METRICS_TOKEN is set, then `Authorization: Bearer <METRICS_TOKEN>` (401 otherwise).
+    """
+    if not METRICS_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token.encode(), METRICS_TOKEN.encode()):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid metrics token")
+    return {
+        "db_pool": pool_stats(),
+        "events": outbox_relay.stats(),
+        "ann": index_store.stats(),
+        "chat_cache": conversation_cache.stats(),
+        "response_cache": response_cache.stats(),
+        "rate_limits": rate_limit_stats(),
+        "push": task_hub.stats(),
+        "occurrences": occurrence_builder.stats(),
+    }
@@ -2,11 +2,21 @@
 # [From]: specs/features/task-crud.md, hackathon Phase III schema
 
 from datetime import datetime
+from sqlalchemy import Column, Index, LargeBinary
 from sqlmodel import Field, SQLModel
 
 
 class Task(SQLModel, table=True):
     __tablename__ = "tasks"
+    __table_args__ = (
+        # Common list filters; (user_id, <sort key>, id) for keyset pagination
+        Index("ix_tasks_user_completed_priority_due", "user_id", "completed", "priority", "due_date"),
+        Index("ix_tasks_user_id_id", "user_id", "id"),
+        Index("ix_tasks_user_created", "user_id", "created_at", "id"),
+        Index("ix_tasks_user_updated", "user_id", "updated_at", "id"),
+        Index("ix_tasks_user_due", "user_id", "due_date", "id"),
+        Index("ix_tasks_user_sync_version", "user_id", "sync_version"),
+    )
 
     id: int | None = Field(default=None, primary_key=True)
     user_id: str = Field(index=True)
@@ -14,11 +24,81 @@ class Task(SQLModel, table=True):
     description: str = Field(default="", max_length=1000)
     completed: bool = Field(default=False)
     priority: str = Field(default="medium")  # low, medium, high
-    tags: str | None = Field(default=None)   # Comma-separated strings
+    tags: str | None = Field(default=None)   # Comma-separated strings (as entered; normalized copy in task_tags)
     due_date: datetime | None = Field(default=None)
-    recurring_rule: str | None = Field(default=None)  # daily, weekly, monthly
+    recurring_rule: str | None = Field(default=None)  # daily | weekly | monthly | yearly, or an RRULE subset (recurrence.py)
+    recurrence_start: datetime | None = Field(default=None)  # First due date of the series (DTSTART); None = due_date
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
+    event_seq: int = Field(default=0, sa_column_kwargs={"server_default": "0"})  # Last outbox seq for this task
+    sync_version: int = Field(default=0, sa_column_kwargs={"server_default": "0"})  # User version of the last change
+
+
+class TaskTag(SQLModel, table=True):
+    __tablename__ = "task_tags"
+    __table_args__ = (Index("ix_task_tags_user_tag", "user_id", "tag", "task_id"),)
+
+    task_id: int = Field(foreign_key="tasks.id", primary_key=True)
+    tag: str = Field(primary_key=True, max_length=100)  # Lowercased, trimmed
+    user_id: str
+
+
+class TaskEmbedding(SQLModel, table=True):
+    __tablename__ = "task_embeddings"
+
+    task_id: int = Field(foreign_key="tasks.id", primary_key=True)
+    user_id: str = Field(index=True)
+    model: str = Field(max_length=100)        # Embedding model that produced the vector
+    content_hash: str = Field(max_length=64)  # sha256 of the embedded task text
+    embedding: bytes = Field(sa_column=Column(LargeBinary, nullable=False))  # Packed float32
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class OutboxEvent(SQLModel, table=True):
+    """task-events waiting for the relay; written in the same transaction as the task change."""
+
+    __tablename__ = "event_outbox"
+
+    id: int | None = Field(default=None, primary_key=True)  # Relay order
+    task_id: int = Field(index=True)  # No foreign key: "deleted" events outlive the task
+    user_id: str
+    seq: int                          # Per-task, increasing: consumers order/dedupe on (task_id, seq)
+    event: str = Field(max_length=20)  # created | updated | completed | deleted
+    payload: str                      # JSON message body
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class UserSyncState(SQLModel, table=True):
+    """Per-user change version: bumped by every transaction that changes the user's tasks."""
+
+    __tablename__ = "user_sync"
+
+    user_id: str = Field(primary_key=True)
+    version: int = Field(default=0)
+    occurrences_through: datetime | None = Field(default=None)  # task_occurrences kept up to here; None = not built
+
+
+class TaskOccurrence(SQLModel, table=True):
+    """A pending task's due date, or one its recurrence projects ahead ("due this week" reads)."""
+
+    __tablename__ = "task_occurrences"
+    __table_args__ = (Index("ix_task_occurrences_user_at", "user_id", "occurs_at"),)
+
+    task_id: int = Field(primary_key=True)  # No foreign key: rows are replaced at commit, around task deletes
+    occurs_at: datetime = Field(primary_key=True)
+    user_id: str
+
+
+class TaskTombstone(SQLModel, table=True):
+    """A deleted task, so delta sync can report it."""
+
+    __tablename__ = "task_tombstones"
+    __table_args__ = (Index("ix_task_tombstones_user_version", "user_id", "version"),)
+
+    task_id: int = Field(primary_key=True)  # No foreign key: the task is gone
+    user_id: str
+    version: int                            # User version of the delete
+    deleted_at: datetime = Field(default_factory=datetime.utcnow)
 
 
 class Conversation(SQLModel, table=True):
@@ -28,10 +108,14 @@ class Conversation(SQLModel, table=True):
     user_id: str = Field(index=True)
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
+    summary: str | None = Field(default=None)  # Rolling summary of turns no longer sent verbatim
+    summary_through: int = Field(default=0, sa_column_kwargs={"server_default": "0"})  # Last message id folded in
+    version: int = Field(default=0, sa_column_kwargs={"server_default": "0"})  # Bumped by every write; cache stamp
 
 
 class Message(SQLModel, table=True):
     __tablename__ = "messages"
+    __table_args__ = (Index("ix_messages_conversation_id_id", "conversation_id", "id"),)  # History tail
 
     id: int | None = Field(default=None, primary_key=True)
     user_id: str = Field(index=True)
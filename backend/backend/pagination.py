@@ -0,0 +1,92 @@
+# Phase II — keyset (cursor) pagination and field projection for task lists
+# [From]: specs/api/rest-endpoints.md (GET /api/{user_id}/tasks)
+
+import base64
+import json
+from datetime import datetime
+
+from fastapi import HTTPException
+from sqlalchemy import tuple_
+from sqlmodel import col
+
+from backend.models import Task
+
+SORT_COLUMNS = {
+    "id": Task.id,
+    "created_at": Task.created_at,
+    "updated_at": Task.updated_at,
+    "due_date": Task.due_date,  # Nullable: NULLs sort last in both directions
+}
+TASK_FIELDS = tuple(Task.model_fields)
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(sort: str, order: str, value, task_id: int) -> str:
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([sort, order, value, task_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str, order: str) -> tuple:
+    """-> (sort value, task id). 400 if malformed or issued for a different sort/order."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        c_sort, c_order, value, task_id = json.loads(base64.urlsafe_b64decode(padded))
+        if c_sort != sort or c_order != order:
+            raise ValueError("cursor was issued for a different sort/order")
+        if value is not None and sort != "id":
+            value = datetime.fromisoformat(value)
+        return value, int(task_id)
+    except (ValueError, TypeError, json.JSONDecodeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid cursor: {e}")
+
+
+def keyset_statements(stmt, sort: str, order: str, cursor: str | None) -> list:
+    """`stmt` ordered by (sort key, id) and, given a cursor, past it. -> statements to run
+    in turn, each continuing where the previous one ran out.
+
+    Each one seeks straight to the page through the (user_id, <sort key>, id) indexes, so
+    a deep page costs the same as the first. due_date sorts NULLs last in both directions:
+    dated tasks come from one statement and the NULL tail (by id) from a second, so
+    neither needs an OR with IS NULL and a descending page is a backward scan of the same
+    ascending index.
+    """
+    desc = order == "desc"
+    id_col = col(Task.id)
+    by_id = id_col.desc() if desc else id_col
+    last_id = None
+    if cursor:
+        value, last_id = decode_cursor(cursor, sort, order)
+    after_id = (id_col < last_id if desc else id_col > last_id) if cursor else None
+
+    if sort == "id":
+        return [(stmt.where(after_id) if cursor else stmt).order_by(by_id)]
+
+    key = col(SORT_COLUMNS[sort])
+    ordered = stmt.order_by(key.desc() if desc else key, by_id)
+    if cursor and value is not None:
+        seek = tuple_(key, id_col)
+        ordered = ordered.where(seek < (value, last_id) if desc else seek > (value, last_id))
+    if sort != "due_date":
+        return [ordered]
+    null_tail = stmt.where(key.is_(None)).order_by(by_id)
+    if cursor and value is None:
+        return [null_tail.where(after_id)]  # Already in the NULL tail
+    return [ordered.where(key.is_not(None)), null_tail]
+
+
+def parse_fields(fields: str | None, sort: str) -> tuple[list[str] | None, list[str] | None]:
+    """`fields=` -> (fields to return, columns to select). (None, None) means whole rows.
+
+    `id` and the sort key are always selected (the cursor needs them) but only returned
+    when asked for.
+    """
+    if not fields:
+        return None, None
+    wanted = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in wanted if f not in TASK_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    selected = list(dict.fromkeys(["id", sort, *wanted]))
+    return wanted, selected
@@ -0,0 +1,162 @@
+# Phase V — live task changes: per-user fan-out of task-events to open SSE connections
+# [From]: specs/deployment/phase5-cloud.md — kafka-pubsub / task-events
+
+import asyncio
+import hmac
+import json
+import os
+from typing import AsyncIterator
+
+from fastapi import HTTPException, status
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from backend.database import async_engine
+from backend.events import add_commit_listener
+from backend.models import UserSyncState
+
+# local: commits made by this process (one replica) | dapr: the task-events subscription,
+# which carries every replica's commits (POST /dapr/task-events)
+PUSH_SOURCE = os.environ.get("PUSH_SOURCE", "local").lower()
+PUSH_QUEUE_SIZE = int(os.environ.get("PUSH_QUEUE_SIZE", "100"))      # Events buffered per connection
+PUSH_MAX_PER_USER = int(os.environ.get("PUSH_MAX_PER_USER", "10"))   # Open connections (tabs) per user
+PUSH_HEARTBEAT = float(os.environ.get("PUSH_HEARTBEAT", "15"))       # Seconds between keep-alive comments
+# Shared with the Dapr sidecar (dapr.io/app-token-secret), which sends it as dapr-api-token
+APP_API_TOKEN = os.environ.get("APP_API_TOKEN", "")
+
+
+class Subscription:
+    def __init__(self, user_id: str, queue_size: int):
+        self.user_id = user_id
+        self.queue: asyncio.Queue[dict] = asyncio.Queue(queue_size)
+        self.overflowed = False
+
+
+class TaskEventHub:
+    """Fans committed task events out to each user's open connections.
+
+    `publish` may run on any thread (tools and batch writers commit off the event loop);
+    delivery hops onto the loop that owns the queues. A connection too slow to drain its
+    queue gets one "resync" event in place of the backlog and catches up through
+    GET /tasks/changes.
+    """
+
+    def __init__(self, queue_size: int = PUSH_QUEUE_SIZE, max_per_user: int = PUSH_MAX_PER_USER):
+        self.queue_size = queue_size
+        self.max_per_user = max_per_user
+        self._subscribers: dict[str, set[Subscription]] = {}
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._counts = {"published": 0, "delivered": 0, "overflows": 0, "rejected": 0}
+
+    def check(self, user_id: str) -> None:
+        """429 now if the user already has the maximum number of connections open."""
+        if len(self._subscribers.get(user_id, ())) >= self.max_per_user:
+            self._counts["rejected"] += 1
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail=f"At most {self.max_per_user} open task event streams per user",
+            )
+
+    def subscribe(self, user_id: str) -> Subscription:
+        self._loop = asyncio.get_running_loop()
+        subscription = Subscription(user_id, self.queue_size)
+        self._subscribers.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subscriptions = self._subscribers.get(subscription.user_id)
+        if subscriptions is not None:
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscribers[subscription.user_id]
+
+    def publish(self, events: list[dict]) -> None:
+        """Commit listener (and Dapr handler): hand `events` to the subscribers' loop."""
+        loop = self._loop
+        if loop is None or not self._subscribers:
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._deliver(events)
+        else:
+            try:
+                loop.call_soon_threadsafe(self._deliver, events)
+            except RuntimeError:
+                pass  # Loop closed (shutdown): nobody is listening
+
+    def _deliver(self, events: list[dict]) -> None:
+        self._counts["published"] += len(events)
+        for event in events:
+            for subscription in self._subscribers.get(event["user_id"], ()):
+                if subscription.overflowed:
+                    continue
+                try:
+                    subscription.queue.put_nowait(event)
+                    self._counts["delivered"] += 1
+                except asyncio.QueueFull:
+                    subscription.overflowed = True
+                    self._counts["overflows"] += 1
+
+    async def next_event(self, subscription: Subscription, timeout: float) -> dict | None:
+        """The next event, {"event": "resync"} after an overflow, or None if `timeout` passed quietly."""
+        if subscription.overflowed:
+            while not subscription.queue.empty():
+                subscription.queue.get_nowait()
+            subscription.overflowed = False
+            return {"event": "resync"}
+        try:
+            return await asyncio.wait_for(subscription.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def stats(self) -> dict:
+        return {
+            **self._counts,
+            "source": PUSH_SOURCE,
+            "users": len(self._subscribers),
+            "connections": sum(len(s) for s in self._subscribers.values()),
+        }
+
+
+task_hub = TaskEventHub()
+if PUSH_SOURCE == "local":
+    add_commit_listener(task_hub.publish)
+elif not APP_API_TOKEN:
+    print("Warning: PUSH_SOURCE=dapr without APP_API_TOKEN; POST /dapr/task-events will reject every event")
+
+
+def check_dapr_token(token: str | None) -> None:
+    """401 unless `token` (the dapr-api-token header) is the sidecar's APP_API_TOKEN."""
+    if not (APP_API_TOKEN and token and hmac.compare_digest(token.encode(), APP_API_TOKEN.encode())):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid Dapr API token")
+
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+async def task_event_stream(user_id: str, heartbeat: float = PUSH_HEARTBEAT) -> AsyncIterator[str]:
+    """SSE body: "ready" with the user's current change version, then a "task" event per
+    committed change ({event, task_id, seq, title}), "resync" after an overflow, and a
+    keep-alive comment every `heartbeat` seconds of quiet.
+
+    Subscribes before reading the version, so a change committed in between is both
+    pushed and covered by a delta from that version.
+    """
+    subscription = task_hub.subscribe(user_id)
+    try:
+        async with AsyncSession(async_engine) as session:
+            state = await session.get(UserSyncState, user_id)
+        yield _sse("ready", {"version": state.version if state else 0})
+        while True:
+            event = await task_hub.next_event(subscription, heartbeat)
+            if event is None:
+                yield ": keep-alive\n\n"
+            elif event["event"] == "resync":
+                yield _sse("resync", {})
+            else:
+                yield _sse("task", event)
+    finally:
+        task_hub.unsubscribe(subscription)
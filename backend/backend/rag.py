@@ -1,124 +1,315 @@
-import os
-import math
+import hashlib
+from array import array
+from datetime import datetime
 from typing import List, Dict, Any
-import google.generativeai as genai
-from sqlmodel import Session, select
+from sqlalchemy import delete
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, col, select
 from backend.database import engine
-from backend.models import Task
+from backend.ann import ANN_MIN_TASKS, RAG_INDEX, IVFIndex, index_store
+from backend.embeddings import BatchEmbedder, get_embedding_provider
+from backend.lexical import changed_since, lexical_store, task_stamp, tokenize
+from backend.models import Task, TaskEmbedding
+from backend.similarity import TaskVectorMatrix, matrix_cache
 
-# Initialize Gemini client
-# Ensure GEMINI_API_KEY is set in environment
-if os.environ.get("GEMINI_API_KEY"):
-    genai.configure(api_key=os.environ.get("GEMINI_API_KEY"))
+# Selected by EMBEDDING_PROVIDER (auto | gemini | local); see backend/embeddings.py
+embedding_provider = get_embedding_provider()
+EMBEDDING_MODEL = embedding_provider.model_id
+
+batch_embedder = BatchEmbedder(embedding_provider)
 
 def get_embedding(text: str) -> List[float]:
     """Generate embedding for a single string."""
-    result = genai.embed_content(
-        model="models/text-embedding-004",
-        content=text,
-        task_type="retrieval_document",
-    )
-    return result['embedding']
+    return embedding_provider.embed_batch([text])[0]
 
 def get_batch_embeddings(texts: List[str]) -> List[List[float]]:
-    """Generate embeddings for a list of strings."""
+    """Generate embeddings for a list of strings (batched, bounded concurrency, retried on 429)."""
     if not texts:
         return []
-    # Gemini batch embedding
-    # Note: genai.embed_content doesn't support batch list directly in one call in the same way as OpenAI's strictly?
-    # Actually it does, check docs or iterate. text-embedding-004 supports batch.
-    # However, for simplicity and safety with the python SDK versions, iteration is safe for small lists.
-    # But let's try the batch method if supported or map it.
-    # The `embed_content` accepts a list of strings? No, `content` is a single string or list of chat messages.
-    # We should iterate or use batch_embed_contents if available. 
-    # Let's iterate for safety in this MVP.
-    
-    embeddings = []
-    for text in texts:
-         result = genai.embed_content(
-            model="models/text-embedding-004",
-            content=text,
-            task_type="retrieval_document",
+    return batch_embedder.embed(texts)
+
+def task_text(task) -> str:
+    """Text that represents a task for embedding: "Title Description tags:... priority:..."."""
+    content = f"{task.title}"
+    if task.description:
+        content += f" {task.description}"
+    if task.tags:
+        content += f" tags:{task.tags}"
+    if task.priority:
+        content += f" priority:{task.priority}"
+    return content
+
+def content_hash(text: str) -> str:
+    """Stable digest of embedded text, used to detect edited tasks."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def pack_vector(vector: List[float]) -> bytes:
+    return array("f", vector).tobytes()
+
+def invalidate_task_embedding(session: Session, task_id: int) -> None:
+    """Drop the stored vector for a task. Call from write paths before commit.
+
+    The next search re-embeds the task lazily; deletes must call this before
+    removing the task row (foreign key).
+    """
+    session.exec(delete(TaskEmbedding).where(TaskEmbedding.task_id == task_id))
+
+def invalidate_task_embeddings(session: Session, task_ids: List[int]) -> None:
+    """`invalidate_task_embedding` for many tasks in one statement."""
+    if task_ids:
+        session.exec(delete(TaskEmbedding).where(col(TaskEmbedding.task_id).in_(task_ids)))
+
+def _packed_vectors(
+    session: Session, user_id: str, task_ids: List[int], fresh_packed: Dict[int, bytes]
+) -> Dict[int, bytes]:
+    """Stored float32 blobs for `task_ids`, preferring vectors embedded in this request."""
+    packed = {tid: fresh_packed[tid] for tid in task_ids if tid in fresh_packed}
+    missing = [tid for tid in task_ids if tid not in packed]
+    if not missing:
+        return packed
+    statement = select(TaskEmbedding.task_id, TaskEmbedding.embedding)
+    if len(missing) <= 500:
+        statement = statement.where(col(TaskEmbedding.task_id).in_(missing))
+    else:
+        statement = statement.where(TaskEmbedding.user_id == user_id)
+    wanted = set(missing)
+    for task_id, blob in session.exec(statement).all():
+        if task_id in wanted:
+            packed[task_id] = blob
+    return packed
+
+def _embedding_rows(session: Session, user_id: str, *criteria) -> list:
+    """The user's task fields and stored hashes (no ORM objects, no vector blobs)."""
+    statement = (
+        select(
+            Task.id, Task.title, Task.description, Task.tags, Task.priority, Task.due_date,
+            TaskEmbedding.model, TaskEmbedding.content_hash,
         )
-         embeddings.append(result['embedding'])
-    return embeddings
-
-def cosine_similarity(v1: List[float], v2: List[float]) -> float:
-    """Compute cosine similarity between two vectors."""
-    dot_product = sum(a * b for a, b in zip(v1, v2))
-    magnitude1 = math.sqrt(sum(a * a for a in v1))
-    magnitude2 = math.sqrt(sum(b * b for b in v2))
-    if magnitude1 == 0 or magnitude2 == 0:
-        return 0.0
-    return dot_product / (magnitude1 * magnitude2)
+        .join(TaskEmbedding, TaskEmbedding.task_id == Task.id, isouter=True)
+        .where(Task.user_id == user_id, *criteria)
+    )
+    return session.exec(statement).all()
 
-def search_tasks_semantic(user_id: str, query: str, limit: int = 5) -> List[Dict[str, Any]]:
+def _task_rows(session: Session, task_ids) -> Dict[int, Any]:
+    if not task_ids:
+        return {}
+    return {
+        row.id: row for row in session.exec(
+            select(Task.id, Task.title, Task.description, Task.tags, Task.priority, Task.due_date)
+            .where(col(Task.id).in_(list(task_ids)))
+        ).all()
+    }
+
+def _embed_stale(
+    session: Session, user_id: str, rows: list
+) -> tuple[List[int], Dict[int, str], Dict[int, bytes]]:
+    """Hash `rows`, embed the new/edited ones and stage their vectors (caller commits).
+
+    Returns the ids that have a usable vector (tasks whose embedding failed are
+    skipped), every row's digest, and the vectors embedded now.
+    """
+    digests: Dict[int, str] = {}
+    stale = []  # (task row, text, digest)
+    for row in rows:
+        text = task_text(row)
+        digest = content_hash(text)
+        digests[row.id] = digest
+        if row.model != EMBEDDING_MODEL or row.content_hash != digest:
+            stale.append((row, text, digest))
+
+    fresh_packed: Dict[int, bytes] = {}
+    if stale:
+        try:
+            fresh = get_batch_embeddings([text for _, text, _ in stale])
+        except Exception as e:
+            print(f"RAG Error: Failed to embed tasks: {e}")
+            fresh = []
+        if fresh:
+            session.exec(delete(TaskEmbedding).where(
+                col(TaskEmbedding.task_id).in_([row.id for row, _, _ in stale])
+            ))
+        for (row, _, digest), vector in zip(stale, fresh):
+            fresh_packed[row.id] = pack_vector(vector)
+            session.add(TaskEmbedding(
+                task_id=row.id,
+                user_id=user_id,
+                model=EMBEDDING_MODEL,
+                content_hash=digest,
+                embedding=fresh_packed[row.id],
+                updated_at=datetime.utcnow(),
+            ))
+
+    stale_ids = {row.id for row, _, _ in stale}
+    task_ids = sorted(tid for tid in digests if tid not in stale_ids or tid in fresh_packed)
+    return task_ids, digests, fresh_packed
+
+def _store_embeddings(session: Session, fresh_packed: Dict[int, bytes]) -> None:
+    """Persist fresh vectors so the next search only embeds the query."""
+    if fresh_packed:
+        try:
+            session.commit()
+        except IntegrityError:
+            # A concurrent search stored the same task first; its vector is equivalent.
+            session.rollback()
+
+def _search_ivf(
+    session: Session, user_id: str, stamp: tuple, query_vec: List[float], limit: int
+) -> tuple[List[tuple], Dict[int, bytes]]:
+    """Top K from the user's IVF index, plus the vectors embedded on the way.
+
+    Like the lexical index, the IVF index remembers the task stamp it was reconciled
+    at: only tasks created or updated since are re-read and re-hashed, and task ids
+    are listed only when the count shows deletions. An index built with another
+    embedding model or dimension is retrained from scratch.
     """
-    Perform semantic search on user's tasks.
-    1. Fetch all tasks for user.
-    2. Embed query.
-    3. Batch embed tasks (in-memory RAG).
-    4. Rank by cosine similarity.
+    def as_matrix(ids: List[int], packed: Dict[int, bytes]):
+        return TaskVectorMatrix.from_packed(ids, [packed[tid] for tid in ids]).matrix
+
+    fresh_packed: Dict[int, bytes] = {}
+    with index_store.user_lock(user_id):
+        index = index_store.get(user_id)
+        if index is not None and (
+            index.model != EMBEDDING_MODEL or index.dim != len(query_vec) or index.needs_retrain()
+        ):
+            index = None
+        if index is None:
+            rows = _embedding_rows(session, user_id)
+            task_ids, digests, fresh_packed = _embed_stale(session, user_id, rows)
+            packed = _packed_vectors(session, user_id, task_ids, fresh_packed)
+            index = IVFIndex.train(
+                task_ids, as_matrix(task_ids, packed), [digests[tid] for tid in task_ids], model=EMBEDDING_MODEL
+            )
+            index.stamp = stamp if len(task_ids) == len(rows) else None
+            index_store.put(user_id, index, force=True)
+        elif index.stamp != stamp:
+            criteria = [changed_since(index.stamp)] if index.stamp else []
+            rows = _embedding_rows(session, user_id, *criteria)
+            task_ids, digests, fresh_packed = _embed_stale(session, user_id, rows)
+            added = [tid for tid in task_ids if index.hashes.get(tid) != digests[tid]]
+            packed = _packed_vectors(session, user_id, added, fresh_packed)
+            index.add(added, as_matrix(added, packed), [digests[tid] for tid in added])
+            if len(index) != stamp[0]:
+                live = set(session.exec(select(Task.id).where(Task.user_id == user_id)).all())
+                index.remove([tid for tid in index.assignment if tid not in live])
+            # Keep the old stamp while any embedding failed so those tasks are retried
+            if len(task_ids) == len(rows):
+                index.stamp = stamp
+            index_store.put(user_id, index)
+        ranked = index.top_k(query_vec, limit)
+
+    def exact_matrix():
+        packed = _packed_vectors(session, user_id, sorted(index.assignment), fresh_packed)
+        ids = sorted(packed)
+        return TaskVectorMatrix.from_packed(ids, [packed[tid] for tid in ids])
+
+    index_store.maybe_sample_recall(index, exact_matrix, query_vec, limit)
+    return ranked, fresh_packed
+
+def _semantic_rank(
+    session: Session, user_id: str, query_vec: List[float], depth: int
+) -> tuple[List[tuple], Dict[int, Any]]:
+    """Top `depth` (task_id, cosine) for the user plus the task rows read on the way, by id.
+
+    Embeds only tasks that are new or whose content hash changed, and stores them.
+    The IVF path reads changed rows only, so it returns no task rows.
     """
-    # 1. Get query embedding
-    try:
-        query_vec = get_embedding(query)
-    except Exception as e:
-        print(f"RAG Error: Failed to embed query: {e}")
-        # Fallback to empty context or handling
-        return []
+    if RAG_INDEX == "ivf":
+        stamp = task_stamp(session, user_id)
+        if stamp[0] >= ANN_MIN_TASKS:
+            ranked, fresh_packed = _search_ivf(session, user_id, stamp, query_vec, depth)
+            _store_embeddings(session, fresh_packed)
+            return ranked, {}
 
-    # 2. Get all user tasks
+    rows = _embedding_rows(session, user_id)
+    if not rows:
+        return [], {}
+    tasks_by_id = {row.id: row for row in rows}
+    task_ids, digests, fresh_packed = _embed_stale(session, user_id, rows)
+
+    # Score against the user's matrix
+    signature = content_hash(
+        EMBEDDING_MODEL + "".join(f"|{tid}:{digests[tid]}" for tid in task_ids)
+    )
+    matrix = matrix_cache.get(user_id, signature)
+    if matrix is None:
+        # Cache miss: load stored vectors for the unchanged tasks
+        packed = _packed_vectors(session, user_id, task_ids, fresh_packed)
+        matrix = TaskVectorMatrix.from_packed(task_ids, [packed[tid] for tid in task_ids])
+        matrix_cache.put(user_id, signature, matrix)
+    ranked = matrix.top_k(query_vec, depth)
+
+    _store_embeddings(session, fresh_packed)
+    return ranked, tasks_by_id
+
+def _result(t, score: float, match: str) -> Dict[str, Any]:
+    return {
+        "id": t.id,
+        "title": t.title,
+        "description": t.description,
+        "tags": t.tags,
+        "priority": t.priority,
+        "due_date": t.due_date.isoformat() if t.due_date else None,
+        "relevance_score": round(score, 3),
+        "match": match,
+    }
+
+def reciprocal_rank_fusion(rankings: List[List[tuple]], k: int = 60) -> List[int]:
+    """Fuse ranked (task_id, score) lists by summing 1 / (k + rank)."""
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, (task_id, _) in enumerate(ranking):
+            fused[task_id] = fused.get(task_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(fused, key=fused.get, reverse=True)
+
+def search_tasks_semantic(user_id: str, query: str, limit: int = 5) -> List[Dict[str, Any]]:
+    """
+    Hybrid search over the user's tasks.
+    1. BM25 over the user's inverted index (title, description, tags).
+    2. Keyword queries (every token is an indexed term) are answered from BM25 alone,
+       without an embedding call.
+    3. Otherwise embed the query, rank by cosine (stored vectors, cached matrix or IVF)
+       and fuse both rankings with reciprocal rank fusion.
+    """
+    depth = max(limit * 4, 20)
+    tokens = tokenize(query)
     with Session(engine) as session:
-        statement = select(Task).where(Task.user_id == user_id)
-        tasks = session.exec(statement).all()
+        # 1. Lexical candidates
+        index = lexical_store.get(session, user_id)
+        lexical = index.bm25(tokens, depth)
 
-    if not tasks:
-        return []
+        # 2. Keyword query: no embedding needed
+        if lexical and index.knows_all(tokens):
+            top = lexical[:limit]
+            rows = _task_rows(session, [tid for tid, _ in top])
+            best = top[0][1] or 1.0
+            return [_result(rows[tid], score / best, "lexical") for tid, score in top if tid in rows]
 
-    # Prepare text for embedding: "Title: Description Tags: ..."
-    task_texts = []
-    for t in tasks:
-        content = f"{t.title}"
-        if t.description:
-            content += f" {t.description}"
-        if t.tags:
-            content += f" tags:{t.tags}"
-        if t.priority:
-            content += f" priority:{t.priority}"
-        task_texts.append(content)
-    
-    # 3. Batch embed tasks
-    # optimization: in a real app, vectors would be stored in DB.
-    # For this hackathon/MVP, we re-embed. It's fast for <50 tasks.
-    try:
-        embeddings = get_batch_embeddings(task_texts)
-    except Exception as e:
-        print(f"RAG Error: Failed to embed tasks: {e}")
-        return []
+        # 3. Semantic ranking, fused with lexical
+        try:
+            query_vec = get_embedding(query)
+        except Exception as e:
+            print(f"RAG Error: Failed to embed query: {e}")
+            query_vec = None
+        if query_vec is None:
+            semantic, tasks_by_id = [], {}
+        else:
+            semantic, tasks_by_id = _semantic_rank(session, user_id, query_vec, depth)
 
-    # 4. Compute scores
-    scored_tasks = []
-    for i, task in enumerate(tasks):
-        score = cosine_similarity(query_vec, embeddings[i])
-        scored_tasks.append((score, task))
-
-    # 5. Sort and return top K
-    scored_tasks.sort(key=lambda x: x[0], reverse=True)
-    top_k = scored_tasks[:limit]
-
-    results = []
-    for score, t in top_k:
-        # Only return if somewhat relevant? (Threshold e.g. 0.3)
-        # For now return top K regardless of score to be helpful
-        results.append({
-            "id": t.id,
-            "title": t.title,
-            "description": t.description,
-            "tags": t.tags,
-            "priority": t.priority,
-            "due_date": t.due_date.isoformat() if t.due_date else None,
-            "relevance_score": round(score, 3)
-        })
+        cosine = dict(semantic)
+        lexical_ids = {tid for tid, _ in lexical}
+        best_lexical = lexical[0][1] if lexical else 1.0
+        bm25 = dict(lexical)
+        top = reciprocal_rank_fusion([semantic, lexical])[:limit]
+        tasks_by_id.update(_task_rows(session, [tid for tid in top if tid not in tasks_by_id]))
+        results = []
+        for task_id in top:
+            t = tasks_by_id.get(task_id)
+            if t is None:
+                continue
+            if task_id in cosine:
+                match = "both" if task_id in lexical_ids else "semantic"
+                results.append(_result(t, cosine[task_id], match))
+            else:
+                results.append(_result(t, bm25[task_id] / (best_lexical or 1.0), "lexical"))
 
     return results
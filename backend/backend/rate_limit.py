@@ -0,0 +1,208 @@
+# Phase II + III — per-user rate limits by route group and admission control for LLM calls
+# [From]: specs/api/rest-endpoints.md, Hackathon Phase III — POST /api/{user_id}/chat
+
+import asyncio
+import json
+import math
+import os
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Annotated
+
+from fastapi import Depends, HTTPException, status
+
+from backend.auth import get_current_user_id
+
+RATE_LIMITS = os.environ.get("RATE_LIMITS", "1") == "1"
+RATE_LIMIT_STORE = os.environ.get("RATE_LIMIT_STORE", "")  # Dapr state store shared by workers; empty = per process
+RATE_LIMIT_KEYS = int(os.environ.get("RATE_LIMIT_KEYS", "100000"))  # Buckets kept per group (idle ones evicted)
+
+# Group -> "tokens per second,burst"
+ROUTE_GROUPS = {
+    "tasks_read": os.environ.get("RATE_LIMIT_TASKS_READ", "20,100"),
+    "tasks_write": os.environ.get("RATE_LIMIT_TASKS_WRITE", "10,50"),
+    "chat": os.environ.get("RATE_LIMIT_CHAT", "0.5,10"),
+}
+
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", "16"))  # Agent turns in flight, all users
+LLM_QUEUE_SIZE = int(os.environ.get("LLM_QUEUE_SIZE", "64"))            # Turns waiting for a slot before 429s
+LLM_QUEUE_TIMEOUT = float(os.environ.get("LLM_QUEUE_TIMEOUT", "15"))    # Seconds a turn may wait for a slot
+
+
+def _too_many(detail: str, retry_after: float) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail=detail,
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+
+def _refill(tokens: float, updated: float, now: float, rate: float, burst: float) -> float:
+    return min(burst, tokens + (now - updated) * rate)
+
+
+class DaprBucketStore:
+    """Token buckets in a Dapr state store, updated with ETag (first-write-wins) retries."""
+
+    def __init__(self, store_name: str, attempts: int = 3):
+        self.store_name = store_name
+        self.attempts = attempts
+        self._client = None
+
+    def _get_client(self):
+        if self._client is None:
+            from dapr.aio.clients import DaprClient
+
+            self._client = DaprClient()
+        return self._client
+
+    async def take(self, key: str, rate: float, burst: float) -> float:
+        from dapr.clients.grpc._state import Concurrency, StateOptions
+
+        client = self._get_client()
+        options = StateOptions(concurrency=Concurrency.first_write)
+        for _ in range(self.attempts):
+            state = await client.get_state(self.store_name, key)
+            now = time.time()
+            tokens, updated = json.loads(state.data) if state.data else (burst, now)
+            tokens = _refill(tokens, updated, now, rate, burst)
+            wait = 0.0 if tokens >= 1 else (1 - tokens) / rate
+            if not wait:
+                tokens -= 1
+            try:
+                await client.save_state(
+                    self.store_name, key, json.dumps([tokens, now]),
+                    etag=state.etag or None, options=options,
+                    state_metadata={"ttlInSeconds": str(max(60, math.ceil(2 * burst / rate)))},
+                )
+                return wait
+            except Exception as e:
+                if "etag" not in str(e).lower():
+                    raise
+        raise RuntimeError(f"Rate limit bucket {key} kept changing under concurrent updates")
+
+
+class TokenBucketLimiter:
+    """Per-key token buckets: `rate` tokens a second, up to `burst`.
+
+    Buckets live in this process unless a shared store is given; a store error falls
+    back to the local bucket for that request, so limits loosen to per-worker rather
+    than failing requests.
+    """
+
+    def __init__(self, group: str, rate: float, burst: float, store=None, max_keys: int = RATE_LIMIT_KEYS):
+        self.group = group
+        self.rate = rate
+        self.burst = burst
+        self.store = store
+        self.max_keys = max_keys
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+        self._counts = {"allowed": 0, "rejected": 0, "store_errors": 0}
+
+    @classmethod
+    def from_spec(cls, group: str, spec: str, store=None) -> "TokenBucketLimiter":
+        rate, burst = (float(x) for x in spec.split(","))
+        return cls(group, rate, burst, store)
+
+    def _take_local(self, key: str) -> float:
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (self.burst, now))
+        tokens = _refill(tokens, updated, now, self.rate, self.burst)
+        wait = 0.0 if tokens >= 1 else (1 - tokens) / self.rate
+        self._buckets[key] = (tokens if wait else tokens - 1, now)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return wait
+
+    async def take(self, key: str) -> float:
+        """Spend one token. -> 0 if allowed, else seconds until one is available."""
+        wait = None
+        if self.store is not None:
+            try:
+                wait = await self.store.take(f"ratelimit-{self.group}-{key}", self.rate, self.burst)
+            except Exception as e:
+                self._counts["store_errors"] += 1
+                print(f"Warning: Rate limit store failed, using the local bucket: {e}")
+        if wait is None:
+            wait = self._take_local(key)
+        self._counts["allowed" if not wait else "rejected"] += 1
+        return wait
+
+    def stats(self) -> dict:
+        return {**self._counts, "rate": self.rate, "burst": self.burst, "buckets": len(self._buckets)}
+
+
+_store = DaprBucketStore(RATE_LIMIT_STORE) if RATE_LIMIT_STORE else None
+limiters = {group: TokenBucketLimiter.from_spec(group, spec, _store) for group, spec in ROUTE_GROUPS.items()}
+
+
+def rate_limit(group: str):
+    """Route dependency: 429 (with Retry-After) once the caller's bucket for `group` is empty."""
+    limiter = limiters[group]
+
+    async def dependency(user_id: Annotated[str, Depends(get_current_user_id)]) -> None:
+        if not RATE_LIMITS:
+            return
+        wait = await limiter.take(user_id)
+        if wait:
+            raise _too_many(f"Rate limit exceeded for {group}", wait)
+
+    return dependency
+
+
+class ConcurrencyGate:
+    """At most `limit` holders at once; up to `queue_size` more wait (for `timeout` s), the rest get 429.
+
+    Keeps a burst of slow LLM calls from piling up unbounded: once the queue is full,
+    new turns are rejected immediately instead of adding to everyone's latency.
+    """
+
+    def __init__(self, limit: int = LLM_MAX_CONCURRENCY, queue_size: int = LLM_QUEUE_SIZE, timeout: float = LLM_QUEUE_TIMEOUT):
+        self.limit = limit
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self._semaphore = asyncio.Semaphore(limit)
+        self.in_flight = 0
+        self.waiting = 0
+        self._counts = {"admitted": 0, "queued": 0, "rejected_full": 0, "rejected_timeout": 0}
+
+    def check(self) -> None:
+        """Fast path for callers that acquire later: 429 now if the queue is already full."""
+        if self._semaphore.locked() and self.waiting >= self.queue_size:
+            self._counts["rejected_full"] += 1
+            raise _too_many("Too many chat requests in progress", self.timeout)
+
+    @asynccontextmanager
+    async def slot(self):
+        if self._semaphore.locked():
+            self.check()
+            self.waiting += 1
+            self._counts["queued"] += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), self.timeout)
+            except asyncio.TimeoutError:
+                self._counts["rejected_timeout"] += 1
+                raise _too_many("Timed out waiting for a chat slot", self.timeout)
+            finally:
+                self.waiting -= 1
+        else:
+            await self._semaphore.acquire()
+        self.in_flight += 1
+        self._counts["admitted"] += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    def stats(self) -> dict:
+        return {**self._counts, "in_flight": self.in_flight, "waiting": self.waiting, "limit": self.limit}
+
+
+llm_gate = ConcurrencyGate()
+
+
+def stats() -> dict:
+    return {"enabled": RATE_LIMITS, "groups": {g: l.stats() for g, l in limiters.items()}, "llm": llm_gate.stats()}
@@ -0,0 +1,487 @@
+# Phase V — recurring tasks: RRULE-style rules, next occurrence, bulk occurrence windows
+# [From]: specs/features/task-crud.md (Recurring Tasks), Hackathon Phase V — Advanced Features
+
+import calendar
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+
+import numpy as np
+from sqlalchemy import delete, insert, or_, update
+from sqlmodel import Session, col, select
+
+from backend.database import engine
+from backend.models import Task, TaskOccurrence, UserSyncState
+
+OCCURRENCE_HORIZON_DAYS = int(os.environ.get("OCCURRENCE_HORIZON_DAYS", "35"))  # Projected ahead (and kept behind)
+MAX_OCCURRENCES_PER_TASK = 500
+
+FREQUENCIES = ("DAILY", "WEEKLY", "MONTHLY", "YEARLY")
+WEEKDAYS = ("MO", "TU", "WE", "TH", "FR", "SA", "SU")
+ALIASES = {"daily": "DAILY", "weekly": "WEEKLY", "monthly": "MONTHLY", "yearly": "YEARLY"}
+
+
+class Rule:
+    """A parsed recurrence: every `interval` days / weeks / months / years.
+
+    `byday` (weekday numbers, Monday 0) picks days within each weekly period;
+    `bymonthday` (1–31, or -1 for the last day) fixes the day of each monthly one.
+    """
+
+    __slots__ = ("freq", "interval", "byday", "bymonthday")
+
+    def __init__(self, freq: str, interval: int = 1, byday: tuple[int, ...] = (), bymonthday: int | None = None):
+        self.freq = freq
+        self.interval = interval
+        self.byday = byday
+        self.bymonthday = bymonthday
+
+    @property
+    def months(self) -> int | None:
+        """Months between periods for monthly/yearly rules, else None."""
+        if self.freq == "MONTHLY":
+            return self.interval
+        if self.freq == "YEARLY":
+            return 12 * self.interval
+        return None
+
+    @property
+    def step_days(self) -> int | None:
+        if self.freq == "DAILY":
+            return self.interval
+        if self.freq == "WEEKLY":
+            return 7 * self.interval
+        return None
+
+    def __str__(self) -> str:
+        if self.interval == 1 and not self.byday and self.bymonthday is None:
+            return self.freq.lower()
+        parts = [f"FREQ={self.freq}"]
+        if self.interval != 1:
+            parts.append(f"INTERVAL={self.interval}")
+        if self.byday:
+            parts.append("BYDAY=" + ",".join(WEEKDAYS[d] for d in self.byday))
+        if self.bymonthday is not None:
+            parts.append(f"BYMONTHDAY={self.bymonthday}")
+        return ";".join(parts)
+
+
+@lru_cache(maxsize=4096)
+def parse_rule(text: str) -> Rule:
+    """'daily' | 'weekly' | 'monthly' | 'yearly', or an RRULE subset such as
+    'FREQ=WEEKLY;INTERVAL=2;BYDAY=MO,TH' or 'FREQ=MONTHLY;BYMONTHDAY=-1'. Raises ValueError.
+    """
+    text = text.strip()
+    if text.lower() in ALIASES:
+        return Rule(ALIASES[text.lower()])
+    if text.upper().startswith("RRULE:"):
+        text = text[6:]
+    parts = {}
+    for part in filter(None, text.upper().split(";")):
+        key, sep, value = part.partition("=")
+        if not sep or key in parts:
+            raise ValueError(f"Invalid recurrence rule part: {part!r}")
+        parts[key] = value
+    unsupported = set(parts) - {"FREQ", "INTERVAL", "BYDAY", "BYMONTHDAY"}
+    if unsupported:
+        raise ValueError(f"Unsupported recurrence rule parts: {', '.join(sorted(unsupported))}")
+    freq = parts.get("FREQ")
+    if freq not in FREQUENCIES:
+        raise ValueError(f"FREQ must be one of {', '.join(FREQUENCIES)}")
+    try:
+        interval = int(parts.get("INTERVAL", "1"))
+    except ValueError:
+        raise ValueError("INTERVAL must be a whole number")
+    if not 1 <= interval <= 1000:
+        raise ValueError("INTERVAL must be between 1 and 1000")
+
+    byday: tuple[int, ...] = ()
+    if "BYDAY" in parts:
+        try:
+            byday = tuple(sorted({WEEKDAYS.index(day) for day in parts["BYDAY"].split(",")}))
+        except ValueError:
+            raise ValueError("BYDAY takes weekday codes: MO,TU,WE,TH,FR,SA,SU")
+        if freq == "DAILY" and interval == 1:
+            freq = "WEEKLY"  # Every day, on these weekdays
+        elif freq != "WEEKLY":
+            raise ValueError("BYDAY is supported with FREQ=WEEKLY (or FREQ=DAILY every day)")
+
+    bymonthday = None
+    if "BYMONTHDAY" in parts:
+        try:
+            bymonthday = int(parts["BYMONTHDAY"])
+        except ValueError:
+            raise ValueError("BYMONTHDAY must be a day number")
+        if freq != "MONTHLY" or not (1 <= bymonthday <= 31 or bymonthday == -1):
+            raise ValueError("BYMONTHDAY (1-31, or -1 for the last day) is supported with FREQ=MONTHLY")
+    return Rule(freq, interval, byday, bymonthday)
+
+
+def normalize_rule(text: str | None) -> str | None:
+    """Stored form of a recurring_rule ('' / None -> None). Raises ValueError if it does not parse."""
+    if not text or not text.strip():
+        return None
+    try:
+        return str(parse_rule(text))
+    except ValueError as e:
+        raise ValueError(f"Invalid recurring_rule: {e}")
+
+
+def naive_utc(value: datetime) -> datetime:
+    """Task datetimes are stored as naive UTC; aware values are converted."""
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def parse_due_date(value: str) -> datetime:
+    """ISO 8601 (a trailing Z allowed) -> naive UTC, as due dates are stored. Raises ValueError."""
+    return naive_utc(datetime.fromisoformat(value.replace("Z", "+00:00")))
+
+
+def _add_months(start: datetime, months: int, day: int) -> datetime:
+    """`months` after `start` on `day` (-1 = last), clamped to the month's length."""
+    year, month = divmod(start.year * 12 + start.month - 1 + months, 12)
+    last = calendar.monthrange(year, month + 1)[1]
+    return start.replace(year=year, month=month + 1, day=last if day == -1 else min(day, last))
+
+
+def occurrences(
+    rule: Rule,
+    dtstart: datetime,
+    after: datetime,
+    until: datetime | None = None,
+    limit: int = MAX_OCCURRENCES_PER_TASK,
+) -> list[datetime]:
+    """Occurrences of the series starting at `dtstart` in (after, until], earliest first (naive UTC).
+
+    Month-end: a day a month lacks clamps to its last day, and later months go back to
+    the series' own day (monthly from Jan 31: Feb 28, Mar 31, Apr 30), where RFC 5545
+    would skip those months instead.
+    """
+    dtstart, after = naive_utc(dtstart), naive_utc(after)
+    until = naive_utc(until) if until is not None else None
+    found: list[datetime] = []
+    if rule.months:
+        day = rule.bymonthday or dtstart.day
+        k = max(0, ((after.year - dtstart.year) * 12 + after.month - dtstart.month) // rule.months - 1)
+        while len(found) < limit:
+            when = _add_months(dtstart, k * rule.months, day)
+            k += 1
+            if until is not None and when > until:
+                break
+            if when > after and when >= dtstart:
+                found.append(when)
+        return found
+
+    step = timedelta(days=rule.step_days)
+    starts = [dtstart]
+    if rule.byday:
+        monday = dtstart - timedelta(days=dtstart.weekday())
+        starts = [monday + timedelta(days=d) for d in rule.byday]
+        starts = [s if s >= dtstart else s + step for s in starts]  # Days before dtstart: next period
+    for start in starts:
+        when = start if after < start else start + ((after - start) // step + 1) * step
+        for _ in range(limit):
+            if until is not None and when > until:
+                break
+            found.append(when)
+            when += step
+    found.sort()
+    return found[:limit]
+
+
+def next_occurrence(rule: Rule, dtstart: datetime, after: datetime) -> datetime | None:
+    found = occurrences(rule, dtstart, after, limit=1)
+    return found[0] if found else None
+
+
+def next_task(task: Task) -> Task | None:
+    """The follow-up a completed recurring task spawns, due at its series' next occurrence."""
+    if not (task.recurring_rule and task.due_date):
+        return None
+    try:
+        rule = parse_rule(task.recurring_rule)
+    except ValueError:
+        return None
+    start = task.recurrence_start or task.due_date
+    next_due = next_occurrence(rule, start, task.due_date)
+    if next_due is None:
+        return None
+    return Task(
+        user_id=task.user_id,
+        title=task.title,
+        description=task.description,
+        priority=task.priority,
+        tags=task.tags,
+        recurring_rule=task.recurring_rule,
+        recurrence_start=naive_utc(start),
+        due_date=next_due,
+        completed=False,
+        event_seq=1,  # Its "created" event
+    )
+
+
+# Bulk: one row of integer codes per rule -> occurrence windows for many series at once
+
+_STEP, _MONTH = 1, 2
+_DAY = 86_400_000_000  # Microseconds
+
+
+@lru_cache(maxsize=4096)
+def _rule_code(text: str | None) -> tuple[int, int, int, int]:
+    """-> (kind, days or months per period, weekday bit mask, day of month); kind 0 = no rule."""
+    try:
+        rule = parse_rule(text) if text else None
+    except ValueError:
+        rule = None
+    if rule is None:
+        return 0, 0, 0, 0
+    if rule.months:
+        return _MONTH, rule.months, 0, rule.bymonthday or 0
+    return _STEP, rule.step_days, sum(1 << d for d in rule.byday), 0
+
+
+def bulk_occurrences(
+    rules: list[str | None],
+    starts: np.ndarray,
+    afters: np.ndarray,
+    until: datetime,
+    limit: int = MAX_OCCURRENCES_PER_TASK,
+) -> tuple[np.ndarray, np.ndarray]:
+    """`occurrences` for many series at once, vectorized.
+
+    `starts` / `afters` are datetime64 arrays (naive UTC) aligned with `rules`. ->
+    (series index, occurrence as datetime64[us]), sorted by index then time. Series
+    whose rule does not parse have none.
+    """
+    # Few distinct rules: encode each once, then index
+    distinct = {rule: i for i, rule in enumerate(dict.fromkeys(rules))}
+    which = np.fromiter(map(distinct.__getitem__, rules), np.int64, len(rules))
+    codes = np.array([_rule_code(r) for r in distinct], dtype=np.int64).reshape(-1, 4)
+    kind, size, mask, monthday = codes[which].T
+    start_us = starts.astype("M8[us]").astype(np.int64)
+    after_us = afters.astype("M8[us]").astype(np.int64)
+    until_us = np.datetime64(naive_utc(until), "us").astype(np.int64)
+    found_idx, found_at = [], []
+
+    # Each group below yields its series in index order, each series' times ascending,
+    # so a stable sort on the index alone merges them
+
+    # Daily / weekly without BYDAY: one arithmetic progression per series
+    sel = np.nonzero((kind == _STEP) & (mask == 0))[0]
+    if sel.size:
+        step = size[sel] * _DAY
+        start = start_us[sel]
+        after = after_us[sel]
+        first = start + np.where(after < start, 0, (after - start) // step + 1) * step
+        count = np.minimum(np.where(first <= until_us, (until_us - first) // step + 1, 0), limit)
+        nth = np.arange(int(count.sum())) - np.repeat(np.cumsum(count) - count, count)
+        found_idx.append(np.repeat(sel, count))
+        found_at.append(np.repeat(first, count) + nth * np.repeat(step, count))
+
+    # Weekly with BYDAY: periods from the week of dtstart, each expanded to its weekdays
+    sel = np.nonzero((kind == _STEP) & (mask != 0))[0]
+    if sel.size:
+        step = size[sel] * _DAY
+        start = start_us[sel]
+        after = after_us[sel]
+        days = start // _DAY
+        monday = (days - (days + 3) % 7) * _DAY + start % _DAY  # 1970-01-01 was a Thursday
+        first = (np.maximum(after, start) - monday) // step
+        count = np.clip(np.where(until_us >= monday, (until_us - monday) // step - first + 1, 0), 0, limit + 1)
+        series = np.repeat(np.arange(sel.size), count)
+        nth = np.arange(series.size) - np.repeat(np.cumsum(count) - count, count)
+        when = (monday[series] + (first[series] + nth) * step[series])[:, None] + np.arange(7) * _DAY
+        valid = (mask[sel][series][:, None] >> np.arange(7)) & 1 == 1
+        valid &= (when > after[series][:, None]) & (when >= start[series][:, None]) & (when <= until_us)
+        rows, cols = np.nonzero(valid)
+        found_idx.append(sel[series[rows]])
+        found_at.append(when[rows, cols])
+
+    # Monthly / yearly: a grid of candidate periods per series, masked to the window
+    sel = np.nonzero(kind == _MONTH)[0]
+    if sel.size:
+        start = start_us[sel]
+        after = after_us[sel]
+        months = size[sel]
+        start_month = start.astype("M8[us]").astype("M8[M]").astype(np.int64)
+        after_month = after.astype("M8[us]").astype("M8[M]").astype(np.int64)
+        until_month = np.datetime64(int(until_us), "us").astype("M8[M]").astype(np.int64)
+        k0 = np.maximum(0, (after_month - start_month) // months - 1)
+        width = int(min(max(0, ((until_month - after_month) // months).max()), limit)) + 3
+        month = start_month[:, None] + (k0[:, None] + np.arange(width)) * months[:, None]
+        # First day (days since epoch) of every month the grid touches, looked up rather than converted
+        low = int(min(month.min(), start_month.min()))
+        month_start = np.arange(low, int(month.max()) + 2).astype("M8[M]").astype("M8[D]").astype(np.int64)
+        start_day = start // _DAY - month_start[start_month - low] + 1
+        day = np.where(monthday[sel] == 0, start_day, monthday[sel])
+        first_day = month_start[month - low]
+        month_days = month_start[month - low + 1] - first_day
+        on_day = np.where(day[:, None] == -1, month_days, np.minimum(day[:, None], month_days))
+        when = (first_day + on_day - 1) * _DAY + (start % _DAY)[:, None]
+        rows, cols = np.nonzero((when > after[:, None]) & (when >= start[:, None]) & (when <= until_us))
+        found_idx.append(sel[rows])
+        found_at.append(when[rows, cols])
+
+    if not found_idx:
+        return np.empty(0, np.int64), np.empty(0, "M8[us]")
+    idx = np.concatenate(found_idx)
+    at = np.concatenate(found_at)
+    order = np.argsort(idx, kind="stable")
+    idx, at = idx[order], at[order]
+    if idx.size:
+        first_of_series = np.concatenate([[0], np.nonzero(np.diff(idx))[0] + 1])
+        rank = np.arange(idx.size) - np.repeat(first_of_series, np.diff(np.append(first_of_series, idx.size)))
+        keep = rank < limit
+        idx, at = idx[keep], at[keep]
+    return idx, at.astype("M8[us]")
+
+
+def occurrence_rows(user_id: str, tasks: list[Task], through: datetime, now: datetime | None = None) -> list[dict]:
+    """task_occurrences rows for pending tasks: each due date, plus recurring tasks'
+    projected occurrences after it, from OCCURRENCE_HORIZON_DAYS ago up to `through`.
+    """
+    tasks = [t for t in tasks if not t.completed and t.due_date is not None]
+    if not tasks:
+        return []
+    floor = (now or datetime.utcnow()) - timedelta(days=OCCURRENCE_HORIZON_DAYS)
+    dues = [naive_utc(t.due_date) for t in tasks]
+    rows = {(t.id, due): {"task_id": t.id, "user_id": user_id, "occurs_at": due} for t, due in zip(tasks, dues)}
+    idx, at = bulk_occurrences(
+        [t.recurring_rule for t in tasks],
+        np.array([naive_utc(t.recurrence_start) if t.recurrence_start else due for t, due in zip(tasks, dues)], "M8[us]"),
+        np.array([max(due, floor) for due in dues], "M8[us]"),
+        through,
+    )
+    for i, when in zip(idx.tolist(), at.astype(datetime).tolist()):
+        task_id = tasks[i].id
+        rows[(task_id, when)] = {"task_id": task_id, "user_id": user_id, "occurs_at": when}
+    return list(rows.values())
+
+
+def refresh_occurrences(session: Session, user_id: str, tasks: list[Task], deleted_ids: set[int], through: datetime) -> None:
+    """Replace the occurrence rows of changed (`tasks`) and deleted tasks, in the session's transaction."""
+    ids = sorted({t.id for t in tasks} | deleted_ids)
+    if not ids:
+        return
+    session.exec(delete(TaskOccurrence).where(col(TaskOccurrence.task_id).in_(ids)))
+    rows = occurrence_rows(user_id, tasks, through)
+    if rows:
+        session.exec(insert(TaskOccurrence), params=rows)
+
+
+def build_occurrences(session: Session, user_id: str, until: datetime) -> bool:
+    """Rebuild the user's task_occurrences through `until` plus OCCURRENCE_HORIZON_DAYS,
+    unless they already reach half the horizon past it. -> whether rows were rebuilt.
+
+    Claims the user's sync row first, so task writers (which refresh their tasks' rows
+    at commit under the same row lock) cannot interleave with the rebuild. Users with
+    no sync row have never had a tracked write and are left alone. The caller commits.
+    """
+    now = datetime.utcnow()
+    until = max(naive_utc(until), now)
+    through = until + timedelta(days=OCCURRENCE_HORIZON_DAYS)
+    claimed = session.execute(
+        update(UserSyncState)
+        .where(UserSyncState.user_id == user_id)
+        .where(or_(
+            col(UserSyncState.occurrences_through).is_(None),
+            UserSyncState.occurrences_through < until + timedelta(days=OCCURRENCE_HORIZON_DAYS / 2),
+        ))
+        .values(occurrences_through=through)
+    ).rowcount
+    if not claimed:
+        return False
+    tasks = session.exec(
+        select(Task).where(Task.user_id == user_id, Task.completed == False, col(Task.due_date).is_not(None))
+    ).all()
+    session.exec(delete(TaskOccurrence).where(TaskOccurrence.user_id == user_id))
+    rows = occurrence_rows(user_id, list(tasks), through, now)
+    if rows:
+        session.exec(insert(TaskOccurrence), params=rows)
+    return True
+
+
+def needs_build(through: datetime | None, until: datetime) -> bool:
+    """Whether occurrences kept `through` fall short of half the horizon past `until`."""
+    return through is None or through < until + timedelta(days=OCCURRENCE_HORIZON_DAYS / 2)
+
+
+class OccurrenceBuilder:
+    """Builds users' task_occurrences on a background thread, one user at a time.
+
+    Requested by task writes (the commit hook) when a user's rows are missing or about
+    to run out, and by GET /tasks/due for windows past them, which meanwhile expands
+    occurrences from the tasks. Keeps rebuilds, and the sync row lock they take, off
+    the request path: at worst a build briefly queues that user's writes.
+    """
+
+    def __init__(self, bind=engine):
+        self.bind = bind
+        self._pending: dict[str, datetime] = {}
+        self._thread: threading.Thread | None = None
+        self._stopping = threading.Event()
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._counts = {"requested": 0, "built": 0, "failures": 0}
+
+    def request(self, user_id: str, until: datetime) -> None:
+        """Queue a build through `until` (thread-safe; repeated requests merge)."""
+        with self._lock:
+            queued = self._pending.get(user_id)
+            self._pending[user_id] = until if queued is None else max(queued, until)
+            self._counts["requested"] += 1
+        self._wake.set()
+
+    def build_pending(self) -> int:
+        """Build each queued user once. -> users rebuilt."""
+        built = 0
+        while True:
+            with self._lock:
+                if not self._pending:
+                    return built
+                user_id, until = self._pending.popitem()
+            try:
+                with Session(self.bind) as session:
+                    if not build_occurrences(session, user_id, until):
+                        continue
+                    session.commit()
+            except Exception as e:
+                print(f"Warning: Building task occurrences for {user_id} failed: {e}")
+                with self._lock:
+                    self._counts["failures"] += 1
+                continue
+            built += 1
+            with self._lock:
+                self._counts["built"] += 1
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="occurrence-builder", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        self._stopping.set()
+        self._wake.set()
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        self._thread = None
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            self._wake.wait()
+            self._wake.clear()
+            self.build_pending()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._counts, "pending": len(self._pending)}
+
+
+occurrence_builder = OccurrenceBuilder()
@@ -0,0 +1,184 @@
+# Phase III — per-user semantic cache of read-only chat answers
+# [From]: specs/features/rag-chatbot.md (Semantic Search), specs/features/chatbot.md
+
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from backend.agent import READ_TOOLS
+
+RESPONSE_CACHE = os.environ.get("RESPONSE_CACHE", "1") == "1"
+RESPONSE_CACHE_USERS = int(os.environ.get("RESPONSE_CACHE_USERS", "1024"))
+RESPONSE_CACHE_PER_USER = int(os.environ.get("RESPONSE_CACHE_PER_USER", "32"))
+RESPONSE_CACHE_TTL = float(os.environ.get("RESPONSE_CACHE_TTL", "300"))  # Seconds; answers can mention "today"
+RESPONSE_CACHE_THRESHOLD = float(os.environ.get("RESPONSE_CACHE_THRESHOLD", "0.92"))  # Cosine similarity for a hit
+
+_PUNCT_RE = re.compile(r"[^\w\s]")
+STOPWORDS = frozenset(
+    "a an the my me i im do does did is are am be any all of for to on in please can could you "
+    "show list tell give what whats which have has got there theres".split()
+)
+
+
+def normalize(message: str) -> str:
+    """Lowercase, punctuation dropped, whitespace collapsed: "What's pending?" == "whats pending"."""
+    return " ".join(_PUNCT_RE.sub("", message.lower()).split())
+
+
+def content_words(key: str) -> frozenset:
+    return frozenset(key.split()) - STOPWORDS
+
+
+def is_read_only(tool_calls: list[dict]) -> bool:
+    """A turn worth caching: it looked tasks up and changed nothing."""
+    return bool(tool_calls) and all(call["name"] in READ_TOOLS for call in tool_calls)
+
+
+class Probe:
+    """A lookup's key material, reused to store the answer on a miss."""
+
+    def __init__(self, user_id: str, key: str, vector: np.ndarray | None, version: int):
+        self.user_id = user_id
+        self.key = key
+        self.vector = vector
+        self.version = version  # User's task version (user_sync) when the lookup ran
+
+
+class _UserEntries:
+    def __init__(self):
+        self.version = 0
+        self.answers: OrderedDict[str, tuple[np.ndarray | None, str, list[dict], float]] = OrderedDict()
+
+
+class ResponseCache:
+    """Answers to read-only chat turns by user, found by normalized text or embedding similarity.
+
+    Freshness is checked against the user's task version (UserSyncState, bumped in the
+    database by every task change), so a change made through any worker is seen by all:
+    answers are kept for one version only, and an answer computed while a change landed
+    is stored under the older version and never served. Only opening questions are
+    cached; the caller skips turns that have conversation history.
+    """
+
+    def __init__(
+        self,
+        embed=None,
+        max_users: int = RESPONSE_CACHE_USERS,
+        per_user: int = RESPONSE_CACHE_PER_USER,
+        ttl: float = RESPONSE_CACHE_TTL,
+        threshold: float = RESPONSE_CACHE_THRESHOLD,
+    ):
+        self.embed = embed
+        self.max_users = max_users
+        self.per_user = per_user
+        self.ttl = ttl
+        self.threshold = threshold
+        self._users: OrderedDict[str, _UserEntries] = OrderedDict()
+        self._lock = threading.Lock()
+        self._counts = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "stores": 0, "invalidations": 0}
+
+    def _embed(self, text: str) -> np.ndarray | None:
+        if self.embed is None:
+            return None
+        try:
+            vector = np.asarray(self.embed(text), dtype=np.float32)
+        except Exception as e:
+            print(f"Warning: Response cache embedding failed, exact matches only: {e}")
+            return None
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm else None
+
+    def _user(self, user_id: str) -> _UserEntries:
+        entries = self._users.get(user_id)
+        if entries is None:
+            entries = self._users[user_id] = _UserEntries()
+        self._users.move_to_end(user_id)
+        while len(self._users) > self.max_users:
+            self._users.popitem(last=False)
+        return entries
+
+    def lookup(self, user_id: str, message: str, version: int) -> tuple[tuple[str, list[dict]] | None, Probe]:
+        """-> ((response, tool_calls) or None, probe for `store`). `version` is the user's current task version.
+
+        Blocking: embeds the message when the user has answers to compare it with.
+        """
+        key = normalize(message)
+        with self._lock:
+            entries = self._user(user_id)
+            self._advance(entries, version)
+            now = time.monotonic()
+            for stale in [k for k, (_, _, _, at) in entries.answers.items() if now - at > self.ttl]:
+                del entries.answers[stale]
+            if key in entries.answers:
+                _, response, tool_calls, _ = entries.answers[key]
+                entries.answers.move_to_end(key)
+                self._counts["exact_hits"] += 1
+                return (response, tool_calls), Probe(user_id, key, None, version)
+            # Similar wording only: "show me my high priority tasks" may reuse "show my high
+            # priority tasks", but "low priority" must not, however close the embeddings are
+            words = content_words(key)
+            candidates = [
+                (k, v) for k, (v, _, _, _) in entries.answers.items() if v is not None and content_words(k) == words
+            ]
+
+        vector = self._embed(key) if candidates else None
+        if vector is not None:
+            scores = np.stack([v for _, v in candidates]) @ vector
+            best = int(np.argmax(scores))
+            if scores[best] >= self.threshold:
+                with self._lock:
+                    answer = self._user(user_id).answers.get(candidates[best][0])
+                    if answer is not None:
+                        self._counts["semantic_hits"] += 1
+                        return (answer[1], answer[2]), Probe(user_id, key, vector, version)
+        with self._lock:
+            self._counts["misses"] += 1
+        return None, Probe(user_id, key, vector, version)
+
+    def store(self, probe: Probe, response: str, tool_calls: list[dict]) -> None:
+        """Keep a read-only turn's answer. Blocking: embeds the message if the lookup did not."""
+        if not is_read_only(tool_calls):
+            return
+        vector = probe.vector if probe.vector is not None else self._embed(probe.key)
+        with self._lock:
+            entries = self._user(probe.user_id)
+            self._advance(entries, probe.version)
+            if entries.version != probe.version:
+                return  # Tasks changed while the answer was being produced
+            entries.answers[probe.key] = (vector, response, tool_calls, time.monotonic())
+            entries.answers.move_to_end(probe.key)
+            while len(entries.answers) > self.per_user:
+                entries.answers.popitem(last=False)
+            self._counts["stores"] += 1
+
+    def _advance(self, entries: _UserEntries, version: int) -> None:
+        """Drop answers from an older task version (caller holds the lock)."""
+        if version > entries.version:
+            if entries.answers:
+                entries.answers.clear()
+                self._counts["invalidations"] += 1
+            entries.version = version
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits = self._counts["exact_hits"] + self._counts["semantic_hits"]
+            lookups = hits + self._counts["misses"]
+            return {
+                **self._counts,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "users": len(self._users),
+                "answers": sum(len(e.answers) for e in self._users.values()),
+            }
+
+
+def _embed_query(text: str):
+    from backend.rag import get_embedding
+
+    return get_embedding(text)
+
+
+response_cache = ResponseCache(embed=_embed_query)
@@ -1,16 +1,23 @@
 # Phase III — Chat endpoint + OpenAI Agents SDK
 # [From]: Hackathon Phase III — POST /api/{user_id}/chat, stateless, persist to DB
 
-import os
-from typing import Annotated
+import asyncio
+import json
+from typing import Annotated, AsyncIterator
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 from pydantic import BaseModel
-from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
+from backend.agent import run_agent, stream_agent
 from backend.auth import get_current_user_id
-from backend.database import get_session
-from backend.models import Conversation, Message
+from backend.chat_history import build_window, create_conversation, fold_summary, load_conversation, save_turn
+from backend.database import async_engine, get_async_session
+from backend.models import UserSyncState
+from backend.rate_limit import llm_gate, rate_limit
+from backend.response_cache import RESPONSE_CACHE, response_cache
 from backend.routes.tasks import require_user_match  # Path + get_current_user_id
 
 router = APIRouter(prefix="/api", tags=["chat"])
@@ -25,211 +32,141 @@ class ChatResponse(BaseModel):
     conversation_id: int
     response: str
     tool_calls: list[dict] = []
+    cached: bool = False  # Answered from the response cache
 
 
-def _get_agent_and_run(user_id: str, messages: list[dict]):
-    import google.generativeai as genai
-    from google.generativeai.types import content_types
-    from collections.abc import Iterable
+async def _load_conversation(
+    session: AsyncSession, user_id: str, body: ChatRequest
+) -> tuple[int, str, list[dict], int | None]:
+    """Find (cache first) or create the conversation.
 
-    if not os.environ.get("GEMINI_API_KEY"):
-        raise HTTPException(status_code=503, detail="GEMINI_API_KEY not set")
-    
-    genai.configure(api_key=os.environ.get("GEMINI_API_KEY"))
+    -> (conversation id, user message, bounded messages to send, summary fold point or None;
+    see build_window). Nothing is written for an existing conversation until the turn is
+    saved with save_turn.
+    """
+    if not (body.message and body.message.strip()):
+        raise HTTPException(status_code=400, detail="message is required")
 
-    from backend.agent_tools import (
-        add_task as add_task_impl,
-        complete_task as complete_task_impl,
-        delete_task as delete_task_impl,
-        list_tasks as list_tasks_impl,
-        update_task as update_task_impl,
-        search_tasks as search_tasks_impl,
-    )
+    if body.conversation_id is not None:
+        entry = await load_conversation(session, user_id, body.conversation_id)
+        if entry is None:
+            raise HTTPException(status_code=404, detail="Conversation not found")
+    else:
+        entry = await create_conversation(session, user_id)
 
-    # 1. Define tools wrappers
-    # Gemini SDK accepts functions directly. We just need to wrap them if we want to inject user_id.
-
-    def add_task_tool(
-        title: str, 
-        description: str = "",
-        priority: str = "medium",
-        tags: str | None = None,
-        due_date: str | None = None,
-        recurring_rule: str | None = None
-    ):
-        """Create a new task. 
-        priority: 'low', 'medium', 'high'.
-        tags: comma-separated.
-        due_date: ISO 8601 string.
-        recurring_rule: 'daily', 'weekly', 'monthly'.
-        """
-        return add_task_impl(
-            user_id, 
-            title, 
-            description, 
-            priority=priority, 
-            tags=tags, 
-            due_date=due_date, 
-            recurring_rule=recurring_rule
-        )
-
-    def list_tasks_tool(
-        status: str = "all",
-        priority: str | None = None,
-        tag: str | None = None,
-        search: str | None = None
-    ):
-        """List tasks with filtering.
-        status: 'all' | 'pending' | 'completed'.
-        """
-        return list_tasks_impl(
-            user_id, 
-            status=status,
-            priority=priority,
-            tag=tag,
-            search=search
-        )
-
-    def search_tasks_tool(query: str):
-        """Semantic search for tasks. Use this for vague queries like 'What do I need to do?' or 'Any chores?'.
-        Returns tasks relevant to the query based on meaning.
-        """
-        return search_tasks_impl(user_id, query)
-
-    def complete_task_tool(task_id: int):
-        """Mark a task complete (toggle)."""
-        return complete_task_impl(user_id, task_id)
-
-    def delete_task_tool(task_id: int):
-        """Delete a task by id."""
-        return delete_task_impl(user_id, task_id)
-
-    def update_task_tool(
-        task_id: int, 
-        title: str | None = None, 
-        description: str | None = None,
-        priority: str | None = None,
-        tags: str | None = None,
-        due_date: str | None = None,
-        recurring_rule: str | None = None
-    ):
-        """Update task details."""
-        return update_task_impl(
-            user_id, 
-            task_id, 
-            title=title, 
-            description=description,
-            priority=priority,
-            tags=tags,
-            due_date=due_date,
-            recurring_rule=recurring_rule
-        )
-
-    tools_list = [
-        add_task_tool,
-        list_tasks_tool,
-        search_tasks_tool,
-        complete_task_tool,
-        delete_task_tool,
-        update_task_tool,
-    ]
-
-    # 2. Initialize Model
-    model = genai.GenerativeModel(
-        model_name='gemini-1.5-flash',
-        tools=tools_list,
-        system_instruction=f"You are a helpful todo assistant. user_id: {user_id}. Use tools to manage tasks. Confirm actions nicely."
-    )
+    # History tail within the token budget, after the summary; ends with the new message
+    user_content = body.message.strip()
+    messages, fold_before = build_window(entry, user_content)
+    return entry.conversation_id, user_content, messages, fold_before
 
-    # 3. Convert messages to Gemini format
-    # OpenAI: [{"role": "user", "content": "hi"}, {"role": "assistant", "content": "hello"}]
-    # Gemini: history=[{"role": "user", "parts": ["hi"]}, {"role": "model", "parts": ["hello"]}]
-    gemini_history = []
-    
-    # Allow only user and model roles for history
-    for m in messages[:-1]: # All except the last new message
-        role = "user" if m.get("role") == "user" else "model"
-        content = m.get("content", "") or ""
-        gemini_history.append({"role": role, "parts": [content]})
-    
-    # 4. Start Chat
-    chat = model.start_chat(history=gemini_history, enable_automatic_function_calling=True)
-    
-    # 5. Send message
-    last_msg = messages[-1].get("content", "")
-    response = chat.send_message(last_msg)
-    
-    final_text = response.text
-    
-    # 6. Extract tool calls (approximation)
-    # With enable_automatic_function_calling=True, the SDK handles the calls and produces a final text response.
-    # We can inspect `chat.history` to find function calls if we really need to return them to the frontend.
-    # backend/routes/chat.py ChatResponse expects `tool_calls: list[dict]`.
-    # Let's inspect the last turn in history.
-    
-    # 6. Extract tool calls
-    # With automatic function calling, the SDK manages the turns.
-    # We inspect the new messages added to history to find any function calls.
-    
-    tool_calls_list = []
-    new_messages = chat.history[len(gemini_history):]
-    
-    for msg in new_messages:
-        for part in msg.parts:
-            if fn := part.function_call:
-                tool_calls_list.append({
-                    "name": fn.name, 
-                    "arguments": dict(fn.args)
-                })
-    
-    return (final_text, tool_calls_list)
-
-
-@router.post("/{user_id}/chat", response_model=ChatResponse)
-def chat(
+
+async def _cached_answer(user_id: str, user_content: str, messages: list[dict]):
+    """-> ((response, tool_calls) or None, probe). Runs in a thread: the lookup may embed.
+
+    Only a conversation's opening message is cached: with history, "what about the
+    second one?" depends on earlier turns that the cache key does not see.
+    """
+    if not RESPONSE_CACHE or len(messages) > 1:
+        return None, None
+    async with AsyncSession(async_engine) as session:
+        state = await session.get(UserSyncState, user_id)
+    return await asyncio.to_thread(response_cache.lookup, user_id, user_content, state.version if state else 0)
+
+
+@router.post("/{user_id}/chat", response_model=ChatResponse, dependencies=[Depends(rate_limit("chat"))])
+async def chat(
     user_id: Annotated[str, Depends(require_user_match)],
     body: ChatRequest,
-    session: Annotated[Session, Depends(get_session)],
+    session: Annotated[AsyncSession, Depends(get_async_session)],
+    background_tasks: BackgroundTasks,
 ):
-    if not (body.message and body.message.strip()):
-        raise HTTPException(status_code=400, detail="message is required")
+    llm_gate.check()  # Fail fast (429) before any DB work when the LLM queue is full
+    conv_id, user_content, messages, fold_before = await _load_conversation(session, user_id, body)
 
-    conv_id = body.conversation_id
-    if conv_id is not None:
-        conv = session.get(Conversation, conv_id)
-        if not conv or conv.user_id != user_id:
-            raise HTTPException(status_code=404, detail="Conversation not found")
+    # Repeated read-only question: answer from the cache, else run the agent
+    cached, probe = await _cached_answer(user_id, user_content, messages)
+    if cached is not None:
+        response_text, tool_calls_list = cached
     else:
-        conv = Conversation(user_id=user_id)
-        session.add(conv)
-        session.commit()
-        session.refresh(conv)
-        conv_id = conv.id
-
-    # Load history
-    stmt = select(Message).where(Message.conversation_id == conv_id).order_by(Message.id)
-    history = list(session.exec(stmt).all())
-    messages = [{"role": m.role, "content": m.content} for m in history]
-
-    # Append new user message
-    user_content = body.message.strip()
-    messages.append({"role": "user", "content": user_content})
-
-    # Save user message
-    user_msg = Message(user_id=user_id, conversation_id=conv_id, role="user", content=user_content)
-    session.add(user_msg)
-    session.commit()
-
-    # Run agent
-    try:
-        response_text, tool_calls_list = _get_agent_and_run(user_id, messages)
-    except Exception as e:
-        response_text = f"Sorry, I encountered an error: {e!s}"
-        tool_calls_list = []
-
-    # Save assistant message
-    assistant_msg = Message(user_id=user_id, conversation_id=conv_id, role="assistant", content=response_text)
-    session.add(assistant_msg)
-    session.commit()
-
-    return ChatResponse(conversation_id=conv_id, response=response_text, tool_calls=tool_calls_list)
+        async with llm_gate.slot():  # 429 if no slot frees up in time
+            try:
+                response_text, tool_calls_list = await run_agent(user_id, messages)
+                if probe is not None:
+                    background_tasks.add_task(response_cache.store, probe, response_text, tool_calls_list)
+            except Exception as e:
+                response_text = f"Sorry, I encountered an error: {e!s}"
+                tool_calls_list = []
+
+    # Save both messages (one commit)
+    await save_turn(session, user_id, conv_id, user_content, response_text)
+
+    if fold_before is not None:
+        background_tasks.add_task(fold_summary, conv_id, fold_before)
+    return ChatResponse(
+        conversation_id=conv_id, response=response_text, tool_calls=tool_calls_list, cached=cached is not None
+    )
+
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+async def _chat_event_stream(
+    user_id: str, conv_id: int, user_content: str, messages: list[dict]
+) -> AsyncIterator[str]:
+    """SSE body: meta, then token / tool_call / tool_result events, then done.
+
+    A cached answer arrives as a single token event (`"cached": true`). The turn is
+    saved once the stream ends (with the text produced so far if the model fails
+    midway). Uses its own session: the request's is closed by then.
+    """
+    yield _sse("meta", {"conversation_id": conv_id})
+    tool_calls_list: list[dict] = []
+    failed = False
+    cached, probe = await _cached_answer(user_id, user_content, messages)
+    if cached is not None:
+        response_text, tool_calls_list = cached
+        yield _sse("token", {"type": "token", "text": response_text, "cached": True})
+    else:
+        text_parts: list[str] = []
+        try:
+            async with llm_gate.slot():
+                try:
+                    async for item in stream_agent(user_id, messages):
+                        if item["type"] == "token":
+                            text_parts.append(item["text"])
+                        elif item["type"] == "tool_call":
+                            tool_calls_list.append({"name": item["name"], "arguments": item["arguments"]})
+                        yield _sse(item["type"], item)
+                except Exception as e:
+                    failed = True
+                    error_text = f"Sorry, I encountered an error: {e!s}"
+                    text_parts.append(f"\n\n{error_text}" if text_parts else error_text)
+                    yield _sse("error", {"message": error_text})
+        except HTTPException as e:
+            # No LLM slot in time: nothing was said, so the turn is not saved
+            yield _sse("error", {"message": e.detail, "status": e.status_code})
+            return
+        response_text = "".join(text_parts)
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        await save_turn(session, user_id, conv_id, user_content, response_text)
+    yield _sse("done", {"conversation_id": conv_id, "response": response_text, "tool_calls": tool_calls_list})
+    if probe is not None and cached is None and not failed:
+        await asyncio.to_thread(response_cache.store, probe, response_text, tool_calls_list)
+
+
+@router.post("/{user_id}/chat/stream", dependencies=[Depends(rate_limit("chat"))])
+async def chat_stream(
+    user_id: Annotated[str, Depends(require_user_match)],
+    body: ChatRequest,
+    session: Annotated[AsyncSession, Depends(get_async_session)],
+):
+    """Same turn as POST /chat, streamed as Server-Sent Events."""
+    llm_gate.check()
+    conv_id, user_content, messages, fold_before = await _load_conversation(session, user_id, body)
+    return StreamingResponse(
+        _chat_event_stream(user_id, conv_id, user_content, messages),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(fold_summary, conv_id, fold_before) if fold_before is not None else None,
+    )
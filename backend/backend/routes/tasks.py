@@ -1,19 +1,29 @@
 # Phase II — Task CRUD + complete API
 # [From]: specs/features/task-crud.md, GET/POST /api/{user_id}/tasks, etc.
 
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 import json
-from typing import Annotated
+import zlib
+from typing import Annotated, AsyncIterator
 
-from fastapi import APIRouter, Body, Depends, HTTPException, Path, Query, status
+from fastapi import APIRouter, Body, Depends, Header, HTTPException, Path, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
-from sqlmodel import Session, select, col
-
-from dapr.clients import DaprClient
+from sqlmodel import col, or_, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from backend.auth import get_current_user_id
-from backend.database import get_session
-from backend.models import Task
+from backend.database import async_engine, get_async_session
+from backend.events import record_task_event
+from backend.lexical import search_filter
+from backend.models import Task, TaskOccurrence, TaskTombstone, UserSyncState
+from backend.pagination import MAX_PAGE_SIZE, encode_cursor, keyset_statements, parse_fields
+from backend.rag import invalidate_task_embedding
+from backend.rate_limit import rate_limit
+from backend.recurrence import naive_utc, next_task, normalize_rule, occurrence_builder, occurrence_rows, parse_due_date
+from backend.sync import etag_matches, list_etag
+from backend.tags import parse_tags, set_task_tags, tag_counts, tag_filter
+from backend.task_batch import MAX_BATCH_OPERATIONS, BatchOperation, apply_task_batch
 
 router = APIRouter(prefix="/api", tags=["tasks"])
 
@@ -27,6 +37,11 @@ class CreateTaskBody(BaseModel):
     recurring_rule: str | None = None
 
 
+class BatchBody(BaseModel):
+    operations: list[BatchOperation] = Field(..., min_length=1)
+    atomic: bool = False  # All-or-nothing: any invalid item rejects the whole batch
+
+
 class UpdateTaskBody(BaseModel):
     title: str | None = None
     description: str | None = None
@@ -36,7 +51,7 @@ class UpdateTaskBody(BaseModel):
     recurring_rule: str | None = None
 
 
-def require_user_match(
+async def require_user_match(
     user_id: str = Path(..., alias="user_id"),
     current_id: Annotated[str, Depends(get_current_user_id)] = None,
 ) -> str:
@@ -48,16 +63,37 @@ def require_user_match(
     return user_id
 
 
-@router.get("/{user_id}/tasks")
-def list_tasks(
+@router.get("/{user_id}/tasks", dependencies=[Depends(rate_limit("tasks_read"))])
+async def list_tasks(
     user_id: Annotated[str, Depends(require_user_match)],
-    session: Annotated[Session, Depends(get_session)],
+    session: Annotated[AsyncSession, Depends(get_async_session)],
     status: str | None = Query(None),
     priority: str | None = Query(None),
-    tag: str | None = Query(None),
+    tag: str | None = Query(None),  # One tag or comma-separated list
+    tag_mode: str = Query("any", pattern="^(any|all)$"),
     search: str | None = Query(None),
+    limit: int | None = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = Query(None),
+    sort: str = Query("id", pattern="^(id|created_at|updated_at|due_date)$"),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    fields: str | None = Query(None),  # Comma-separated projection, e.g. "id,title,completed"
+    if_none_match: str | None = Header(None),
+    request: Request = None,
+    response: Response = None,
 ):
-    stmt = select(Task).where(Task.user_id == user_id)
+    # Unchanged since the client's copy: 304 from the user's version row alone
+    version = await _user_version(session, user_id)
+    etag = list_etag(version, request.url.query)
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag, "X-Task-Version": str(version)})
+    response.headers["ETag"] = etag
+    response.headers["X-Task-Version"] = str(version)
+
+    returned, selected = parse_fields(fields, sort)
+    if selected:
+        stmt = select(*[getattr(Task, f) for f in selected]).where(Task.user_id == user_id)
+    else:
+        stmt = select(Task).where(Task.user_id == user_id)
     
     if status == "pending":
         stmt = stmt.where(Task.completed == False)
@@ -67,23 +103,197 @@ def list_tasks(
     if priority:
         stmt = stmt.where(Task.priority == priority)
         
-    if tag:
-        stmt = stmt.where(col(Task.tags).contains(tag))
+    tags = parse_tags(tag)
+    if tags:
+        stmt = stmt.where(tag_filter(user_id, tags, tag_mode))
         
     if search:
-        stmt = stmt.where(
-            col(Task.title).contains(search) | col(Task.description).contains(search)
-        )
+        stmt = stmt.where(await session.run_sync(search_filter, user_id, search))
         
-    stmt = stmt.order_by(Task.id)
-    tasks = list(session.exec(stmt).all())
+    # Keyset pagination on (sort key, id); without `limit` the full list is returned
+    tasks = []
+    for part in keyset_statements(stmt, sort, order, cursor):
+        if limit:
+            part = part.limit(limit + 1 - len(tasks))
+        tasks.extend((await session.exec(part)).all())
+        if limit and len(tasks) > limit:
+            break
+    if limit and len(tasks) > limit:
+        tasks = tasks[:limit]
+        last = tasks[-1]
+        response.headers["X-Next-Cursor"] = encode_cursor(sort, order, getattr(last, sort), last.id)
+
+    if returned:
+        return [{f: getattr(row, f) for f in returned} for row in tasks]
     return tasks
 
 
-@router.post("/{user_id}/tasks")
-def create_task(
+async def _user_version(session: AsyncSession, user_id: str) -> int:
+    state = await session.get(UserSyncState, user_id)
+    return state.version if state else 0
+
+
+@router.get("/{user_id}/tasks/changes", dependencies=[Depends(rate_limit("tasks_read"))])
+async def task_changes(
+    user_id: Annotated[str, Depends(require_user_match)],
+    session: Annotated[AsyncSession, Depends(get_async_session)],
+    since: int = Query(0, ge=0),  # A version from X-Task-Version or an earlier delta; 0 = everything
+    response: Response = None,
+):
+    """Tasks created/updated and ids deleted after version `since`, plus the version to ask from next."""
+    version = await _user_version(session, user_id)
+    response.headers["X-Task-Version"] = str(version)
+    if since > version:
+        raise HTTPException(status_code=410, detail="Version is ahead of the server; re-fetch the task list")
+    if since == version:
+        return {"version": version, "changed": [], "deleted": []}
+
+    stmt = select(Task).where(Task.user_id == user_id)
+    if since:
+        stmt = stmt.where(Task.sync_version > since)
+    changed = list((await session.exec(stmt.order_by(Task.id))).all())
+    deleted = []
+    if since:
+        alive = {task.id for task in changed}  # A reused id deleted earlier is live again
+        deleted = [
+            task_id
+            for task_id in (await session.exec(
+                select(TaskTombstone.task_id)
+                .where(TaskTombstone.user_id == user_id, TaskTombstone.version > since)
+                .order_by(TaskTombstone.task_id)
+            )).all()
+            if task_id not in alive
+        ]
+    # Changes committed after `version` was read may be included; asking again from
+    # `version` returns them again, which is harmless
+    return {"version": version, "changed": changed, "deleted": deleted}
+
+
+MAX_DUE_WINDOW_DAYS = 92
+
+
+@router.get("/{user_id}/tasks/due", dependencies=[Depends(rate_limit("tasks_read"))])
+async def due_tasks(
     user_id: Annotated[str, Depends(require_user_match)],
-    session: Annotated[Session, Depends(get_session)],
+    session: Annotated[AsyncSession, Depends(get_async_session)],
+    start: datetime | None = Query(None),  # Default: this week, Monday 00:00 UTC
+    end: datetime | None = Query(None),    # Exclusive; default start + 7 days
+):
+    """Pending tasks due in [start, end), recurring ones at every occurrence.
+
+    Read-only: served from task_occurrences when they reach `end`; otherwise expanded
+    from the user's tasks, with a background build queued so later windows hit the table.
+    """
+    if start is None:
+        today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+        start = today - timedelta(days=today.weekday())
+    start = naive_utc(start)
+    end = start + timedelta(days=7) if end is None else naive_utc(end)
+    if not timedelta(0) < end - start <= timedelta(days=MAX_DUE_WINDOW_DAYS):
+        raise HTTPException(status_code=400, detail=f"end must be after start, at most {MAX_DUE_WINDOW_DAYS} days")
+
+    state = await session.get(UserSyncState, user_id)
+    through = state.occurrences_through if state else None
+    if through is not None and end <= through:
+        rows = (await session.exec(
+            select(Task, TaskOccurrence.occurs_at)
+            .join(TaskOccurrence, TaskOccurrence.task_id == Task.id)
+            .where(TaskOccurrence.user_id == user_id, TaskOccurrence.occurs_at >= start, TaskOccurrence.occurs_at < end)
+            .order_by(TaskOccurrence.occurs_at, Task.id)
+        )).all()
+    else:
+        occurrence_builder.request(user_id, end)
+        # Only tasks that can occur in the window: due in it, or recurring and due before its end
+        tasks = (await session.exec(
+            select(Task).where(
+                Task.user_id == user_id,
+                Task.completed == False,
+                Task.due_date < end,
+                or_(col(Task.recurring_rule).is_not(None), Task.due_date >= start),
+            )
+        )).all()
+        by_id = {task.id: task for task in tasks}
+        rows = sorted(
+            (
+                (by_id[row["task_id"]], row["occurs_at"])
+                for row in occurrence_rows(user_id, list(tasks), end)
+                if start <= row["occurs_at"] < end
+            ),
+            key=lambda row: (row[1], row[0].id),
+        )
+    return [
+        {**task.model_dump(), "occurs_at": occurs_at, "projected": occurs_at != task.due_date}
+        for task, occurs_at in rows
+    ]
+
+
+EXPORT_BATCH_SIZE = 1000
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Not JSON serializable: {type(value).__name__}")
+
+
+async def _export_ndjson(user_id: str, compress: bool) -> AsyncIterator[bytes]:
+    """One JSON object per task, written a batch at a time.
+
+    Reads through a server-side cursor (`yield_per`) as plain rows (no ORM identity map),
+    so memory stays flat however many tasks the user has. Opens its own connection: the
+    response body is produced after the request's dependencies have finished.
+    """
+    columns = list(Task.__table__.columns)
+    stmt = (
+        select(*columns)
+        .where(Task.user_id == user_id)
+        .order_by(Task.id)
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+    gzip = zlib.compressobj(wbits=31) if compress else None  # wbits=31: gzip container
+    async with async_engine.connect() as conn:
+        result = await conn.stream(stmt)
+        async for batch in result.partitions():
+            chunk = "".join(
+                json.dumps(dict(row._mapping), default=_json_default, separators=(",", ":")) + "\n"
+                for row in batch
+            ).encode("utf-8")
+            chunk = gzip.compress(chunk) if gzip else chunk
+            if chunk:
+                yield chunk
+    if gzip:
+        yield gzip.flush()
+
+
+@router.get("/{user_id}/tasks/export", dependencies=[Depends(rate_limit("tasks_read"))])
+async def export_tasks(
+    user_id: Annotated[str, Depends(require_user_match)],
+    gzip: bool = Query(False),
+):
+    """Stream every task as NDJSON (optionally gzip-encoded) for backups and analytics."""
+    filename = "tasks.ndjson"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(
+        _export_ndjson(user_id, gzip),
+        media_type="application/x-ndjson",
+        headers=headers,
+    )
+
+
+@router.get("/{user_id}/tags", dependencies=[Depends(rate_limit("tasks_read"))])
+async def list_tags(
+    user_id: Annotated[str, Depends(require_user_match)],
+    session: Annotated[AsyncSession, Depends(get_async_session)],
+):
+    return await session.run_sync(tag_counts, user_id)
+
+
+@router.post("/{user_id}/tasks", dependencies=[Depends(rate_limit("tasks_write"))])
+async def create_task(
+    user_id: Annotated[str, Depends(require_user_match)],
+    session: Annotated[AsyncSession, Depends(get_async_session)],
     body: CreateTaskBody,
 ):
     title = (body.title or "").strip()
@@ -99,10 +309,15 @@ def create_task(
     dt_due = None
     if body.due_date:
         try:
-            dt_due = datetime.fromisoformat(body.due_date.replace("Z", "+00:00"))
+            dt_due = parse_due_date(body.due_date)
         except ValueError:
              raise HTTPException(status_code=400, detail="Invalid due_date format. Use ISO 8601.")
 
+    try:
+        recurring_rule = normalize_rule(body.recurring_rule)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
     task = Task(
         user_id=user_id, 
         title=title, 
@@ -110,47 +325,60 @@ def create_task(
         priority=body.priority,
         tags=body.tags,
         due_date=dt_due,
-        recurring_rule=body.recurring_rule
+        recurring_rule=recurring_rule
     )
     session.add(task)
-    session.commit()
-    session.refresh(task)
+    await session.flush()  # Assign task.id for tag rows
+    await session.run_sync(set_task_tags, task.id, user_id, task.tags)
+    # Phase V: task-events outbox row, same transaction
+    await session.run_sync(record_task_event, "created", task)
+    await session.commit()
+    return task
 
-    # Phase V: Publish Event
-    try:
-        with DaprClient() as d:
-            d.publish_event(
-                pubsub_name="kafka-pubsub",
-                topic_name="task-events",
-                data=json.dumps({"event": "created", "task_id": task.id, "title": task.title}),
-                data_content_type="application/json",
-            )
-    except Exception as e:
-        print(f"Warning: Failed to publish event: {e}")
 
-    return task
+@router.post("/{user_id}/tasks:batch", dependencies=[Depends(rate_limit("tasks_write"))])
+async def batch_tasks(
+    user_id: Annotated[str, Depends(require_user_match)],
+    session: Annotated[AsyncSession, Depends(get_async_session)],
+    body: BatchBody,
+):
+    """Mixed create/update/complete/delete in one transaction, with a result per item."""
+    if len(body.operations) > MAX_BATCH_OPERATIONS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {MAX_BATCH_OPERATIONS} operations per batch",
+        )
+    results = await session.run_sync(apply_task_batch, user_id, body.operations, body.atomic)
+    summary = {}
+    for r in results:
+        summary[r["status"]] = summary.get(r["status"], 0) + 1
+    if body.atomic and summary.get("error"):
+        await session.rollback()
+        raise HTTPException(status_code=400, detail={"summary": summary, "results": results})
+    await session.commit()
+    return {"summary": summary, "results": results}
 
 
-@router.get("/{user_id}/tasks/{task_id:int}")
-def get_task(
+@router.get("/{user_id}/tasks/{task_id:int}", dependencies=[Depends(rate_limit("tasks_read"))])
+async def get_task(
     user_id: Annotated[str, Depends(require_user_match)],
     task_id: int,
-    session: Annotated[Session, Depends(get_session)],
+    session: Annotated[AsyncSession, Depends(get_async_session)],
 ):
-    task = session.get(Task, task_id)
+    task = await session.get(Task, task_id)
     if not task or task.user_id != user_id:
         raise HTTPException(status_code=404, detail="Task not found")
     return task
 
 
-@router.put("/{user_id}/tasks/{task_id:int}")
-def update_task(
+@router.put("/{user_id}/tasks/{task_id:int}", dependencies=[Depends(rate_limit("tasks_write"))])
+async def update_task(
     user_id: Annotated[str, Depends(require_user_match)],
     task_id: int,
-    session: Annotated[Session, Depends(get_session)],
+    session: Annotated[AsyncSession, Depends(get_async_session)],
     body: UpdateTaskBody,
 ):
-    task = session.get(Task, task_id)
+    task = await session.get(Task, task_id)
     if not task or task.user_id != user_id:
         raise HTTPException(status_code=404, detail="Task not found")
         
@@ -171,44 +399,54 @@ def update_task(
             
     if body.tags is not None:
         task.tags = body.tags
+        await session.run_sync(set_task_tags, task.id, user_id, task.tags)
         
     if body.due_date is not None:
         try:
-            task.due_date = datetime.fromisoformat(body.due_date.replace("Z", "+00:00"))
+            task.due_date = parse_due_date(body.due_date)
         except ValueError:
             raise HTTPException(status_code=400, detail="Invalid due_date format.")
+        task.recurrence_start = None  # New due date starts a new series
             
     if body.recurring_rule is not None:
-         task.recurring_rule = body.recurring_rule if body.recurring_rule else None
+        try:
+            task.recurring_rule = normalize_rule(body.recurring_rule)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        task.recurrence_start = None
 
     task.updated_at = datetime.utcnow()
     session.add(task)
-    session.commit()
-    session.refresh(task)
+    await session.run_sync(invalidate_task_embedding, task.id)
+    await session.run_sync(record_task_event, "updated", task)
+    await session.commit()
     return task
 
 
-@router.delete("/{user_id}/tasks/{task_id:int}")
-def delete_task(
+@router.delete("/{user_id}/tasks/{task_id:int}", dependencies=[Depends(rate_limit("tasks_write"))])
+async def delete_task(
     user_id: Annotated[str, Depends(require_user_match)],
     task_id: int,
-    session: Annotated[Session, Depends(get_session)],
+    session: Annotated[AsyncSession, Depends(get_async_session)],
 ):
-    task = session.get(Task, task_id)
+    task = await session.get(Task, task_id)
     if not task or task.user_id != user_id:
         raise HTTPException(status_code=404, detail="Task not found")
-    session.delete(task)
-    session.commit()
+    await session.run_sync(invalidate_task_embedding, task.id)
+    await session.run_sync(set_task_tags, task.id, user_id, None)
+    await session.run_sync(record_task_event, "deleted", task)
+    await session.delete(task)
+    await session.commit()
     return {"ok": True, "id": task_id}
 
 
-@router.patch("/{user_id}/tasks/{task_id:int}/complete")
-def toggle_complete(
+@router.patch("/{user_id}/tasks/{task_id:int}/complete", dependencies=[Depends(rate_limit("tasks_write"))])
+async def toggle_complete(
     user_id: Annotated[str, Depends(require_user_match)],
     task_id: int,
-    session: Annotated[Session, Depends(get_session)],
+    session: Annotated[AsyncSession, Depends(get_async_session)],
 ):
-    task = session.get(Task, task_id)
+    task = await session.get(Task, task_id)
     if not task or task.user_id != user_id:
         raise HTTPException(status_code=404, detail="Task not found")
     
@@ -217,8 +455,8 @@ def toggle_complete(
          task.completed = False
          task.updated_at = datetime.utcnow()
          session.add(task)
-         session.commit()
-         session.refresh(task)
+         await session.run_sync(record_task_event, "updated", task)
+         await session.commit()
          return task
          
     # Mark complete
@@ -226,42 +464,13 @@ def toggle_complete(
     task.updated_at = datetime.utcnow()
     session.add(task)
     
-    # Recurring Logic matched from agent_tools
-    if task.recurring_rule and task.due_date:
-        next_due = None
-        if task.recurring_rule == "daily":
-            next_due = task.due_date + timedelta(days=1)
-        elif task.recurring_rule == "weekly":
-            next_due = task.due_date + timedelta(weeks=1)
-        elif task.recurring_rule == "monthly":
-            next_due = task.due_date + timedelta(days=30) 
-        
-        if next_due:
-            new_task = Task(
-                user_id=user_id,
-                title=task.title,
-                description=task.description,
-                priority=task.priority,
-                tags=task.tags,
-                recurring_rule=task.recurring_rule,
-                due_date=next_due,
-                completed=False
-            )
-            session.add(new_task)
-    
-    session.commit()
-    session.refresh(task)
-
-    if task.completed:
-        try:
-            with DaprClient() as d:
-                d.publish_event(
-                    pubsub_name="kafka-pubsub",
-                    topic_name="task-events",
-                    data=json.dumps({"event": "completed", "task_id": task.id, "title": task.title}),
-                    data_content_type="application/json",
-                )
-        except Exception as e:
-             print(f"Warning: Failed to publish event: {e}")
+    new_task = next_task(task)
+    if new_task is not None:
+        session.add(new_task)
+        await session.flush()
+        await session.run_sync(set_task_tags, new_task.id, user_id, new_task.tags)
+        await session.run_sync(record_task_event, "created", new_task)
 
+    await session.run_sync(record_task_event, "completed", task)
+    await session.commit()
     return task
@@ -0,0 +1,93 @@
+# RAG — vectorized top-k similarity over per-user task vectors
+# [From]: specs/features/rag-chatbot.md (Vector Store)
+
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+MATRIX_CACHE_USERS = int(os.environ.get("RAG_MATRIX_CACHE_USERS", "256"))
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalize each row; all-zero rows stay zero (score 0 against anything)."""
+    matrix = np.ascontiguousarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return np.ascontiguousarray(matrix / norms, dtype=np.float32)
+
+
+class TaskVectorMatrix:
+    """One user's task vectors as a single pre-normalized, contiguous float32 matrix.
+
+    Scoring a query is one matrix-vector product; the top k rows are picked with
+    `argpartition` (O(n)) and only those k are sorted.
+    """
+
+    def __init__(self, task_ids: list[int], vectors: np.ndarray):
+        self.task_ids = np.asarray(task_ids, dtype=np.int64)
+        self.matrix = normalize_rows(vectors) if len(task_ids) else np.zeros((0, 0), dtype=np.float32)
+
+    @classmethod
+    def from_packed(cls, task_ids: list[int], packed: list[bytes]) -> "TaskVectorMatrix":
+        """Build from float32 blobs as stored in `task_embeddings.embedding`."""
+        if not task_ids:
+            return cls([], np.zeros((0, 0), dtype=np.float32))
+        flat = np.frombuffer(b"".join(packed), dtype=np.float32)
+        return cls(task_ids, flat.reshape(len(task_ids), -1))
+
+    def __len__(self) -> int:
+        return len(self.task_ids)
+
+    def top_k(self, query: list[float] | np.ndarray, k: int) -> list[tuple[int, float]]:
+        """Return up to k (task_id, cosine score) pairs, best first."""
+        n = len(self.task_ids)
+        if n == 0 or k <= 0:
+            return []
+        q = np.asarray(query, dtype=np.float32)
+        q_norm = float(np.linalg.norm(q))
+        if q_norm == 0:
+            return []
+        scores = self.matrix @ (q / q_norm)
+        if k < n:
+            top = np.argpartition(scores, n - k)[n - k:]
+        else:
+            top = np.arange(n)
+        top = top[np.argsort(scores[top])[::-1]]
+        return list(zip(self.task_ids[top].tolist(), scores[top].tolist()))
+
+
+class MatrixCache:
+    """Bounded LRU of per-user matrices, validated by a signature of (task_id, content_hash).
+
+    The signature is recomputed from the DB on every search, so an entry built by a
+    worker that missed an edit is simply rebuilt rather than served stale.
+    """
+
+    def __init__(self, max_users: int = MATRIX_CACHE_USERS):
+        self.max_users = max_users
+        self._entries: OrderedDict[str, tuple[str, TaskVectorMatrix]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: str, signature: str) -> TaskVectorMatrix | None:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] != signature:
+                return None
+            self._entries.move_to_end(user_id)
+            return entry[1]
+
+    def put(self, user_id: str, signature: str, matrix: TaskVectorMatrix) -> None:
+        with self._lock:
+            self._entries[user_id] = (signature, matrix)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+
+    def discard(self, user_id: str) -> None:
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+
+matrix_cache = MatrixCache()
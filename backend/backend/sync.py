@@ -0,0 +1,91 @@
+# Phase II — per-user change versions: list ETags and delta sync with delete tombstones
+# [From]: specs/api/rest-endpoints.md (GET /api/{user_id}/tasks, GET /api/{user_id}/tasks/changes)
+
+import zlib
+from datetime import datetime
+
+from sqlalchemy import event as sa_event
+from sqlalchemy.orm import Session as OrmSession
+from sqlmodel import Session
+
+from backend.database import upsert
+from backend.models import TaskTombstone, UserSyncState
+from backend.recurrence import needs_build, occurrence_builder, refresh_occurrences
+
+
+def note_task_changes(session: Session, changes: list[tuple[str, object]]) -> None:
+    """Remember [(event, task)] for the commit; called by events.record_task_events."""
+    session.info.setdefault("task_changes", []).extend(changes)
+
+
+def bump_user_version(session: Session, user_id: str) -> tuple[int, datetime | None]:
+    """+1 on the user's change version (row created at 1). Locks the row until commit.
+
+    -> (new version, how far the user's task occurrences are kept).
+    """
+    stmt = upsert(
+        session, UserSyncState, {"user_id": user_id, "version": 1}, "user_id",
+        {"version": UserSyncState.version + 1},
+    ).returning(UserSyncState.version, UserSyncState.occurrences_through)
+    return tuple(session.execute(stmt).one())
+
+
+@sa_event.listens_for(OrmSession, "before_commit")
+def _stamp_changes(session) -> None:
+    """One version bump per user per transaction, taken last so writers queue on it only briefly.
+
+    Changed tasks get the new version in sync_version (flushed with the commit) and
+    deleted ones a tombstone; if the user has task occurrences built, those tasks' rows
+    are replaced, and a background rebuild is queued when they are missing or run out
+    soon. Because the bump holds the user's row lock until commit, versions
+    become visible in order: a client that has seen version N never later finds a
+    change stamped N or lower.
+    """
+    changes = session.info.pop("task_changes", None)
+    if not changes:
+        return
+    by_user: dict[str, list[tuple[str, object]]] = {}
+    for event, task in changes:
+        by_user.setdefault(task.user_id, []).append((event, task))
+    now = datetime.utcnow()
+    for user_id, user_changes in by_user.items():
+        version, occurrences_through = bump_user_version(session, user_id)
+        deleted = set()
+        changed = {}
+        for event, task in user_changes:
+            if event == "deleted":
+                deleted.add(task.id)
+            else:
+                task.sync_version = version
+                changed[task.id] = task
+        for task_id in sorted(deleted):
+            changed.pop(task_id, None)
+            # Keyed by task id: SQLite may reuse the id of a deleted newest row
+            session.execute(upsert(
+                session, TaskTombstone,
+                {"task_id": task_id, "user_id": user_id, "version": version, "deleted_at": now}, "task_id",
+                {"user_id": user_id, "version": version, "deleted_at": now},
+            ))
+        if occurrences_through is not None:
+            refresh_occurrences(session, user_id, list(changed.values()), deleted, occurrences_through)
+        if needs_build(occurrences_through, now):
+            occurrence_builder.request(user_id, now)
+
+
+@sa_event.listens_for(OrmSession, "after_rollback")
+def _forget_changes(session) -> None:
+    session.info.pop("task_changes", None)
+
+
+def list_etag(version: int, query: str) -> str:
+    """Weak ETag for a task list: the user's version plus the query string (filters, page, fields)."""
+    return f'W/"{version}-{zlib.crc32(query.encode("utf-8")):08x}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    weak = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == weak for tag in if_none_match.split(","))
@@ -0,0 +1,94 @@
+# Tags — normalized task_tags rows behind the comma-separated Task.tags field
+# [From]: specs/database/schema.md (task_tags)
+
+from sqlalchemy import delete, func, insert
+from sqlmodel import Session, col, select
+
+from backend.models import Task, TaskTag
+
+MAX_TAG_LENGTH = 100
+
+
+def parse_tags(tags: str | None) -> list[str]:
+    """"Work, urgent,,work" -> ["work", "urgent"] (trimmed, lowercased, de-duplicated)."""
+    if not tags:
+        return []
+    seen: dict[str, None] = {}
+    for tag in tags.split(","):
+        tag = tag.strip().lower()[:MAX_TAG_LENGTH]
+        if tag:
+            seen.setdefault(tag, None)
+    return list(seen)
+
+
+def set_task_tags(session: Session, task_id: int, user_id: str, tags: str | None) -> None:
+    """Replace a task's tag rows. Call before commit; new tasks need an id (flush first).
+
+    Deletes must call this with tags=None before removing the task row (foreign key).
+    """
+    session.exec(delete(TaskTag).where(TaskTag.task_id == task_id))
+    rows = [{"task_id": task_id, "tag": tag, "user_id": user_id} for tag in parse_tags(tags)]
+    if rows:
+        session.exec(insert(TaskTag), params=rows)
+
+
+def set_many_task_tags(session: Session, user_id: str, tags_by_task: dict[int, str | None]) -> None:
+    """`set_task_tags` for many tasks: one DELETE and one multi-row INSERT."""
+    if not tags_by_task:
+        return
+    session.exec(delete(TaskTag).where(col(TaskTag.task_id).in_(list(tags_by_task))))
+    rows = [
+        {"task_id": task_id, "tag": tag, "user_id": user_id}
+        for task_id, tags in tags_by_task.items()
+        for tag in parse_tags(tags)
+    ]
+    if rows:
+        session.exec(insert(TaskTag), params=rows)
+
+
+def tag_filter(user_id: str, tags: list[str], mode: str = "any"):
+    """WHERE clause on Task for tasks having any (or all) of `tags`, via ix_task_tags_user_tag."""
+    matching = select(TaskTag.task_id).where(TaskTag.user_id == user_id, col(TaskTag.tag).in_(tags))
+    if mode == "all" and len(tags) > 1:
+        matching = matching.group_by(TaskTag.task_id).having(func.count(TaskTag.tag) == len(tags))
+    return col(Task.id).in_(matching)
+
+
+def tag_counts(session: Session, user_id: str) -> list[dict]:
+    """Tasks per tag for one user, most used first."""
+    rows = session.exec(
+        select(TaskTag.tag, func.count(TaskTag.task_id))
+        .where(TaskTag.user_id == user_id)
+        .group_by(TaskTag.tag)
+        .order_by(func.count(TaskTag.task_id).desc(), TaskTag.tag)
+    ).all()
+    return [{"tag": tag, "count": count} for tag, count in rows]
+
+
+def backfill_task_tags(session: Session, batch_size: int = 1000) -> int:
+    """Migration: create task_tags rows for existing tasks that have tags but no rows yet.
+
+    Idempotent; safe to run on every startup. Returns the number of tasks migrated.
+    """
+    migrated = 0
+    last_id = 0
+    while True:
+        batch = session.exec(
+            select(Task.id, Task.user_id, Task.tags)
+            .where(col(Task.tags).is_not(None), Task.tags != "", col(Task.id) > last_id)
+            .where(~col(Task.id).in_(select(TaskTag.task_id)))
+            .order_by(Task.id)
+            .limit(batch_size)
+        ).all()
+        if not batch:
+            return migrated
+        rows = [
+            {"task_id": task_id, "tag": tag, "user_id": user_id}
+            for task_id, user_id, tags in batch
+            for tag in parse_tags(tags)
+        ]
+        if rows:
+            session.exec(insert(TaskTag), params=rows)
+        session.commit()
+        migrated += len(batch)
+        last_id = batch[-1][0]
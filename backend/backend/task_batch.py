@@ -0,0 +1,197 @@
+# Phase II — batched task mutations: mixed operations, one transaction, bulk statements
+# [From]: specs/api/rest-endpoints.md (POST /api/{user_id}/tasks:batch)
+
+import os
+from datetime import datetime
+from typing import Literal
+
+from pydantic import BaseModel
+from sqlmodel import Session, col, select
+
+from backend.events import record_task_events
+from backend.models import Task
+from backend.rag import invalidate_task_embeddings
+from backend.recurrence import next_task, normalize_rule, parse_due_date
+from backend.tags import set_many_task_tags
+
+MAX_BATCH_OPERATIONS = int(os.environ.get("MAX_BATCH_OPERATIONS", "5000"))
+
+PRIORITIES = ("low", "medium", "high")
+
+
+class BatchOperation(BaseModel):
+    op: Literal["create", "update", "complete", "delete"]
+    task_id: int | None = None  # Required for update / complete / delete
+    title: str | None = None
+    description: str | None = None
+    priority: str | None = None
+    tags: str | None = None
+    due_date: str | None = None
+    recurring_rule: str | None = None
+
+
+def _parse_due(value: str) -> datetime:
+    try:
+        return parse_due_date(value)
+    except ValueError:
+        raise ValueError("Invalid due_date format. Use ISO 8601.")
+
+
+def _create_fields(op: BatchOperation) -> dict:
+    title = (op.title or "").strip()
+    description = (op.description or "").strip()
+    if len(title) < 1 or len(title) > 200:
+        raise ValueError("Title must be 1–200 characters")
+    if len(description) > 1000:
+        raise ValueError("Description max 1000 characters")
+    return {
+        "title": title,
+        "description": description,
+        "priority": op.priority if op.priority in PRIORITIES else "medium",
+        "tags": op.tags,
+        "due_date": _parse_due(op.due_date) if op.due_date else None,
+        "recurring_rule": normalize_rule(op.recurring_rule),
+        "event_seq": 1,  # Its "created" event
+    }
+
+
+def _update_fields(op: BatchOperation) -> dict:
+    """Validated changes; nothing is applied when any field is invalid."""
+    changes = {}
+    if op.title is not None:
+        title = op.title.strip()
+        if len(title) < 1 or len(title) > 200:
+            raise ValueError("Title must be 1–200 characters")
+        changes["title"] = title
+    if op.description is not None:
+        if len(op.description) > 1000:
+            raise ValueError("Description max 1000 characters")
+        changes["description"] = op.description.strip()
+    if op.priority is not None and op.priority in PRIORITIES:
+        changes["priority"] = op.priority
+    if op.tags is not None:
+        changes["tags"] = op.tags
+    if op.due_date is not None:
+        changes["due_date"] = _parse_due(op.due_date)
+    if op.recurring_rule is not None:
+        changes["recurring_rule"] = normalize_rule(op.recurring_rule)
+    if "due_date" in changes or "recurring_rule" in changes:
+        changes["recurrence_start"] = None  # A new series
+    return changes
+
+
+def apply_task_batch(
+    session: Session, user_id: str, operations: list[BatchOperation], atomic: bool = False
+) -> list[dict]:
+    """Apply mixed operations in the session's transaction. -> per-item results.
+
+    Referenced tasks are read with one SELECT; creates become one multi-row INSERT,
+    updates and deletes are flushed as executemany batches, and tag / embedding rows are
+    replaced with one statement each. An invalid item gets an "error" result and the
+    rest still apply, unless `atomic`, in which case nothing is written and valid items
+    are reported as "skipped". Operations on the same task apply in order; a recurring
+    task completed and then deleted in the same batch spawns no follow-up.
+
+    Each operation also gets its task-events outbox row, in request order (so a task's
+    event seq follows its operations); the caller commits.
+    """
+    results: list[dict] = []
+    wanted = sorted({op.task_id for op in operations if op.op != "create" and op.task_id is not None})
+    tasks = {}
+    if wanted:
+        tasks = {
+            t.id: t
+            for t in session.exec(select(Task).where(Task.user_id == user_id, col(Task.id).in_(wanted)))
+        }
+
+    now = datetime.utcnow()
+    created: list[tuple[dict, Task]] = []     # (result, new task) — includes recurring follow-ups
+    events: list[tuple[str, Task]] = []       # (event, task) in operation order
+    retag: dict[int, str | None] = {}
+    touched: set[int] = set()
+    deleted: set[int] = set()
+
+    for index, op in enumerate(operations):
+        result = {"index": index, "op": op.op}
+        results.append(result)
+        try:
+            if op.op == "create":
+                task = Task(user_id=user_id, **_create_fields(op))
+                created.append((result, task))
+                events.append(("created", task))
+                result.update(status="created", title=task.title)
+                continue
+
+            task = tasks.get(op.task_id) if op.task_id not in deleted else None
+            if task is None:
+                raise ValueError("Task not found")
+            result.update(task_id=task.id)
+
+            if op.op == "update":
+                changes = _update_fields(op)
+                for field, value in changes.items():
+                    setattr(task, field, value)
+                task.updated_at = now
+                if "tags" in changes:
+                    retag[task.id] = task.tags
+                touched.add(task.id)
+                events.append(("updated", task))
+                result.update(status="updated", title=task.title)
+            elif op.op == "complete":
+                if task.completed:
+                    result.update(status="already_completed", title=task.title)
+                    continue
+                task.completed = True
+                task.updated_at = now
+                events.append(("completed", task))
+                result.update(status="completed", title=task.title)
+                follow_up = next_task(task)
+                if follow_up is not None:
+                    created.append((result, follow_up))
+                    events.append(("created", follow_up))
+            else:
+                deleted.add(task.id)
+                events.append(("deleted", task))
+                result.update(status="deleted", title=task.title)
+        except ValueError as e:
+            result.update(status="error", error=str(e))
+
+    if atomic and any(r["status"] == "error" for r in results):
+        for r in results:
+            if r["status"] != "error":
+                r["status"] = "skipped"
+        for task in tasks.values():
+            session.expire(task)  # Drop the in-memory edits so a later commit writes nothing
+        return results
+
+    gone = sorted(deleted)
+    if deleted:
+        # No follow-up for a task deleted later in the batch
+        dropped = {id(t) for r, t in created if r["op"] != "create" and r["task_id"] in deleted}
+        created = [(r, t) for r, t in created if id(t) not in dropped]
+        events = [(event, t) for event, t in events if id(t) not in dropped]
+        # Dependent rows first (foreign keys); the tasks go after their events are recorded
+        invalidate_task_embeddings(session, gone)
+        set_many_task_tags(session, user_id, {tid: None for tid in gone})
+        for tid in gone:
+            retag.pop(tid, None)
+        touched -= deleted
+
+    invalidate_task_embeddings(session, sorted(touched))
+    session.add_all([task for _, task in created])
+    session.flush()  # Multi-row INSERT assigns ids; UPDATE batches go out here
+
+    for result, task in created:
+        if result["op"] == "create":
+            result["task_id"] = task.id
+        else:
+            result.update(next_task_id=task.id, next_due_date=task.due_date.isoformat())
+        if task.tags:
+            retag[task.id] = task.tags
+    set_many_task_tags(session, user_id, retag)
+    # One event per operation, in request order, so each task's seq follows its operations
+    record_task_events(session, events)
+    for tid in gone:
+        session.delete(tasks[tid])
+    session.flush()
+    return results
@@ -0,0 +1,90 @@
+# Phase III — per-request chat agent setup cost, before / after caching the model
+# Usage (from backend/): python scripts/bench_agent_setup.py [--requests 500 --history 20]
+#
+# No network: only the local work before the first model call is timed. "rebuilt" is the
+# old per-request path (genai.configure, tool closures around user_id, a new
+# GenerativeModel deriving every function schema); "cached" is backend.agent.start_chat
+# on the process-wide model.
+
+import argparse
+import functools
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("GEMINI_API_KEY", "bench-key")
+
+import google.generativeai as genai  # noqa: E402
+
+from backend import agent  # noqa: E402
+
+
+def _history(messages: list[dict]) -> list[dict]:
+    return [
+        {"role": "user" if m["role"] == "user" else "model", "parts": [m["content"]]}
+        for m in messages[:-1]
+    ]
+
+
+def rebuilt(user_id: str, messages: list[dict]):
+    genai.configure(api_key=os.environ["GEMINI_API_KEY"])
+
+    def closure(fn):
+        @functools.wraps(fn)
+        def tool(*args, **kwargs):
+            with agent.as_user(user_id):
+                return fn(*args, **kwargs)
+        return tool
+
+    model = genai.GenerativeModel(
+        model_name=agent.GEMINI_MODEL,
+        tools=[closure(fn) for fn in agent.TOOLS],
+        system_instruction=f"You are a helpful todo assistant. user_id: {user_id}. Use tools to manage tasks. Confirm actions nicely.",
+    )
+    return model.start_chat(history=_history(messages), enable_automatic_function_calling=False)
+
+
+def cached(user_id: str, messages: list[dict]):
+    with agent.as_user(user_id):
+        return agent.start_chat(messages)
+
+
+def bench(fn, requests: int, messages: list[dict]) -> dict:
+    fn("warm-up", messages)
+    samples = []
+    for i in range(requests):
+        start = time.perf_counter()
+        fn(f"user-{i}", messages)
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return {
+        "mean": statistics.fmean(samples) * 1e6,
+        "p50": samples[len(samples) // 2] * 1e6,
+        "p99": samples[min(len(samples) - 1, int(0.99 * len(samples)))] * 1e6,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-request agent setup overhead")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--history", type=int, default=20, help="Prior messages in the conversation")
+    args = parser.parse_args()
+
+    messages = [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": f"message {i}"}
+        for i in range(args.history)
+    ] + [{"role": "user", "content": "What is on my list?"}]
+
+    print(f"{len(agent.TOOLS)} tools, {args.history} history messages, {args.requests} requests")
+    print(f"{'path':>8} {'mean us':>10} {'p50 us':>10} {'p99 us':>10}")
+    results = {}
+    for name, fn in (("rebuilt", rebuilt), ("cached", cached)):
+        r = results[name] = bench(fn, args.requests, messages)
+        print(f"{name:>8} {r['mean']:>10.0f} {r['p50']:>10.0f} {r['p99']:>10.0f}")
+    print(f"speed-up: {results['rebuilt']['mean'] / results['cached']['mean']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
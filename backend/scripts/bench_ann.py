@@ -0,0 +1,55 @@
+# RAG — IVF index recall/latency tradeoff vs. the exact top-k scan
+# Usage (from backend/): python scripts/bench_ann.py [--tasks 100000 --nprobe 1,4,8,16,32]
+#
+# Vectors are drawn around random cluster centres (real task embeddings are clustered;
+# uniform noise would make any IVF index look worse than it is in practice).
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from backend.ann import IVFIndex, measure_recall  # noqa: E402
+from backend.similarity import TaskVectorMatrix  # noqa: E402
+
+
+def clustered(rng, n, dim, clusters, spread):
+    centres = rng.standard_normal((clusters, dim), dtype=np.float32)
+    labels = rng.integers(clusters, size=n)
+    return centres[labels] + spread * rng.standard_normal((n, dim), dtype=np.float32)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the IVF index")
+    parser.add_argument("--tasks", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--nprobe", default="1,4,8,16,32")
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--spread", type=float, default=1.5, help="noise around cluster centres")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    data = clustered(rng, args.tasks + args.queries, args.dim, clusters=max(10, args.tasks // 500), spread=args.spread)
+    vectors, queries = data[: args.tasks], data[args.tasks:]
+    ids = list(range(args.tasks))
+
+    exact = TaskVectorMatrix(ids, vectors)
+    start = time.perf_counter()
+    index = IVFIndex.train(ids, vectors, ["" for _ in ids])
+    print(f"{args.tasks} tasks, {len(index.centroids)} lists, trained in {time.perf_counter() - start:.1f} s")
+    print(f"{'nprobe':>6} {'recall@' + str(args.k):>10} {'ivf':>10} {'exact':>10} {'speedup':>8}")
+    for nprobe in (int(p) for p in args.nprobe.split(",")):
+        r = measure_recall(index, exact, queries, k=args.k, nprobe=nprobe)
+        print(
+            f"{nprobe:>6} {r['recall']:>10.3f} {r['ann_ms']:>7.2f} ms {r['exact_ms']:>7.2f} ms "
+            f"{r['exact_ms'] / r['ann_ms']:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
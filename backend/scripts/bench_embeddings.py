@@ -0,0 +1,78 @@
+# RAG — embedding throughput against a local fake provider (no network)
+# Usage (from backend/): python scripts/bench_embeddings.py [--texts 2000 --latency 0.05]
+#
+# The fake provider sleeps `latency` seconds per request (regardless of batch size, like a
+# remote API dominated by round-trip time) and throttles with a 429 every `--throttle-every`
+# calls, so both the batching gain and the retry path are exercised.
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from backend.embeddings import BatchEmbedder  # noqa: E402
+
+
+class RateLimited(Exception):
+    code = 429
+
+
+class FakeEmbeddingProvider:
+    def __init__(self, latency: float, max_batch_size: int = 100, dim: int = 768, throttle_every: int = 0):
+        self.latency = latency
+        self.max_batch_size = max_batch_size
+        self.dim = dim
+        self.throttle_every = throttle_every
+        self.calls = 0
+        self.throttled = 0
+        self._lock = threading.Lock()
+
+    def embed_batch(self, texts):
+        with self._lock:
+            self.calls += 1
+            throttle = self.throttle_every and self.calls % self.throttle_every == 0
+            if throttle:
+                self.throttled += 1
+        time.sleep(self.latency)
+        if throttle:
+            raise RateLimited("429 Too Many Requests")
+        return [[float(len(t) % 7)] * self.dim for t in texts]
+
+
+def run(label, texts, latency, throttle_every, **embedder_kwargs):
+    provider = FakeEmbeddingProvider(latency, throttle_every=throttle_every)
+    embedder = BatchEmbedder(provider, backoff_base=0.01, **embedder_kwargs)
+    start = time.perf_counter()
+    vectors = embedder.embed(texts)
+    elapsed = time.perf_counter() - start
+    assert len(vectors) == len(texts)
+    print(
+        f"{label:<28} {elapsed:>8.2f} s {len(texts) / elapsed:>10.0f} texts/s "
+        f"{provider.calls:>6} calls {provider.throttled:>4} throttled"
+    )
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark embedding batching")
+    parser.add_argument("--texts", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--throttle-every", type=int, default=7)
+    args = parser.parse_args()
+
+    texts = [f"task {i} description" for i in range(args.texts)]
+    # One request per text, one at a time: the previous get_batch_embeddings loop
+    baseline = run("sequential, 1 text/call", texts[: min(len(texts), 200)], args.latency, 0,
+                   batch_size=1, concurrency=1)
+    baseline *= len(texts) / min(len(texts), 200)
+    print(f"{'  (extrapolated to all texts)':<28} {baseline:>8.2f} s")
+    batched = run("batched x100, 1 at a time", texts, args.latency, args.throttle_every, concurrency=1)
+    concurrent = run("batched x100, 4 concurrent", texts, args.latency, args.throttle_every, concurrency=4)
+    print(f"speedup: batched {baseline / batched:.0f}x, batched+concurrent {baseline / concurrent:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+# Phase V — microbenchmark: per-task Python recurrence expansion vs. vectorized bulk_occurrences
+# Usage (from backend/): python scripts/bench_recurrence.py [--sizes 10000,100000,1000000] [--window-days 7]
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from backend.recurrence import bulk_occurrences, occurrences, parse_rule  # noqa: E402
+
+RULES = [
+    None, "daily", "weekly", "monthly", "yearly",
+    "FREQ=DAILY;INTERVAL=3",
+    "FREQ=WEEKLY;BYDAY=MO,WE,FR",
+    "FREQ=WEEKLY;INTERVAL=2;BYDAY=TU,TH",
+    "FREQ=MONTHLY;BYMONTHDAY=31",
+    "FREQ=MONTHLY;BYMONTHDAY=-1",
+]
+
+
+def make_series(n: int, now: datetime, seed: int):
+    rnd = random.Random(seed)
+    rules = [rnd.choice(RULES) for _ in range(n)]
+    starts = [now - timedelta(days=rnd.randint(0, 720), minutes=rnd.randint(0, 1439)) for _ in range(n)]
+    return rules, starts
+
+
+def bench_python(rules, starts, after, until):
+    start = time.perf_counter()
+    found = {}
+    for i, (text, dtstart) in enumerate(zip(rules, starts)):
+        if text:
+            hits = occurrences(parse_rule(text), dtstart, max(after, dtstart - timedelta(microseconds=1)), until)
+            if hits:
+                found[i] = hits
+    return time.perf_counter() - start, found
+
+
+def bench_bulk(rules, starts, after, until):
+    start_arr = np.array(starts, "M8[us]")
+    after_arr = np.maximum(np.datetime64(after, "us"), start_arr - np.timedelta64(1, "us"))
+    start = time.perf_counter()
+    idx, at = bulk_occurrences(rules, start_arr, after_arr, until)
+    return time.perf_counter() - start, idx, at
+
+
+def bench_table(idx, at, after, until, per_user, repeat):
+    """One user's window over materialized rows, as GET /tasks/due reads task_occurrences."""
+    db = sqlite3.connect(":memory:")
+    db.execute("CREATE TABLE task_occurrences (task_id INTEGER, user_id INTEGER, occurs_at TEXT, PRIMARY KEY (task_id, occurs_at))")
+    db.execute("CREATE INDEX ix_user_at ON task_occurrences (user_id, occurs_at)")
+    db.executemany(
+        "INSERT INTO task_occurrences VALUES (?, ?, ?)",
+        zip(idx.tolist(), (idx // per_user).tolist(), np.datetime_as_string(at, unit="us").tolist()),
+    )
+    bounds = (0, after.isoformat(), until.isoformat())
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = db.execute(
+            "SELECT task_id, occurs_at FROM task_occurrences WHERE user_id = ? AND occurs_at > ? AND occurs_at <= ?",
+            bounds,
+        ).fetchall()
+        best = min(best, time.perf_counter() - start)
+    return best, len(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark recurring-task occurrence expansion")
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--window-days", type=int, default=7)
+    parser.add_argument("--per-user", type=int, default=200, help="Tasks per user in the table query")
+    parser.add_argument("--check", type=int, default=2000, help="Series compared against the Python path")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    now = datetime(2026, 1, 5, 12)
+    after = now - timedelta(microseconds=1)
+    until = now + timedelta(days=args.window_days)
+    print(f"{'series':>8} {'python':>11} {'bulk':>11} {'speedup':>8} {'occurrences':>12} {'user query':>11}")
+    for n in (int(s) for s in args.sizes.split(",")):
+        rules, starts = make_series(n, now, seed=n)
+        py_time, expected = bench_python(rules, starts, after, until)
+        np_time, idx, at = bench_bulk(rules, starts, after, until)
+
+        sample = random.Random(0).sample(range(n), min(args.check, n))
+        got = {}
+        for i, when in zip(idx.tolist(), at.astype(datetime).tolist()):
+            got.setdefault(i, []).append(when)
+        assert all(expected.get(i, []) == got.get(i, []) for i in sample), "occurrence mismatch between implementations"
+
+        table_time, rows = bench_table(idx, at, after, until, args.per_user, args.repeat)
+        print(
+            f"{n:>8} {py_time * 1e3:>8.1f} ms {np_time * 1e3:>8.1f} ms {py_time / np_time:>7.0f}x "
+            f"{idx.size:>12} {table_time * 1e3:>8.3f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
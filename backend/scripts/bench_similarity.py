@@ -0,0 +1,77 @@
+# RAG — microbenchmark: pure-Python cosine loop + full sort vs. TaskVectorMatrix top-k
+# Usage (from backend/): python scripts/bench_similarity.py [--sizes 100,10000,100000]
+
+import argparse
+import math
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from backend.rag import pack_vector  # noqa: E402
+from backend.similarity import TaskVectorMatrix  # noqa: E402
+
+
+def cosine_similarity(v1: list[float], v2: list[float]) -> float:
+    """The baseline: one task at a time in pure Python, as search scored before TaskVectorMatrix."""
+    dot_product = sum(a * b for a, b in zip(v1, v2))
+    magnitude1 = math.sqrt(sum(a * a for a in v1))
+    magnitude2 = math.sqrt(sum(b * b for b in v2))
+    if magnitude1 == 0 or magnitude2 == 0:
+        return 0.0
+    return dot_product / (magnitude1 * magnitude2)
+
+
+def bench_python(query, vectors, k):
+    start = time.perf_counter()
+    scored = [(cosine_similarity(query, v), i) for i, v in enumerate(vectors)]
+    scored.sort(key=lambda x: x[0], reverse=True)
+    top = scored[:k]
+    return time.perf_counter() - start, [i for _, i in top]
+
+
+def bench_matrix(query, matrix, k, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        top = matrix.top_k(query, k)
+        best = min(best, time.perf_counter() - start)
+    return best, [i for i, _ in top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark semantic search scoring")
+    parser.add_argument("--sizes", default="100,10000,100000")
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'tasks':>8} {'python loop':>14} {'build':>10} {'matrix top-k':>14} {'speedup':>9}")
+    for n in (int(s) for s in args.sizes.split(",")):
+        data = rng.standard_normal((n, args.dim), dtype=np.float32)
+        query = rng.standard_normal(args.dim, dtype=np.float32).tolist()
+        vectors = data.tolist()
+
+        py_time, py_top = bench_python(query, vectors, args.k)
+
+        # Build from packed blobs exactly as rag.search_tasks_semantic does on a cache miss
+        blobs = [pack_vector(v) for v in vectors]
+        start = time.perf_counter()
+        matrix = TaskVectorMatrix.from_packed(list(range(n)), blobs)
+        build_time = time.perf_counter() - start
+
+        np_time, np_top = bench_matrix(query, matrix, args.k, args.repeat)
+        assert py_top == np_top, "top-k mismatch between implementations"
+        print(
+            f"{n:>8} {py_time * 1e3:>11.2f} ms {build_time * 1e3:>7.2f} ms "
+            f"{np_time * 1e3:>11.3f} ms {py_time / np_time:>8.0f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# Phase II — concurrent-request load test against a running API
+# Usage (from backend/): python scripts/load_test.py --url http://localhost:8000 --user-id u1 \
+#     [--concurrency 10,100,1000 --requests 2000 --path "/api/{user_id}/tasks?limit=20"]
+#
+# Signs its own token with BETTER_AUTH_SECRET (same default as the server). Each level
+# keeps `concurrency` requests in flight until `requests` have completed and reports
+# throughput and latency percentiles. Sync `def` handlers top out at the threadpool size
+# (40 by default) however many requests are in flight; async handlers keep scaling until
+# the database or CPU saturates. Run it against two builds to compare.
+
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+import httpx
+import jwt
+
+
+async def run_level(client: httpx.AsyncClient, path: str, headers: dict, concurrency: int, total: int) -> dict:
+    latencies: list[float] = []
+    errors = 0
+    remaining = total
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            try:
+                r = await client.get(path, headers=headers)
+                if r.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+
+    def pct(p: float) -> float:
+        return latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1e3
+
+    return {
+        "rps": len(latencies) / elapsed,
+        "p50": pct(0.50),
+        "p95": pct(0.95),
+        "p99": pct(0.99),
+        "mean": statistics.fmean(latencies) * 1e3,
+        "errors": errors,
+    }
+
+
+async def main_async(args):
+    token = jwt.encode({"sub": args.user_id}, args.secret, algorithm="HS256")
+    headers = {"Authorization": f"Bearer {token}"}
+    path = args.path.format(user_id=args.user_id)
+    levels = [int(c) for c in args.concurrency.split(",")]
+    limits = httpx.Limits(max_connections=max(levels), max_keepalive_connections=max(levels))
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=args.timeout) as client:
+        await run_level(client, path, headers, 1, 5)  # Warm-up
+        print(f"GET {path}")
+        print(f"{'concurrency':>12} {'req/s':>10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+        for level in levels:
+            r = await run_level(client, path, headers, level, max(args.requests, level))
+            print(f"{level:>12} {r['rps']:>10.0f} {r['p50']:>9.1f} {r['p95']:>9.1f} {r['p99']:>9.1f} {r['errors']:>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the API at increasing concurrency")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--user-id", default="load-test-user")
+    parser.add_argument("--secret", default=os.environ.get("BETTER_AUTH_SECRET", "change-me-in-production"))
+    parser.add_argument("--path", default="/api/{user_id}/tasks?limit=20")
+    parser.add_argument("--concurrency", default="1,10,100,500,1000")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+# Test setup — throwaway SQLite database, no outbox relay, no rate limits, local embeddings
+
+import os
+import sys
+import tempfile
+
+_DB_DIR = tempfile.mkdtemp(prefix="todo-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_DB_DIR, 'test.db')}"
+os.environ["OUTBOX_RELAY"] = "0"
+os.environ["RATE_LIMITS"] = "0"
+os.environ["EMBEDDING_PROVIDER"] = "local"
+os.environ["BETTER_AUTH_SECRET"] = "test-secret-at-least-32-bytes-long"
+os.environ.pop("GEMINI_API_KEY", None)
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import jwt  # noqa: E402
+import pytest  # noqa: E402
+from sqlmodel import Session, SQLModel  # noqa: E402
+
+from backend.auth import BETTER_AUTH_SECRET  # noqa: E402
+from backend.database import engine, init_db  # noqa: E402
+
+
+@pytest.fixture(scope="session", autouse=True)
+def database():
+    init_db()
+    yield
+
+
+@pytest.fixture(autouse=True)
+def empty_tables():
+    yield
+    with engine.begin() as conn:
+        for table in reversed(SQLModel.metadata.sorted_tables):
+            conn.execute(table.delete())
+
+
+@pytest.fixture
+def session():
+    with Session(engine) as session:
+        yield session
+
+
+@pytest.fixture
+def client():
+    from fastapi.testclient import TestClient
+
+    from backend.main import app
+
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture
+def auth_headers():
+    """auth_headers(user_id) -> headers carrying an HS256 token for that user."""
+    def headers(user_id: str) -> dict:
+        return {"Authorization": f"Bearer {jwt.encode({'sub': user_id}, BETTER_AUTH_SECRET, algorithm='HS256')}"}
+
+    return headers
@@ -0,0 +1,117 @@
+import json
+import time
+from types import SimpleNamespace
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from backend import auth
+from backend.auth import JWKSCache, TokenCache
+
+
+@pytest.fixture
+def clock(monkeypatch) -> list[float]:
+    """auth's notion of now; tests move it by assigning clock[0]."""
+    now = [1_000_000.0]
+    monkeypatch.setattr(auth, "time", SimpleNamespace(time=lambda: now[0]))
+    return now
+
+
+def test_cached_token_expires_at_exp(clock):
+    cache = TokenCache(max_size=10, ttl=300)
+    cache.put("short", "u1", exp=clock[0] + 30)  # exp before the TTL: exp wins
+    cache.put("long", "u2", exp=clock[0] + 3600)
+    cache.put("no-exp", "u3", exp=None)
+    clock[0] += 29
+    assert [cache.get(t) for t in ("short", "long", "no-exp")] == ["u1", "u2", "u3"]
+    clock[0] += 1
+    assert cache.get("short") is None
+    clock[0] += 270  # TTL reached
+    assert cache.get("long") is None and cache.get("no-exp") is None
+
+
+def test_token_cache_is_bounded_lru(clock):
+    cache = TokenCache(max_size=2, ttl=300)
+    cache.put("a", "u1", None)
+    cache.put("b", "u2", None)
+    cache.get("a")
+    cache.put("c", "u3", None)
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == ("u1", None, "u3")
+
+
+def test_expired_token_is_rejected(client):
+    token = jwt.encode({"sub": "u1", "exp": int(time.time()) - 1}, auth.BETTER_AUTH_SECRET, algorithm="HS256")
+    response = client.get("/api/u1/tasks", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 401
+    assert auth.token_cache.get(token) is None
+
+
+class Keyset:
+    """A JWKS document on disk (urlopen reads file:// URLs), with one RSA key per kid."""
+
+    def __init__(self, path):
+        self.path = path
+        self.private: dict[str, rsa.RSAPrivateKey] = {}
+
+    @property
+    def url(self) -> str:
+        return self.path.as_uri()
+
+    def publish(self, *kids: str) -> None:
+        keys = []
+        for kid in kids:
+            private = self.private.setdefault(kid, rsa.generate_private_key(public_exponent=65537, key_size=2048))
+            jwk = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(private.public_key()))
+            keys.append({**jwk, "kid": kid, "alg": "RS256", "use": "sig"})
+        self.path.write_text(json.dumps({"keys": keys}))
+
+    def sign(self, kid: str, user_id: str) -> str:
+        return jwt.encode({"sub": user_id}, self.private[kid], algorithm="RS256", headers={"kid": kid})
+
+
+@pytest.fixture
+def keyset(tmp_path) -> Keyset:
+    keyset = Keyset(tmp_path / "jwks.json")
+    keyset.publish("old")
+    return keyset
+
+
+def _wait_for(condition, timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.02)
+    return True
+
+
+def test_unknown_kid_wakes_the_refresher(keyset, monkeypatch):
+    cache = JWKSCache(keyset.url, refresh_interval=3600)  # Only a wake-up refreshes within the test
+    monkeypatch.setattr(auth, "jwks_cache", cache)
+    cache.start()
+    try:
+        assert _wait_for(lambda: "old" in cache._keys)  # Initial fetch done, refresher asleep
+        assert auth.verify_token(keyset.sign("old", "u1"))[0] == "u1"
+
+        keyset.publish("old", "new")  # Keys rotated since the last fetch
+        token = keyset.sign("new", "u2")
+        with pytest.raises(jwt.InvalidTokenError):
+            auth.verify_token(token)  # Rejected, not blocked on the network...
+        assert _wait_for(lambda: cache.get("new") is not None)  # ...and the refresh lands early
+    finally:
+        cache.stop()
+    assert auth.verify_token(token)[0] == "u2"
+
+
+def test_unknown_kid_is_401_on_the_api(client, keyset, monkeypatch):
+    cache = JWKSCache(keyset.url)
+    cache.refresh()
+    monkeypatch.setattr(auth, "jwks_cache", cache)
+    headers = {"Authorization": f"Bearer {keyset.sign('old', 'u1')}"}
+    assert client.get("/api/u1/tasks", headers=headers).status_code == 200
+
+    keyset.publish("other")
+    response = client.get("/api/u1/tasks", headers={"Authorization": f"Bearer {keyset.sign('other', 'u1')}"})
+    assert response.status_code == 401
+    assert cache._wake.is_set()  # The refresher has been asked for the new keyset
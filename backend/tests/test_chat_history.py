@@ -0,0 +1,65 @@
+import asyncio
+
+import pytest
+from sqlalchemy import update
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from backend.chat_history import conversation_cache, create_conversation, load_conversation, save_turn
+from backend.database import async_engine
+from backend.models import Conversation, Message
+
+
+def _run(coro_fn):
+    async def scoped():
+        async with AsyncSession(async_engine, expire_on_commit=False) as session:
+            return await coro_fn(session)
+
+    return asyncio.run(scoped())
+
+
+@pytest.fixture
+def conversation_id() -> int:
+    async def create(session):
+        entry = await create_conversation(session, "u1")
+        await save_turn(session, "u1", entry.conversation_id, "hello", "hi there")
+        return entry.conversation_id
+
+    return _run(create)
+
+
+def _contents(conversation_id: int) -> list[str]:
+    async def load(session):
+        entry = await load_conversation(session, "u1", conversation_id)
+        return [content for _, _, content in entry.rows]
+
+    return _run(load)
+
+
+def test_hit_serves_cached_tail(conversation_id):
+    hits = conversation_cache.stats()["hits"]
+    assert _contents(conversation_id) == ["hello", "hi there"]
+    assert conversation_cache.stats()["hits"] == hits + 1
+
+
+def test_turn_saved_by_another_worker_is_not_missed(conversation_id):
+    async def other_worker_saves(session):
+        # Another worker's save_turn: rows and a version bump this process's cache never saw
+        session.add_all([
+            Message(user_id="u1", conversation_id=conversation_id, role="user", content="add milk"),
+            Message(user_id="u1", conversation_id=conversation_id, role="assistant", content="added"),
+        ])
+        await session.exec(update(Conversation).where(Conversation.id == conversation_id).values(version=Conversation.version + 1))
+        await session.commit()
+
+    _run(other_worker_saves)
+    stale = conversation_cache.stats()["stale"]
+    assert _contents(conversation_id) == ["hello", "hi there", "add milk", "added"]
+    assert conversation_cache.stats()["stale"] == stale + 1
+    assert _contents(conversation_id) == ["hello", "hi there", "add milk", "added"]  # Re-cached at the new version
+
+
+def test_other_users_conversation_is_not_found(conversation_id):
+    async def load(session):
+        return await load_conversation(session, "u2", conversation_id)
+
+    assert _run(load) is None
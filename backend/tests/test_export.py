@@ -0,0 +1,58 @@
+import asyncio
+import gzip
+import json
+
+from backend.routes import tasks as task_routes
+
+
+def _create(client, headers, count: int) -> None:
+    for i in range(count):
+        client.post("/api/u1/tasks", json={"title": f"task {i}", "due_date": "2026-03-01T09:00:00"}, headers=headers)
+
+
+def _records(body: bytes) -> list[dict]:
+    assert body.endswith(b"\n")
+    return [json.loads(line) for line in body.decode("utf-8").split("\n")[:-1]]
+
+
+def test_ndjson_one_task_per_line(client, auth_headers):
+    headers = auth_headers("u1")
+    _create(client, headers, 3)
+    client.post("/api/u2/tasks", json={"title": "not mine"}, headers=auth_headers("u2"))
+
+    response = client.get("/api/u1/tasks/export", headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert "content-encoding" not in response.headers
+    records = _records(response.content)
+    assert [r["title"] for r in records] == ["task 0", "task 1", "task 2"]
+    assert records[0]["due_date"] == "2026-03-01T09:00:00"
+    assert {r["user_id"] for r in records} == {"u1"}
+
+
+def test_gzip_export_decodes_to_the_same_lines(client, auth_headers):
+    headers = auth_headers("u1")
+    _create(client, headers, 3)
+    plain = client.get("/api/u1/tasks/export", headers=headers).content
+
+    with client.stream("GET", "/api/u1/tasks/export?gzip=true", headers=headers) as response:
+        assert response.headers["content-encoding"] == "gzip"
+        raw = b"".join(response.iter_raw())
+    assert raw[:2] == b"\x1f\x8b"  # gzip magic: the body really is compressed
+    assert gzip.decompress(raw) == plain
+
+
+def test_export_streams_in_batches(client, auth_headers, monkeypatch):
+    _create(client, auth_headers("u1"), 5)
+    monkeypatch.setattr(task_routes, "EXPORT_BATCH_SIZE", 2)
+
+    async def chunks(compress: bool) -> list[bytes]:
+        return [chunk async for chunk in task_routes._export_ndjson("u1", compress)]
+
+    plain = asyncio.run(chunks(False))
+    assert [len(_records(chunk)) for chunk in plain] == [2, 2, 1]
+    assert gzip.decompress(b"".join(asyncio.run(chunks(True)))) == b"".join(plain)
+
+
+def test_empty_export(client, auth_headers):
+    assert client.get("/api/u1/tasks/export", headers=auth_headers("u1")).content == b""
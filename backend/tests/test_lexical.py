@@ -0,0 +1,76 @@
+from datetime import datetime
+
+import pytest
+from sqlmodel import select
+
+from backend.lexical import InvertedIndex, document_tokens, search_filter
+from backend.models import Task
+
+TITLES = ["Clean the garage", "Cleaning supplies", "Call mom", "C++ homework", "Buy milk", "Garage sale flyers"]
+
+
+@pytest.fixture
+def tasks(session) -> dict[str, int]:
+    rows = [Task(user_id="u1", title=title, description="weekend" if "arage" in title else "") for title in TITLES]
+    session.add_all(rows + [Task(user_id="u2", title="Clean the car")])
+    session.commit()
+    return {row.title: row.id for row in rows}
+
+
+def _search(session, query: str, max_ids: int = 5000) -> list[str]:
+    stmt = select(Task.title).where(Task.user_id == "u1", search_filter(session, "u1", query, max_ids)).order_by(Task.id)
+    return session.exec(stmt).all()
+
+
+def test_index_prefix_match_needs_every_token():
+    index = InvertedIndex()
+    for task_id, title in enumerate(TITLES):
+        index.add(task_id, document_tokens(title, None, None))
+    assert index.match("clean") == {0, 1}
+    assert index.match("gar clean") == {0}
+    assert index.match("clean milk") == set()
+    index.remove(0)
+    assert index.match("clean") == {1}
+
+
+def test_knows_all_and_bm25_prefer_title_terms():
+    index = InvertedIndex()
+    index.add(1, document_tokens("milk", "buy at the store", None))
+    index.add(2, document_tokens("store run", "milk", None))
+    assert index.knows_all(["milk", "store"])
+    assert not index.knows_all(["mil"])  # Prefixes are not keywords
+    assert [tid for tid, _ in index.bm25(["milk"], 10)] == [1, 2]
+
+
+@pytest.mark.parametrize("max_ids", [5000, 1, 0])
+def test_search_is_prefix_match_at_every_result_size(session, tasks, max_ids):
+    """Same answer whether ids go as IN, NOT IN or an inlined IN list."""
+    assert _search(session, "clean", max_ids) == ["Clean the garage", "Cleaning supplies"]
+    assert _search(session, "GARAGE weekend", max_ids) == ["Clean the garage", "Garage sale flyers"]
+    assert _search(session, "nothing", max_ids) == []
+
+
+def test_large_result_branches(session, tasks):
+    many = search_filter(session, "u1", "c", max_ids=3)  # 4 matches, 2 others: NOT IN the others
+    assert "NOT IN" in str(many)
+    inlined = search_filter(session, "u1", "c", max_ids=1)  # Both sides too big: inlined IN
+    assert "NOT IN" not in str(inlined) and "search_ids" in str(inlined)
+    assert _search(session, "c", 3) == _search(session, "c", 1) == _search(session, "c")
+
+
+def test_wordless_query_falls_back_to_substring(session, tasks):
+    assert _search(session, "++") == ["C++ homework"]
+    assert _search(session, "c++") == ["Clean the garage", "Cleaning supplies", "Call mom", "C++ homework"]
+
+
+def test_index_follows_task_changes(session, tasks):
+    assert _search(session, "milk") == ["Buy milk"]
+    task = session.get(Task, tasks["Buy milk"])
+    task.title = "Buy oat drink"
+    task.updated_at = datetime.utcnow()  # As every write path does; the index syncs on it
+    session.commit()
+    session.delete(session.get(Task, tasks["Call mom"]))
+    session.commit()
+    assert _search(session, "milk") == []
+    assert _search(session, "oat") == ["Buy oat drink"]
+    assert _search(session, "mom") == []
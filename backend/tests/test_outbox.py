@@ -0,0 +1,103 @@
+import json
+
+import pytest
+from sqlmodel import select
+
+from backend.database import engine
+from backend.events import OutboxRelay
+from backend.models import OutboxEvent
+from backend.task_batch import BatchOperation, apply_task_batch
+
+
+class FakeClient:
+    """DaprClient stand-in: records published payloads; fails while `fail` is set."""
+
+    def __init__(self, log: list[str]):
+        self.log = log
+        self.fail = False
+        self.closed = False
+
+    def publish_event(self, pubsub_name, topic_name, data, data_content_type):
+        if self.fail:
+            raise ConnectionError("sidecar unavailable")
+        self.log.append(data)
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def published() -> list[str]:
+    return []
+
+
+@pytest.fixture
+def clients() -> list[FakeClient]:
+    """Every client the relay opened, oldest first."""
+    return []
+
+
+@pytest.fixture
+def relay(published, clients):
+    def factory():
+        clients.append(FakeClient(published))
+        return clients[-1]
+
+    return OutboxRelay(bind=engine, client_factory=factory, batch_size=2)
+
+
+def _events(session, count: int) -> None:
+    apply_task_batch(session, "u1", [BatchOperation(op="create", title=f"t{i}") for i in range(count)])
+    session.commit()
+
+
+def _backlog(session) -> int:
+    session.expire_all()
+    return len(session.exec(select(OutboxEvent.id)).all())
+
+
+def test_publishes_in_outbox_order_then_deletes(session, relay, published):
+    _events(session, 5)
+    assert _backlog(session) == 5
+    assert [relay.relay_once() for _ in range(4)] == [2, 2, 1, 0]
+    assert [json.loads(p)["title"] for p in published] == ["t0", "t1", "t2", "t3", "t4"]
+    assert _backlog(session) == 0
+    assert relay.stats()["relayed"] == 5
+
+
+def test_failed_publish_keeps_rows_for_retry(session, relay, published, clients):
+    _events(session, 3)
+    relay.relay_once()  # Opens the client and sends t0, t1
+    clients[0].fail = True
+    with pytest.raises(ConnectionError):
+        relay.relay_once()
+    assert _backlog(session) == 1  # t2 is still there
+
+    relay._close_client()  # As the run loop does after a failure: reconnect on retry
+    assert clients[0].closed
+    assert relay.relay_once() == 1
+    assert [json.loads(p)["title"] for p in published] == ["t0", "t1", "t2"]
+    assert _backlog(session) == 0
+
+
+def test_rolled_back_change_writes_no_event(session, relay, published):
+    apply_task_batch(session, "u1", [BatchOperation(op="create", title="never")])
+    session.rollback()
+    assert relay.relay_once() == 0
+    assert published == []
+
+
+def test_background_relay_drains_on_commit(session, relay, published):
+    relay.poll_interval = 5  # Only a commit notification wakes it this fast
+    relay.relay_once()
+    relay.start()
+    try:
+        _events(session, 3)
+        relay.notify()
+        for _ in range(200):
+            if len(published) == 3:
+                break
+            relay._stopping.wait(0.01)
+    finally:
+        relay.stop()
+    assert [json.loads(p)["title"] for p in published] == ["t0", "t1", "t2"]
@@ -0,0 +1,106 @@
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+from sqlmodel import select
+
+from backend.models import Task
+from backend.pagination import decode_cursor, encode_cursor, keyset_statements, parse_fields
+
+
+def _page(session, sort: str, order: str, cursor: str | None, limit: int) -> list[Task]:
+    """One page, run as GET /tasks runs it: each statement continues where the last ran out."""
+    tasks: list[Task] = []
+    for part in keyset_statements(select(Task).where(Task.user_id == "u1"), sort, order, cursor):
+        tasks.extend(session.exec(part.limit(limit - len(tasks))).all())
+        if len(tasks) >= limit:
+            break
+    return tasks
+
+
+def _walk(session, sort: str, order: str, page_size: int) -> list[int]:
+    """Every page in turn. -> task ids in page order."""
+    seen, cursor = [], None
+    while True:
+        page = _page(session, sort, order, cursor, page_size)
+        seen.extend(t.id for t in page)
+        if len(page) < page_size:
+            return seen
+        cursor = encode_cursor(sort, order, getattr(page[-1], sort), page[-1].id)
+
+
+def _expected(tasks: list[Task], sort: str, order: str) -> list[int]:
+    """(sort key, id) in the requested direction, NULL sort keys last either way."""
+    dated = sorted((t for t in tasks if getattr(t, sort) is not None), key=lambda t: (getattr(t, sort), t.id))
+    undated = sorted((t for t in tasks if getattr(t, sort) is None), key=lambda t: t.id)
+    if order == "desc":
+        dated.reverse()
+        undated.reverse()
+    return [t.id for t in dated + undated]
+
+
+@pytest.fixture
+def tasks(session):
+    base = datetime(2026, 3, 1, 9)
+    # Ties on due_date and a NULL tail, so pages must break ties by id
+    dues = [base, None, base + timedelta(days=1), base, None, base + timedelta(days=2), base, None, base + timedelta(days=1)]
+    rows = [Task(user_id="u1", title=f"t{i}", due_date=due) for i, due in enumerate(dues)]
+    session.add_all(rows + [Task(user_id="u2", title="other", due_date=base)])
+    session.commit()
+    for row in rows:
+        session.refresh(row)
+    return rows
+
+
+@pytest.mark.parametrize("sort", ["id", "due_date", "created_at"])
+@pytest.mark.parametrize("order", ["asc", "desc"])
+@pytest.mark.parametrize("page_size", [1, 2, 4, 20])
+def test_pages_cover_every_task_once_in_order(session, tasks, sort, order, page_size):
+    assert _walk(session, sort, order, page_size) == _expected(tasks, sort, order)
+
+
+def test_due_date_pages_never_or_with_is_null(session, tasks):
+    """Dated and undated tasks come from separate statements, each a plain index range."""
+    cursor = encode_cursor("due_date", "desc", tasks[0].due_date, tasks[0].id)
+    dated, undated = keyset_statements(select(Task), "due_date", "desc", cursor)
+    assert " OR " not in str(dated) and " OR " not in str(undated)
+    assert "NULLS" not in str(dated)  # Plain DESC: a backward scan of the ascending index
+
+
+def test_list_endpoint_pages_into_the_null_tail(client, auth_headers):
+    headers = auth_headers("u1")
+    for i, due in enumerate(["2026-03-02T09:00:00", None, "2026-03-01T09:00:00", None]):
+        client.post("/api/u1/tasks", json={"title": f"t{i}", "due_date": due}, headers=headers)
+    seen, cursor = [], None
+    while True:
+        params = {"sort": "due_date", "order": "desc", "limit": 3, **({"cursor": cursor} if cursor else {})}
+        response = client.get("/api/u1/tasks", params=params, headers=headers)
+        seen.extend(t["title"] for t in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert seen == ["t0", "t2", "t3", "t1"]
+
+
+def test_cursor_round_trip():
+    value = datetime(2026, 3, 1, 9, 30)
+    assert decode_cursor(encode_cursor("due_date", "asc", value, 42), "due_date", "asc") == (value, 42)
+    assert decode_cursor(encode_cursor("due_date", "asc", None, 7), "due_date", "asc") == (None, 7)
+
+
+@pytest.mark.parametrize("cursor, sort, order", [
+    (encode_cursor("id", "asc", 5, 5), "id", "desc"),  # Issued for another order
+    (encode_cursor("id", "asc", 5, 5), "created_at", "asc"),  # Issued for another sort
+    ("not-a-cursor", "id", "asc"),
+])
+def test_bad_cursor_is_400(cursor, sort, order):
+    with pytest.raises(HTTPException) as exc:
+        decode_cursor(cursor, sort, order)
+    assert exc.value.status_code == 400
+
+
+def test_parse_fields_always_selects_id_and_sort_key():
+    assert parse_fields(None, "id") == (None, None)
+    assert parse_fields("title, completed", "due_date") == (["title", "completed"], ["id", "due_date", "title", "completed"])
+    with pytest.raises(HTTPException):
+        parse_fields("title,password", "id")
@@ -0,0 +1,82 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi import HTTPException
+
+from backend import main, push
+from backend.push import TaskEventHub
+
+
+def _event(user_id: str, task_id: int) -> dict:
+    return {"event": "created", "user_id": user_id, "task_id": task_id, "seq": task_id, "title": f"t{task_id}"}
+
+
+def test_overflow_sends_one_resync_then_resumes():
+    async def scenario() -> tuple[list, list, dict]:
+        hub = TaskEventHub(queue_size=2)
+        slow, other = hub.subscribe("u1"), hub.subscribe("u2")
+        hub.publish([_event("u1", i) for i in range(1, 5)] + [_event("u2", 9)])
+        received = [await hub.next_event(slow, 0.01) for _ in range(2)]
+        hub.publish([_event("u1", 5)])
+        received += [await hub.next_event(slow, 0.01) for _ in range(2)]
+        return received, [await hub.next_event(other, 0.01)], hub.stats()
+
+    received, other, stats = asyncio.run(scenario())
+    assert received[0] == {"event": "resync"}
+    assert received[1] is None  # The backlog was dropped, not delivered after the resync
+    assert [e and e.get("task_id") for e in received[2:]] == [5, None]
+    assert [e["task_id"] for e in other] == [9]  # Other users' queues are unaffected
+    assert stats["overflows"] == 1
+
+
+def test_publish_from_another_thread_reaches_the_loop():
+    async def scenario() -> dict | None:
+        hub = TaskEventHub()
+        subscription = hub.subscribe("u1")
+        threading.Thread(target=hub.publish, args=([_event("u1", 1)],)).start()  # e.g. a batch commit
+        return await hub.next_event(subscription, 1)
+
+    assert asyncio.run(scenario())["task_id"] == 1
+
+
+def test_connection_limit_per_user():
+    async def scenario() -> None:
+        hub = TaskEventHub(max_per_user=1)
+        first = hub.subscribe("u1")
+        hub.check("u2")
+        with pytest.raises(HTTPException) as e:
+            hub.check("u1")
+        assert e.value.status_code == 429
+        hub.unsubscribe(first)
+        hub.check("u1")
+
+    asyncio.run(scenario())
+
+
+@pytest.fixture
+def dapr_source(monkeypatch) -> list[list[dict]]:
+    """PUSH_SOURCE=dapr with a sidecar token; returns what reached the hub."""
+    published = []
+    monkeypatch.setattr(main, "PUSH_SOURCE", "dapr")
+    monkeypatch.setattr(push, "APP_API_TOKEN", "sidecar-token")
+    monkeypatch.setattr(push.task_hub, "publish", published.append)
+    return published
+
+
+def test_dapr_task_events_requires_the_token(client, dapr_source):
+    body = {"data": _event("u1", 1)}
+    assert client.post("/dapr/task-events", json=body).status_code == 401
+    assert client.post("/dapr/task-events", json=body, headers={"dapr-api-token": "wrong"}).status_code == 401
+    assert dapr_source == []
+
+    response = client.post("/dapr/task-events", json=body, headers={"dapr-api-token": "sidecar-token"})
+    assert response.json() == {"status": "SUCCESS"}
+    assert dapr_source == [[_event("u1", 1)]]
+
+
+def test_dapr_task_events_rejects_everything_without_a_configured_token(client, dapr_source, monkeypatch):
+    monkeypatch.setattr(push, "APP_API_TOKEN", "")
+    response = client.post("/dapr/task-events", json={"data": _event("u1", 1)}, headers={"dapr-api-token": ""})
+    assert response.status_code == 401
+    assert dapr_source == []
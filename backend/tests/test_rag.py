@@ -0,0 +1,75 @@
+import pytest
+from sqlmodel import Session, select
+
+from backend import rag
+from backend.database import engine
+from backend.models import TaskEmbedding
+
+QUERY = "something to remember"  # Not all indexed terms: takes the semantic path
+
+
+@pytest.fixture
+def embedded(monkeypatch) -> list[list[str]]:
+    """Texts passed to each task-embedding call, in order."""
+    calls = []
+
+    def embed(texts):
+        calls.append(list(texts))
+        return rag.embedding_provider.embed_batch(texts)
+
+    monkeypatch.setattr(rag, "get_batch_embeddings", embed)
+    return calls
+
+
+def _stored() -> dict[int, tuple[str, str]]:
+    with Session(engine) as session:
+        return {
+            row.task_id: (row.model, row.content_hash)
+            for row in session.exec(select(TaskEmbedding).where(TaskEmbedding.user_id == "u1"))
+        }
+
+
+def _create(client, headers, title: str) -> int:
+    return client.post("/api/u1/tasks", json={"title": title}, headers=headers).json()["id"]
+
+
+def test_unchanged_tasks_are_not_re_embedded(client, auth_headers, embedded):
+    headers = auth_headers("u1")
+    ids = [_create(client, headers, title) for title in ("buy milk", "call the dentist", "file taxes")]
+
+    rag.search_tasks_semantic("u1", QUERY)
+    assert len(embedded) == 1 and len(embedded[0]) == 3
+    assert sorted(_stored()) == ids
+
+    rag.search_tasks_semantic("u1", QUERY)
+    rag.search_tasks_semantic("u1", "another question entirely")
+    assert len(embedded) == 1  # Only the queries were embedded
+
+    client.put(f"/api/u1/tasks/{ids[1]}", json={"title": "call the vet"}, headers=headers)
+    rag.search_tasks_semantic("u1", QUERY)
+    assert len(embedded) == 2 and len(embedded[1]) == 1
+    assert embedded[1][0].startswith("call the vet")
+
+
+def test_update_and_delete_drop_the_stored_vector(client, auth_headers, embedded):
+    headers = auth_headers("u1")
+    kept, edited, deleted = (_create(client, headers, title) for title in ("water plants", "book flights", "old idea"))
+    rag.search_tasks_semantic("u1", QUERY)
+    assert sorted(_stored()) == [kept, edited, deleted]
+
+    client.put(f"/api/u1/tasks/{edited}", json={"description": "window seat"}, headers=headers)
+    assert client.delete(f"/api/u1/tasks/{deleted}", headers=headers).status_code in (200, 204)
+    assert sorted(_stored()) == [kept]
+
+
+def test_model_change_re_embeds_everything(client, auth_headers, embedded, monkeypatch):
+    headers = auth_headers("u1")
+    for title in ("water plants", "book flights"):
+        _create(client, headers, title)
+    rag.search_tasks_semantic("u1", QUERY)
+    hashes = {tid: digest for tid, (_, digest) in _stored().items()}
+
+    monkeypatch.setattr(rag, "EMBEDDING_MODEL", "other-model")
+    rag.search_tasks_semantic("u1", QUERY)
+    assert [len(texts) for texts in embedded] == [2, 2]
+    assert _stored() == {tid: ("other-model", digest) for tid, digest in hashes.items()}
@@ -0,0 +1,113 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+from backend import rate_limit
+from backend.rate_limit import ConcurrencyGate, TokenBucketLimiter
+
+
+@pytest.fixture
+def clock(monkeypatch) -> list[float]:
+    """rate_limit's monotonic clock; tests move it by assigning clock[0]."""
+    now = [100.0]
+    monkeypatch.setattr(rate_limit, "time", SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+
+def _take(limiter: TokenBucketLimiter, key: str = "u1") -> float:
+    return asyncio.run(limiter.take(key))
+
+
+def test_bucket_allows_burst_then_refills(clock):
+    limiter = TokenBucketLimiter("test", rate=2, burst=3)
+    assert [_take(limiter) for _ in range(3)] == [0, 0, 0]
+    assert _take(limiter) == pytest.approx(0.5)  # Empty: next token in 1/rate s
+    assert _take(limiter, "u2") == 0  # Buckets are per key
+    clock[0] += 0.25
+    assert _take(limiter) == pytest.approx(0.25)
+    clock[0] += 0.25
+    assert _take(limiter) == 0
+    clock[0] += 60  # Refill stops at burst
+    assert [_take(limiter) for _ in range(4)][-1] > 0
+    assert limiter.stats()["rejected"] == 3
+
+
+def test_store_failure_falls_back_to_local_bucket(clock):
+    class BrokenStore:
+        async def take(self, key, rate, burst):
+            raise ConnectionError("sidecar unavailable")
+
+    limiter = TokenBucketLimiter("test", rate=1, burst=1, store=BrokenStore())
+    assert _take(limiter) == 0
+    assert _take(limiter) > 0
+    assert limiter.stats()["store_errors"] == 2
+
+
+def test_empty_bucket_is_429_with_retry_after(client, auth_headers, monkeypatch):
+    limiter = rate_limit.limiters["tasks_read"]
+    monkeypatch.setattr(rate_limit, "RATE_LIMITS", True)
+    monkeypatch.setattr(limiter, "rate", 0.1)
+    monkeypatch.setattr(limiter, "burst", 2)
+    monkeypatch.setattr(limiter, "_buckets", type(limiter._buckets)())
+    headers = auth_headers("u1")
+
+    assert [client.get("/api/u1/tasks", headers=headers).status_code for _ in range(2)] == [200, 200]
+    response = client.get("/api/u1/tasks", headers=headers)
+    assert response.status_code == 429
+    assert 1 <= int(response.headers["retry-after"]) <= 10
+    assert client.get("/api/u2/tasks", headers=auth_headers("u2")).status_code == 200
+
+
+def test_gate_queues_then_times_out():
+    async def scenario() -> tuple[list[str], dict]:
+        gate = ConcurrencyGate(limit=1, queue_size=1, timeout=0.05)
+        log = []
+        release = asyncio.Event()
+
+        async def turn(name: str, hold: bool = False):
+            try:
+                async with gate.slot():
+                    log.append(f"{name} admitted")
+                    if hold:
+                        await release.wait()
+            except HTTPException as e:
+                log.append(f"{name} {e.status_code}: {e.detail}")
+
+        holder = asyncio.create_task(turn("a", hold=True))
+        await asyncio.sleep(0)
+        queued = asyncio.create_task(turn("b"))
+        await asyncio.sleep(0)
+        await turn("c")  # Queue already full: rejected at once
+        await queued  # Nothing frees the slot within the timeout
+        release.set()
+        await holder
+        await turn("d")  # The slot is free again
+        return log, gate.stats()
+
+    log, stats = asyncio.run(scenario())
+    assert log == [
+        "a admitted",
+        "c 429: Too many chat requests in progress",
+        "b 429: Timed out waiting for a chat slot",
+        "d admitted",
+    ]
+    assert stats["rejected_full"] == stats["rejected_timeout"] == 1
+    assert stats["in_flight"] == stats["waiting"] == 0
+
+
+def test_queued_turn_gets_the_freed_slot():
+    async def scenario() -> list[str]:
+        gate = ConcurrencyGate(limit=1, queue_size=1, timeout=1)
+        log = []
+
+        async def turn(name: str, hold: float):
+            async with gate.slot():
+                log.append(name)
+                await asyncio.sleep(hold)
+
+        await asyncio.gather(turn("a", 0.02), turn("b", 0))
+        return log
+
+    assert asyncio.run(scenario()) == ["a", "b"]
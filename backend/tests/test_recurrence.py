@@ -0,0 +1,103 @@
+import random
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+from sqlmodel import select
+
+from backend.models import Task, TaskOccurrence, UserSyncState
+from backend.recurrence import (
+    OCCURRENCE_HORIZON_DAYS,
+    build_occurrences,
+    bulk_occurrences,
+    next_task,
+    normalize_rule,
+    occurrences,
+    parse_due_date,
+    parse_rule,
+)
+
+
+def test_normalize_rule_aliases_and_rrule():
+    assert normalize_rule("Weekly") == "weekly"
+    assert normalize_rule("RRULE:FREQ=WEEKLY;BYDAY=FR,MO") == "FREQ=WEEKLY;BYDAY=MO,FR"
+    assert normalize_rule("FREQ=DAILY;BYDAY=SA,SU") == "FREQ=WEEKLY;BYDAY=SA,SU"
+    assert normalize_rule("  ") is None
+
+
+@pytest.mark.parametrize("text", ["FREQ=HOURLY", "FREQ=DAILY;COUNT=3", "FREQ=MONTHLY;BYDAY=MO", "FREQ=WEEKLY;INTERVAL=0"])
+def test_normalize_rule_rejects(text):
+    with pytest.raises(ValueError):
+        normalize_rule(text)
+
+
+def test_monthly_clamps_then_returns_to_series_day():
+    start = datetime(2026, 1, 31, 9)
+    found = occurrences(parse_rule("monthly"), start, start, datetime(2026, 5, 1))
+    assert [d.date().isoformat() for d in found] == ["2026-02-28", "2026-03-31", "2026-04-30"]
+
+
+def test_weekly_byday_within_window():
+    start = datetime(2026, 1, 5, 8)  # Monday
+    found = occurrences(parse_rule("FREQ=WEEKLY;BYDAY=MO,WE,FR"), start, start, datetime(2026, 1, 12, 8))
+    assert [d.day for d in found] == [7, 9, 12]
+
+
+def test_next_task_keeps_series_start():
+    task = Task(user_id="u1", title="rent", recurring_rule="monthly", due_date=datetime(2026, 1, 31))
+    february = next_task(task)
+    assert february.due_date == datetime(2026, 2, 28)
+    assert february.recurrence_start == datetime(2026, 1, 31)
+    assert next_task(february).due_date == datetime(2026, 3, 31)
+
+
+def test_next_task_without_rule_or_due_date():
+    assert next_task(Task(user_id="u1", title="once", due_date=datetime(2026, 1, 1))) is None
+    assert next_task(Task(user_id="u1", title="undated", recurring_rule="daily")) is None
+
+
+def test_parse_due_date_converts_offsets_to_naive_utc():
+    assert parse_due_date("2026-03-01T09:00:00+05:30") == datetime(2026, 3, 1, 3, 30)
+    assert parse_due_date("2026-03-01T09:00:00Z") == datetime(2026, 3, 1, 9)
+    assert parse_due_date("2026-03-01T09:00:00") == datetime(2026, 3, 1, 9)
+
+
+def test_bulk_occurrences_matches_scalar_path():
+    rules = [
+        None, "daily", "weekly", "monthly", "yearly", "FREQ=DAILY;INTERVAL=3",
+        "FREQ=WEEKLY;INTERVAL=2;BYDAY=TU,TH", "FREQ=MONTHLY;BYMONTHDAY=31", "FREQ=MONTHLY;BYMONTHDAY=-1",
+    ]
+    rnd = random.Random(7)
+    now = datetime(2026, 1, 5, 12)
+    until = now + timedelta(days=60)
+    series = [(rnd.choice(rules), now - timedelta(days=rnd.randint(0, 720), minutes=rnd.randint(0, 1439))) for _ in range(500)]
+    starts = np.array([start for _, start in series], "M8[us]")
+    idx, at = bulk_occurrences([rule for rule, _ in series], starts, np.full(len(series), np.datetime64(now, "us")), until)
+
+    got: dict[int, list[datetime]] = {}
+    for i, when in zip(idx.tolist(), at.astype(datetime).tolist()):
+        got.setdefault(i, []).append(when)
+    for i, (rule, start) in enumerate(series):
+        expected = occurrences(parse_rule(rule), start, now, until) if rule else []
+        assert got.get(i, []) == expected, (rule, start)
+
+
+def test_build_occurrences_projects_recurring_tasks(session):
+    now = datetime.utcnow().replace(microsecond=0)
+    session.add(UserSyncState(user_id="u1", version=1))
+    due = now + timedelta(hours=1)
+    session.add(Task(user_id="u1", title="standup", recurring_rule="daily", due_date=due))
+    session.add(Task(user_id="u1", title="done", completed=True, due_date=due))
+    session.commit()
+
+    assert build_occurrences(session, "u1", now)
+    session.commit()
+    through = session.get(UserSyncState, "u1").occurrences_through
+    assert through >= now + timedelta(days=OCCURRENCE_HORIZON_DAYS)
+    rows = session.exec(
+        select(TaskOccurrence.occurs_at).where(TaskOccurrence.user_id == "u1").order_by(TaskOccurrence.occurs_at)
+    ).all()
+    expected = [due + timedelta(days=k) for k in range(OCCURRENCE_HORIZON_DAYS + 1)]
+    assert rows == [when for when in expected if when <= through]
+    # Already covered: a second build is a no-op
+    assert not build_occurrences(session, "u1", now)
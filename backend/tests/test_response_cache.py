@@ -0,0 +1,91 @@
+import pytest
+
+from backend.response_cache import ResponseCache, is_read_only, response_cache
+
+LISTED = [{"name": "list_tasks_tool", "arguments": {}}]
+ADDED = [{"name": "add_task_tool", "arguments": {"title": "milk"}}]
+
+
+def _answer(cache: ResponseCache, message: str, version: int):
+    return cache.lookup("u1", message, version)[0]
+
+
+def test_is_read_only():
+    assert is_read_only(LISTED)
+    assert is_read_only([{"name": "search_tasks_tool", "arguments": {}}] + LISTED)
+    assert not is_read_only(LISTED + ADDED)
+    assert not is_read_only([])  # Answered without looking anything up
+
+
+def test_only_read_only_turns_are_stored():
+    cache = ResponseCache()
+    _, probe = cache.lookup("u1", "add milk", 3)
+    cache.store(probe, "Added milk", ADDED)
+    assert _answer(cache, "add milk", 3) is None
+
+    _, probe = cache.lookup("u1", "What's pending?", 3)
+    cache.store(probe, "Two tasks", LISTED)
+    assert _answer(cache, "whats pending", 3) == ("Two tasks", LISTED)
+    assert cache.lookup("u2", "whats pending", 3)[0] is None  # Per user
+
+
+def test_task_version_change_retires_answers():
+    cache = ResponseCache()
+    _, probe = cache.lookup("u1", "show my tasks", 3)
+    cache.store(probe, "Two tasks", LISTED)
+    assert _answer(cache, "show my tasks", 3) is not None
+    assert _answer(cache, "show my tasks", 4) is None  # A task changed, from any worker
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_answer_computed_across_a_change_is_not_stored():
+    cache = ResponseCache()
+    _, probe = cache.lookup("u1", "show my tasks", 3)
+    assert _answer(cache, "something else", 4) is None  # Another request saw the change
+    cache.store(probe, "Stale list", LISTED)
+    assert _answer(cache, "show my tasks", 4) is None
+
+
+@pytest.fixture
+def agent_calls(monkeypatch) -> list[list[dict]]:
+    """Messages sent to the (fake) agent per turn; every turn lists tasks."""
+    from backend.routes import chat
+
+    calls = []
+
+    async def run_agent(user_id, messages):
+        calls.append(messages)
+        return f"answer {len(calls)}", LISTED
+
+    monkeypatch.setattr(chat, "run_agent", run_agent)
+    return calls
+
+
+def _chat(client, headers, message: str, conversation_id: int | None = None) -> dict:
+    body = {"message": message, **({"conversation_id": conversation_id} if conversation_id else {})}
+    return client.post("/api/u1/chat", json=body, headers=headers).json()
+
+
+def test_endpoint_serves_repeats_until_tasks_change(client, auth_headers, agent_calls):
+    headers = auth_headers("u1")
+    response_cache._users.clear()
+    assert _chat(client, headers, "show my tasks")["cached"] is False
+    assert _chat(client, headers, "Show my tasks!")["cached"] is True
+    assert len(agent_calls) == 1
+
+    client.post("/api/u1/tasks", json={"title": "new"}, headers=headers)  # Bumps user_sync.version
+    assert _chat(client, headers, "show my tasks")["cached"] is False
+    assert len(agent_calls) == 2
+
+
+def test_follow_up_turns_are_never_served_from_cache(client, auth_headers, agent_calls):
+    headers = auth_headers("u1")
+    response_cache._users.clear()
+    first = _chat(client, headers, "show my tasks")
+    follow_up = _chat(client, headers, "show my tasks", first["conversation_id"])
+    assert follow_up["cached"] is False
+    assert len(agent_calls[-1]) > 1  # The agent saw the history
+
+    # Nor are follow-up answers stored for someone else's opening question
+    _chat(client, headers, "what about the second one?", first["conversation_id"])
+    assert _chat(client, headers, "what about the second one?")["cached"] is False
@@ -0,0 +1,68 @@
+from sqlmodel import select
+
+from backend.models import Task, TaskTombstone, UserSyncState
+from backend.task_batch import BatchOperation, apply_task_batch
+
+
+def _version(session, user_id: str) -> int:
+    session.expire_all()
+    state = session.get(UserSyncState, user_id)
+    return state.version if state else 0
+
+
+def _batch(session, user_id: str, *operations: dict) -> list[dict]:
+    results = apply_task_batch(session, user_id, [BatchOperation(**op) for op in operations])
+    session.commit()
+    return results
+
+
+def test_one_version_bump_per_user_per_transaction(session):
+    created = _batch(session, "u1", *({"op": "create", "title": f"t{i}"} for i in range(3)))
+    _batch(session, "u2", {"op": "create", "title": "other"})
+    assert _version(session, "u1") == 1
+    assert _version(session, "u2") == 1
+    assert {t.sync_version for t in session.exec(select(Task).where(Task.user_id == "u1"))} == {1}
+
+    first = created[0]["task_id"]
+    _batch(session, "u1", {"op": "update", "task_id": first, "title": "renamed"}, {"op": "complete", "task_id": first})
+    assert _version(session, "u1") == 2
+    versions = {t.id: t.sync_version for t in session.exec(select(Task).where(Task.user_id == "u1"))}
+    assert versions[first] == 2
+    assert sorted(versions.values()) == [1, 1, 2]
+
+
+def test_delete_leaves_tombstone_at_its_version(session):
+    task_id = _batch(session, "u1", {"op": "create", "title": "gone soon"})[0]["task_id"]
+    _batch(session, "u1", {"op": "delete", "task_id": task_id})
+    tombstone = session.get(TaskTombstone, task_id)
+    assert (tombstone.user_id, tombstone.version) == ("u1", 2)
+
+
+def test_rolled_back_changes_are_not_stamped(session):
+    _batch(session, "u1", {"op": "create", "title": "kept"})
+    apply_task_batch(session, "u1", [BatchOperation(op="create", title="discarded")])
+    session.rollback()
+    session.commit()  # Nothing pending: no bump
+    assert _version(session, "u1") == 1
+
+
+def test_reused_id_is_live_again_in_changes(client, auth_headers):
+    headers = auth_headers("u1")
+    client.post("/api/u1/tasks", json={"title": "first"}, headers=headers)
+    newest = client.post("/api/u1/tasks", json={"title": "newest"}, headers=headers).json()["id"]
+    since = int(client.get("/api/u1/tasks/changes", headers=headers).headers["X-Task-Version"])
+
+    client.delete(f"/api/u1/tasks/{newest}", headers=headers)
+    assert client.get(f"/api/u1/tasks/changes?since={since}", headers=headers).json()["deleted"] == [newest]
+
+    # SQLite hands the deleted newest id to the next insert
+    reused = client.post("/api/u1/tasks", json={"title": "reused"}, headers=headers).json()["id"]
+    assert reused == newest
+    delta = client.get(f"/api/u1/tasks/changes?since={since}", headers=headers).json()
+    assert [t["id"] for t in delta["changed"]] == [reused]
+    assert delta["deleted"] == []
+
+    # Deleting the reused id again moves its tombstone forward instead of colliding
+    client.delete(f"/api/u1/tasks/{reused}", headers=headers)
+    delta = client.get(f"/api/u1/tasks/changes?since={delta['version']}", headers=headers).json()
+    assert (delta["changed"], delta["deleted"]) == ([], [reused])
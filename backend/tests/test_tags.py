@@ -0,0 +1,67 @@
+import pytest
+from sqlmodel import select
+
+from backend.models import Task, TaskTag
+from backend.tags import backfill_task_tags, parse_tags, set_many_task_tags, tag_counts, tag_filter
+
+
+def _add(session, user_id: str, title: str, tags: str | None) -> int:
+    task = Task(user_id=user_id, title=title, tags=tags)
+    session.add(task)
+    session.flush()
+    set_many_task_tags(session, user_id, {task.id: tags})
+    session.commit()
+    return task.id
+
+
+@pytest.fixture
+def tagged(session) -> None:
+    _add(session, "u1", "report", "Work, urgent")
+    _add(session, "u1", "slides", "work")
+    _add(session, "u1", "dentist", "personal,URGENT")
+    _add(session, "u1", "untagged", None)
+    _add(session, "u2", "other user's", "work,urgent")
+
+
+def _titles(session, tags: list[str], mode: str) -> list[str]:
+    stmt = select(Task.title).where(Task.user_id == "u1", tag_filter("u1", tags, mode)).order_by(Task.id)
+    return session.exec(stmt).all()
+
+
+def test_parse_tags_normalizes():
+    assert parse_tags(" Work, urgent,,work ,URGENT") == ["work", "urgent"]
+    assert parse_tags(None) == parse_tags("") == []
+
+
+def test_any_and_all_matching(session, tagged):
+    assert _titles(session, ["work", "urgent"], "any") == ["report", "slides", "dentist"]
+    assert _titles(session, ["work", "urgent"], "all") == ["report"]
+    assert _titles(session, ["urgent"], "all") == ["report", "dentist"]
+    assert _titles(session, ["missing"], "any") == []
+
+
+def test_counts_are_per_user(session, tagged):
+    assert tag_counts(session, "u1") == [
+        {"tag": "urgent", "count": 2},
+        {"tag": "work", "count": 2},
+        {"tag": "personal", "count": 1},
+    ]
+    assert tag_counts(session, "u2") == [{"tag": "urgent", "count": 1}, {"tag": "work", "count": 1}]
+    assert tag_counts(session, "nobody") == []
+
+
+def test_backfill_is_idempotent(session):
+    # Tasks written before task_tags existed: tags string only, no rows
+    session.add_all([
+        Task(user_id="u1", title="old", tags="Home, errands"),
+        Task(user_id="u1", title="older", tags=""),
+        Task(user_id="u2", title="theirs", tags="home"),
+    ])
+    session.commit()
+    _add(session, "u1", "new", "home")
+
+    assert backfill_task_tags(session, batch_size=1) == 2
+    rows = sorted(session.exec(select(TaskTag.user_id, TaskTag.tag)).all())
+    assert rows == [("u1", "errands"), ("u1", "home"), ("u1", "home"), ("u2", "home")]
+    assert backfill_task_tags(session) == 0
+    assert sorted(session.exec(select(TaskTag.user_id, TaskTag.tag)).all()) == rows
@@ -0,0 +1,94 @@
+from datetime import datetime
+
+import pytest
+from sqlmodel import select
+
+from backend.models import OutboxEvent, Task
+from backend.task_batch import BatchOperation, apply_task_batch
+
+
+def _apply(session, operations: list[dict], atomic: bool = False) -> list[dict]:
+    results = apply_task_batch(session, "u1", [BatchOperation(**op) for op in operations], atomic=atomic)
+    session.commit()
+    return results
+
+
+def _titles(session) -> list[str]:
+    return sorted(session.exec(select(Task.title).where(Task.user_id == "u1")).all())
+
+
+@pytest.fixture
+def existing(session) -> int:
+    return _apply(session, [{"op": "create", "title": "existing"}])[0]["task_id"]
+
+
+MIXED = [
+    {"op": "create", "title": "new"},
+    {"op": "update", "task_id": 999, "title": "missing"},
+    {"op": "create", "title": ""},
+]
+
+
+def test_partial_applies_valid_items(session, existing):
+    results = _apply(session, MIXED + [{"op": "complete", "task_id": existing}])
+    assert [r["status"] for r in results] == ["created", "error", "error", "completed"]
+    assert results[1]["error"] == "Task not found"
+    assert _titles(session) == ["existing", "new"]
+    assert session.get(Task, existing).completed
+
+
+def test_atomic_writes_nothing_when_any_item_fails(session, existing):
+    results = _apply(session, MIXED + [{"op": "complete", "task_id": existing}], atomic=True)
+    assert [r["status"] for r in results] == ["skipped", "error", "error", "skipped"]
+    assert _titles(session) == ["existing"]
+    assert not session.get(Task, existing).completed
+    assert len(session.exec(select(OutboxEvent)).all()) == 1  # Only the fixture's "created"
+
+
+def test_atomic_applies_everything_when_all_valid(session, existing):
+    results = _apply(session, [{"op": "create", "title": "new"}, {"op": "delete", "task_id": existing}], atomic=True)
+    assert [r["status"] for r in results] == ["created", "deleted"]
+    assert _titles(session) == ["new"]
+
+
+def test_operations_on_one_task_apply_in_order(session, existing):
+    results = _apply(session, [
+        {"op": "update", "task_id": existing, "title": "renamed"},
+        {"op": "delete", "task_id": existing},
+        {"op": "complete", "task_id": existing},
+    ])
+    assert [r["status"] for r in results] == ["updated", "deleted", "error"]
+    assert _titles(session) == []
+
+
+def test_completing_recurring_task_creates_follow_up(session):
+    task_id = _apply(session, [{"op": "create", "title": "rent", "due_date": "2026-01-31T09:00:00", "recurring_rule": "monthly"}])[0]["task_id"]
+    result = _apply(session, [{"op": "complete", "task_id": task_id}])[0]
+    follow_up = session.get(Task, result["next_task_id"])
+    assert follow_up.due_date == datetime(2026, 2, 28, 9)
+    assert (follow_up.recurring_rule, follow_up.completed) == ("monthly", False)
+
+
+def test_complete_then_delete_spawns_no_follow_up(session):
+    task_id = _apply(session, [{"op": "create", "title": "rent", "due_date": "2026-01-31T09:00:00", "recurring_rule": "monthly"}])[0]["task_id"]
+    results = _apply(session, [{"op": "complete", "task_id": task_id}, {"op": "delete", "task_id": task_id}])
+    assert [r["status"] for r in results] == ["completed", "deleted"]
+    assert "next_task_id" not in results[0]
+    assert _titles(session) == []
+
+
+def test_events_follow_operation_order(session, existing):
+    _apply(session, [
+        {"op": "complete", "task_id": existing},
+        {"op": "update", "task_id": existing, "title": "edited after completing"},
+        {"op": "create", "title": "new"},
+        {"op": "delete", "task_id": existing},
+    ])
+    rows = session.exec(select(OutboxEvent).order_by(OutboxEvent.id)).all()
+    assert [(r.task_id == existing, r.event, r.seq) for r in rows] == [
+        (True, "created", 1),  # The fixture's
+        (True, "completed", 2),
+        (True, "updated", 3),
+        (False, "created", 1),
+        (True, "deleted", 4),
+    ]